@@ -0,0 +1,147 @@
+import itertools
+import os
+import threading
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Date, cast, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Las tablas sales_daily y sales_by_user se actualizan en la misma transacción
+# que cada escritura de invoices/purchases en crud.py: se suma (o resta) el
+# agregado de las filas afectadas con INSERT ... SELECT ... ON CONFLICT DO UPDATE
+# (PostgreSQL y SQLite lo admiten con la misma sintaxis).
+#
+# Todas las ventas de un día suman en la misma fila (source, day, payment_method):
+# con mucho tráfico cada transacción esperaría por el bloqueo de esa fila hasta
+# el commit de la anterior. Por eso sales_daily tiene ANALYTICS_SLOTS filas por
+# día y método: cada hilo escribe siempre en su slot y las consultas suman los
+# slots. Una resta puede caer en otro slot que la suma original; el total es el mismo.
+ANALYTICS_SLOTS = int(os.getenv("ANALYTICS_SLOTS", "8"))
+
+# Columnas de las facturas/compras que afectan a los resúmenes
+SUMMARY_FIELDS = {"invoice_date", "purchase_date", "payment_method", "total_amount", "user_id"}
+
+INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+_slots = itertools.count(os.getpid())
+_thread = threading.local()
+
+def _slot() -> int:
+    # reparto por turno entre los hilos del proceso; el pid desplaza el reparto entre workers
+    if not hasattr(_thread, "slot"):
+        _thread.slot = next(_slots) % ANALYTICS_SLOTS
+    return _thread.slot
+
+def _day(column, dialect: str):
+    # CAST(... AS DATE) en SQLite es numérico (2026-01-02 -> 2026): allí se usa date()
+    return func.date(column, type_=Date) if dialect == "sqlite" else cast(column, Date)
+
+def _source(source: str, dialect: str):
+    if source == "invoices":
+        return models.Invoice, models.Invoice.invoice_id, models.Invoice.invoice_date
+    return models.Purchase, models.Purchase.purchase_id, _day(models.Purchase.purchase_date, dialect)
+
+def _accumulate(summary, stmt):
+    table = summary.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key.columns],
+        set_={
+            "sales_count": table.c.sales_count + stmt.excluded.sales_count,
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+        },
+    )
+
+def record(db: Session, source: str, ids=None, sign: int = 1, where=None):
+    """Suma (sign=1) o resta (sign=-1) las filas con esas PK a los resúmenes; ids=None son todas.
+
+    where (condición SQL) sustituye a ids cuando las filas no se traen a Python (purge.py).
+    """
+    if ids is not None and not ids:
+        return
+    dialect = db.get_bind().dialect.name
+    insert = INSERTS[dialect]
+    model, pk_column, day = _source(source, dialect)
+    method = func.coalesce(model.payment_method, "unknown")
+    count = func.count() * sign
+    amount = func.coalesce(func.sum(model.total_amount), 0) * sign
+    where = [where] if where is not None else []
+    if ids is not None:
+        where.append(pk_column.in_(ids))
+
+    daily = select(literal(source), day, method, literal(_slot()), count, amount).where(*where).group_by(day, method)
+    db.execute(_accumulate(models.SalesDaily, insert(models.SalesDaily).from_select(
+        ["source", "day", "payment_method", "slot", "sales_count", "total_amount"], daily)))
+
+    by_user = select(literal(source), model.user_id, count, amount).where(*where).group_by(model.user_id)
+    db.execute(_accumulate(models.SalesByUser, insert(models.SalesByUser).from_select(
+        ["source", "user_id", "sales_count", "total_amount"], by_user)))
+
+def rebuild(db: Session):
+    """Recalcula los resúmenes desde cero (carga inicial o reparación)."""
+    db.execute(delete(models.SalesDaily))
+    db.execute(delete(models.SalesByUser))
+    record(db, "invoices")
+    record(db, "purchases")
+    db.commit()
+
+# --- Consultas ---
+def _date_range(column, date_from: Optional[date], date_to: Optional[date]):
+    clauses = []
+    if date_from is not None:
+        clauses.append(column >= date_from)
+    if date_to is not None:
+        clauses.append(column <= date_to)
+    return clauses
+
+# semanas ISO (empiezan en lunes) como date_trunc('week')
+SQLITE_PERIODS = {"week": ("-6 days", "weekday 1"), "month": ("start of month",)}
+
+def _period(day, granularity: str, dialect: str):
+    if granularity == "day":
+        return day
+    if dialect == "sqlite":
+        return func.date(day, *SQLITE_PERIODS[granularity], type_=Date)
+    return cast(func.date_trunc(granularity, day), Date)
+
+def revenue(db: Session, source: str, granularity: str = "day", date_from: Optional[date] = None, date_to: Optional[date] = None):
+    day = models.SalesDaily.day
+    period = _period(day, granularity, db.get_bind().dialect.name)
+    stmt = (select(period.label("period"),
+                   func.sum(models.SalesDaily.sales_count).label("sales_count"),
+                   func.sum(models.SalesDaily.total_amount).label("total_amount"))
+            .where(models.SalesDaily.source == source, *_date_range(day, date_from, date_to))
+            .group_by(period)
+            .having(func.sum(models.SalesDaily.sales_count) > 0)
+            .order_by(period))
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+def payment_mix(db: Session, source: str, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    method = models.SalesDaily.payment_method
+    stmt = (select(method.label("payment_method"),
+                   func.sum(models.SalesDaily.sales_count).label("sales_count"),
+                   func.sum(models.SalesDaily.total_amount).label("total_amount"))
+            .where(models.SalesDaily.source == source, *_date_range(models.SalesDaily.day, date_from, date_to))
+            .group_by(method)
+            .having(func.sum(models.SalesDaily.sales_count) > 0)
+            .order_by(func.sum(models.SalesDaily.total_amount).desc()))
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+def top_users(db: Session, source: str, limit: int = 10):
+    stmt = (select(models.SalesByUser.user_id, models.SalesByUser.sales_count, models.SalesByUser.total_amount)
+            .where(models.SalesByUser.source == source, models.SalesByUser.sales_count > 0)
+            .order_by(models.SalesByUser.total_amount.desc(), models.SalesByUser.user_id)
+            .limit(limit))
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+if __name__ == "__main__":
+    # python -m app.analytics  -> recalcula los resúmenes
+    from .database import SessionLocal, get_engine
+
+    get_engine()
+    with SessionLocal() as session:
+        rebuild(session)
@@ -0,0 +1,355 @@
+from datetime import date
+from functools import partial
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+
+from . import crud, crud_async, etag, idempotency, metrics, models, passwords, schemas, serialization, sharding
+from .database import get_async_db
+from .dependencies import (employee_fields, invoice_fields, product_fields, purchase_fields, user_fields,
+                           user_include)
+
+# Endpoints CRUD async (DB_ASYNC=1). main.py los registra en lugar de sus
+# equivalentes sync; el resto de endpoints sigue usando la sesión sync.
+# Responden lo mismo que los sync (?fields=, filtros por fecha, camino rápido,
+# X-Store-Id); tests/test_async_parity.py lo comprueba.
+router = APIRouter(route_class=metrics.InstrumentedRoute)
+
+async def paginate(keyset_fn, offset_fn, db: AsyncSession, response: Response, skip: int, limit: int, cursor: Optional[str],
+                   columns=None):
+    extra = {"columns": columns} if columns else {}
+    if cursor is None:
+        return await offset_fn(db, skip=skip, limit=limit, **extra)
+    try:
+        items, next_cursor = await keyset_fn(db, cursor=cursor, limit=limit, **extra)
+    except crud.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+async def projected_detail(db: AsyncSession, response: Response, pk_column, pk: int, fields: List[str], not_found: str):
+    model = pk_column.class_
+    row = await crud_async.get_row(db, pk_column, pk, [getattr(model, name) for name in fields])
+    if row is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return serialization.row_response(row, response)
+
+# --- Endpoints de Products ---
+@router.post("/products/", response_model=schemas.Product, tags=["Products"])
+async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depends(get_async_db),
+                         claim=Depends(idempotency.async_idempotency_key(schemas.Product))):
+    db_product = await crud_async.get_product_by_sku_cached(db, sku=product.sku)
+    if db_product:
+        raise HTTPException(status_code=400, detail="SKU already registered")
+    return await crud_async.create_product(db=db, product=product, on_created=claim)
+
+# Con X-Store-Id: * el fan-out es el de main.py (sesiones sync de cada shard, en el threadpool)
+@router.get("/products/", response_model=List[schemas.Product], tags=["Products"])
+async def read_products(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                        filters: schemas.ProductFilter = Depends(), fields: Optional[List[str]] = Depends(product_fields),
+                        if_none_match: Optional[str] = Header(None),
+                        db: Optional[AsyncSession] = Depends(sharding.get_async_list_db)):
+    sort_column, descending = crud.product_sort(filters)
+    columns = crud.projected_columns(models.Product, schemas.Product, fields, models.Product.product_id,
+                                     models.Product.version, sort_column)
+    if db is None:
+        if skip:
+            raise HTTPException(status_code=400, detail="skip is not supported across stores, use cursor")
+        extra = {"columns": columns} if columns else {}
+        try:
+            page, next_cursor = await run_in_threadpool(
+                sharding.fanout_page, partial(crud.get_products_keyset, filters=filters, **extra),
+                models.Product.product_id, sort_column, descending, limit, cursor or "")
+        except crud.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        items = [item for _, item in page]
+    else:
+        items = await paginate(partial(crud_async.get_products_keyset, filters=filters),
+                               partial(crud_async.get_products, filters=filters),
+                               db, response, skip, limit, cursor, columns=columns)
+    page_etag = etag.page_etag(items)
+    if if_none_match is not None and etag.none_match(if_none_match, page_etag):
+        return Response(status_code=304, headers={"ETag": page_etag})
+    response.headers["ETag"] = page_etag
+    if db is None:
+        return serialization.dicts_response(sharding.with_shard(page, schemas.Product, fields), response)
+    return serialization.list_response(items, response, fields)
+
+@router.get("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
+async def read_product(product_id: int, response: Response, fields: Optional[List[str]] = Depends(product_fields),
+                       if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    if fields is not None:
+        return await projected_detail(db, response, models.Product.product_id, product_id, fields, "Product not found")
+    # con If-None-Match sólo se consulta la versión (o la caché compartida) antes de traer la fila
+    version = None
+    if if_none_match is not None:
+        version = await crud_async.get_product_version(db, product_id=product_id)
+        if version is not None and etag.none_match(if_none_match, etag.product_etag(product_id, version)):
+            return Response(status_code=304, headers={"ETag": etag.product_etag(product_id, version)})
+    db_product = await crud_async.get_product_cached(db, product_id=product_id, version=version)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    response.headers["ETag"] = etag.product_etag(product_id, db_product["version"])
+    return db_product
+
+async def update_product_conditional(db: AsyncSession, response: Response, db_product: models.Product,
+                                     product_update: schemas.ProductUpdate, if_match: Optional[str]):
+    if if_match is not None and not etag.match(if_match, etag.product_etag(db_product.product_id, db_product.version)):
+        raise HTTPException(status_code=412, detail="Product has been modified")
+    try:
+        db_product = await crud_async.update_product(db=db, db_product=db_product, product_update=product_update)
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=412 if if_match else 409, detail="Product has been modified")
+    response.headers["ETag"] = etag.product_etag(db_product.product_id, db_product.version)
+    return db_product
+
+@router.put("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
+async def update_product_put(product_id: int, product: schemas.ProductCreate, response: Response,
+                             if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    db_product = await crud_async.get_product(db, product_id=product_id)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    update_schema = schemas.ProductUpdate(**product.model_dump())
+    return await update_product_conditional(db, response, db_product, update_schema, if_match)
+
+@router.patch("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
+async def update_product_patch(product_id: int, product: schemas.ProductUpdate, response: Response,
+                               if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    db_product = await crud_async.get_product(db, product_id=product_id)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return await update_product_conditional(db, response, db_product, product, if_match)
+
+@router.delete("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_product = await crud_async.get_product(db, product_id=product_id)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return await crud_async.delete_product(db=db, db_product=db_product)
+
+# --- Endpoints de Users ---
+@router.post("/users/", response_model=schemas.User, tags=["Users"])
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db),
+                      claim=Depends(idempotency.async_idempotency_key(schemas.User))):
+    password_hash = await passwords.hasher.hash_async(user.password)
+    db_user = await crud_async.get_user_by_email(db, email=user.email)
+    if db_user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return await crud_async.create_user(db=db, user=user, password_hash=password_hash, on_created=claim)
+
+@router.get("/users/", response_model=List[schemas.User], tags=["Users"])
+async def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                     fields: Optional[List[str]] = Depends(user_fields), db: AsyncSession = Depends(get_async_db)):
+    columns = crud.projected_columns(models.User, schemas.User, fields, models.User.user_id)
+    items = await paginate(crud_async.get_users_keyset, crud_async.get_users, db, response, skip, limit, cursor,
+                           columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@router.get("/users/{user_id}", response_model=schemas.UserDetail, response_model_exclude_unset=True, tags=["Users"])
+async def read_user(user_id: int, response: Response, names: List[str] = Depends(user_include),
+                    fields: Optional[List[str]] = Depends(user_fields), db: AsyncSession = Depends(get_async_db)):
+    if fields is not None:
+        if names:
+            raise HTTPException(status_code=400, detail="fields cannot be combined with include")
+        return await projected_detail(db, response, models.User.user_id, user_id, fields, "User not found")
+    db_user = await crud_async.get_user_with(db, user_id=user_id, include=names)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return schemas.UserDetail.from_user(db_user, names)
+
+@router.put("/users/{user_id}", response_model=schemas.User, tags=["Users"])
+async def update_user_put(user_id: int, user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # el usuario primero: un 404 no debe costar un hash bcrypt
+    db_user = await crud_async.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    password_hash = await passwords.hasher.hash_async(user.password)
+    update_schema = schemas.UserUpdate(**user.model_dump())
+    return await crud_async.update_user(db=db, db_user=db_user, user_update=update_schema, password_hash=password_hash)
+
+@router.patch("/users/{user_id}", response_model=schemas.User, tags=["Users"])
+async def update_user_patch(user_id: int, user: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_async.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    password_hash = await passwords.hasher.hash_async(user.password) if user.password is not None else None
+    return await crud_async.update_user(db=db, db_user=db_user, user_update=user, password_hash=password_hash)
+
+@router.delete("/users/{user_id}", response_model=schemas.User, tags=["Users"])
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_async.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return await crud_async.delete_user(db=db, db_user=db_user)
+
+# --- Endpoints de Employees ---
+@router.post("/employees/", response_model=schemas.Employee, tags=["Employees"])
+async def create_employee(employee: schemas.EmployeeCreate, db: AsyncSession = Depends(get_async_db),
+                          claim=Depends(idempotency.async_idempotency_key(schemas.Employee))):
+    db_employee = await crud_async.get_employee_by_email(db, email=employee.email)
+    if db_employee:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return await crud_async.create_employee(db=db, employee=employee, on_created=claim)
+
+@router.get("/employees/", response_model=List[schemas.Employee], tags=["Employees"])
+async def read_employees(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                         fields: Optional[List[str]] = Depends(employee_fields), db: AsyncSession = Depends(get_async_db)):
+    columns = crud.projected_columns(models.Employee, schemas.Employee, fields, models.Employee.employee_id)
+    items = await paginate(crud_async.get_employees_keyset, crud_async.get_employees, db, response, skip, limit, cursor,
+                           columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@router.get("/employees/{employee_id}", response_model=schemas.Employee, tags=["Employees"])
+async def read_employee(employee_id: int, response: Response, fields: Optional[List[str]] = Depends(employee_fields),
+                        db: AsyncSession = Depends(get_async_db)):
+    if fields is not None:
+        return await projected_detail(db, response, models.Employee.employee_id, employee_id, fields,
+                                      "Employee not found")
+    db_employee = await crud_async.get_employee(db, employee_id=employee_id)
+    if db_employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return db_employee
+
+@router.put("/employees/{employee_id}", response_model=schemas.Employee, tags=["Employees"])
+async def update_employee_put(employee_id: int, employee: schemas.EmployeeCreate, db: AsyncSession = Depends(get_async_db)):
+    db_employee = await crud_async.get_employee(db, employee_id=employee_id)
+    if db_employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    update_schema = schemas.EmployeeUpdate(**employee.model_dump())
+    return await crud_async.update_employee(db=db, db_employee=db_employee, employee_update=update_schema)
+
+@router.patch("/employees/{employee_id}", response_model=schemas.Employee, tags=["Employees"])
+async def update_employee_patch(employee_id: int, employee: schemas.EmployeeUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_employee = await crud_async.get_employee(db, employee_id=employee_id)
+    if db_employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return await crud_async.update_employee(db=db, db_employee=db_employee, employee_update=employee)
+
+@router.delete("/employees/{employee_id}", response_model=schemas.Employee, tags=["Employees"])
+async def delete_employee(employee_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_employee = await crud_async.get_employee(db, employee_id=employee_id)
+    if db_employee is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return await crud_async.delete_employee(db=db, db_employee=db_employee)
+
+# --- Endpoints de Invoices ---
+@router.post("/invoices/", response_model=schemas.Invoice, tags=["Invoices"])
+async def create_invoice(invoice: schemas.InvoiceCreate, db: AsyncSession = Depends(get_async_db),
+                         claim=Depends(idempotency.async_idempotency_key(schemas.Invoice))):
+    db_invoice = await crud_async.get_invoice_by_number(db, invoice_number=invoice.invoice_number)
+    if db_invoice:
+        raise HTTPException(status_code=400, detail="Invoice number already registered")
+    return await crud_async.create_invoice(db=db, invoice=invoice, on_created=claim)
+
+@router.get("/invoices/", response_model=List[schemas.Invoice], tags=["Invoices"])
+async def read_invoices(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                        date_from: Optional[date] = None, date_to: Optional[date] = None,
+                        fields: Optional[List[str]] = Depends(invoice_fields), db: AsyncSession = Depends(get_async_db)):
+    columns = crud.projected_columns(models.Invoice, schemas.Invoice, fields, models.Invoice.invoice_id)
+    keyset_fn = partial(crud_async.get_invoices_keyset, date_from=date_from, date_to=date_to)
+    offset_fn = partial(crud_async.get_invoices, date_from=date_from, date_to=date_to)
+    items = await paginate(keyset_fn, offset_fn, db, response, skip, limit, cursor, columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@router.get("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
+async def read_invoice(invoice_id: int, response: Response, fields: Optional[List[str]] = Depends(invoice_fields),
+                       db: AsyncSession = Depends(get_async_db)):
+    if fields is not None:
+        return await projected_detail(db, response, models.Invoice.invoice_id, invoice_id, fields, "Invoice not found")
+    db_invoice = await crud_async.get_invoice(db, invoice_id=invoice_id)
+    if db_invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return db_invoice
+
+@router.put("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
+async def update_invoice_put(invoice_id: int, invoice: schemas.InvoiceCreate, db: AsyncSession = Depends(get_async_db)):
+    db_invoice = await crud_async.get_invoice(db, invoice_id=invoice_id)
+    if db_invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    update_schema = schemas.InvoiceUpdate(**invoice.model_dump())
+    return await crud_async.update_invoice(db=db, db_invoice=db_invoice, invoice_update=update_schema)
+
+@router.patch("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
+async def update_invoice_patch(invoice_id: int, invoice: schemas.InvoiceUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_invoice = await crud_async.get_invoice(db, invoice_id=invoice_id)
+    if db_invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return await crud_async.update_invoice(db=db, db_invoice=db_invoice, invoice_update=invoice)
+
+@router.delete("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
+async def delete_invoice(invoice_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_invoice = await crud_async.get_invoice(db, invoice_id=invoice_id)
+    if db_invoice is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return await crud_async.delete_invoice(db=db, db_invoice=db_invoice)
+
+# --- Endpoints de Purchases ---
+@router.post("/purchases/", response_model=schemas.Purchase, tags=["Purchases"])
+async def create_purchase(purchase: schemas.PurchaseCreate, db: AsyncSession = Depends(get_async_db),
+                          claim=Depends(idempotency.async_idempotency_key(schemas.Purchase))):
+    return await crud_async.create_purchase(db=db, purchase=purchase, on_created=claim)
+
+@router.get("/purchases/", response_model=List[schemas.Purchase], tags=["Purchases"])
+async def read_purchases(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                         date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         fields: Optional[List[str]] = Depends(purchase_fields), db: AsyncSession = Depends(get_async_db)):
+    columns = crud.projected_columns(models.Purchase, schemas.Purchase, fields, models.Purchase.purchase_id)
+    keyset_fn = partial(crud_async.get_purchases_keyset, date_from=date_from, date_to=date_to)
+    offset_fn = partial(crud_async.get_purchases, date_from=date_from, date_to=date_to)
+    items = await paginate(keyset_fn, offset_fn, db, response, skip, limit, cursor, columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@router.get("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
+async def read_purchase(purchase_id: int, response: Response, fields: Optional[List[str]] = Depends(purchase_fields),
+                        db: AsyncSession = Depends(get_async_db)):
+    if fields is not None:
+        return await projected_detail(db, response, models.Purchase.purchase_id, purchase_id, fields,
+                                      "Purchase not found")
+    db_purchase = await crud_async.get_purchase(db, purchase_id=purchase_id)
+    if db_purchase is None:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+    return db_purchase
+
+@router.put("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
+async def update_purchase_put(purchase_id: int, purchase: schemas.PurchaseCreate, db: AsyncSession = Depends(get_async_db)):
+    db_purchase = await crud_async.get_purchase(db, purchase_id=purchase_id)
+    if db_purchase is None:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+    update_schema = schemas.PurchaseUpdate(**purchase.model_dump())
+    return await crud_async.update_purchase(db=db, db_purchase=db_purchase, purchase_update=update_schema)
+
+@router.patch("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
+async def update_purchase_patch(purchase_id: int, purchase: schemas.PurchaseUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_purchase = await crud_async.get_purchase(db, purchase_id=purchase_id)
+    if db_purchase is None:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+    return await crud_async.update_purchase(db=db, db_purchase=db_purchase, purchase_update=purchase)
+
+@router.delete("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
+async def delete_purchase(purchase_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_purchase = await crud_async.get_purchase(db, purchase_id=purchase_id)
+    if db_purchase is None:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+    return await crud_async.delete_purchase(db=db, db_purchase=db_purchase)
+
+# --- Uniones ---
+@router.get("/users/{user_id}/invoices/", response_model=List[schemas.Invoice], tags=["Users"])
+async def read_invoices_for_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_invoices = await crud_async.get_user_invoices(db=db, user_id=user_id)
+    if db_invoices is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_invoices
+
+@router.get("/users/{user_id}/purchases/", response_model=List[schemas.Purchase], tags=["Users"])
+async def read_purchases_for_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_purchases = await crud_async.get_user_purchases(db=db, user_id=user_id)
+    if db_purchases is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_purchases
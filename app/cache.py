@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Caché read-through para lecturas de productos. Los valores son dicts
+# serializables (schemas.Product en modo json), nunca objetos ORM.
+#
+# shared: si todos los workers ven la misma caché. La de memoria es de cada
+# proceso: una escritura en un worker sólo invalida la suya y los demás pueden
+# servir la fila anterior hasta PRODUCT_CACHE_TTL. Por eso los GET condicionales
+# (If-None-Match) sólo toman la versión de una caché compartida; con la de
+# memoria la leen de la base de datos (crud.get_product_version).
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+class NullCache:
+    """Caché desactivada: todo es un miss."""
+
+    shared = False
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        self.stats.incr("misses")
+        return None
+
+    def set(self, key: str, value):
+        pass
+
+    def delete(self, *keys: str):
+        pass
+
+class LRUTTLCache:
+    """LRU en memoria del proceso con expiración por TTL."""
+
+    shared = False
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                self.stats.incr("evictions")
+                entry = None
+            if entry is None:
+                self.stats.incr("misses")
+                return None
+            self._data.move_to_end(key)
+            self.stats.incr("hits")
+            return entry[1]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+class RedisCache:
+    """Backend sobre cualquier cliente compatible con Redis (get/set con ex/delete).
+
+    La expiración y el desalojo los hace Redis, así que evictions queda en 0.
+    """
+
+    shared = True
+
+    def __init__(self, client, ttl: float = 60.0, prefix: str = "supermercado:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.stats.incr("misses")
+            return None
+        self.stats.incr("hits")
+        return json.loads(raw)
+
+    def set(self, key: str, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(int(self.ttl), 1))
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+def build_cache(backend: str, ttl: float, maxsize: int, redis_url: str = None):
+    if backend == "memory":
+        return LRUTTLCache(maxsize=maxsize, ttl=ttl)
+    if backend == "redis":
+        import redis  # dependencia opcional, sólo para este backend
+        return RedisCache(redis.Redis.from_url(redis_url), ttl=ttl)
+    return NullCache()
+
+# PRODUCT_CACHE_BACKEND=memory|redis|none
+product_cache = build_cache(
+    os.getenv("PRODUCT_CACHE_BACKEND", "memory"),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "60")),
+    maxsize=int(os.getenv("PRODUCT_CACHE_MAXSIZE", "10000")),
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+)
+
+# shard: el mismo id o sku puede existir en varios shards (database.SHARD_URLS)
+def product_id_key(product_id: int, shard: str = None) -> str:
+    return f"{shard}:product:id:{product_id}" if shard else f"product:id:{product_id}"
+
+def product_sku_key(sku: str, shard: str = None) -> str:
+    return f"{shard}:product:sku:{sku}" if shard else f"product:sku:{sku}"
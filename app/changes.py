@@ -0,0 +1,292 @@
+"""Registro de cambios (change_log) y feed para GET /changes.
+
+crud.py llama a record() en cada escritura: añade el cambio a change_outbox
+en la transacción actual, sin bloqueos compartidos entre transacciones.
+relay() es lo único que asigna seq: mueve a change_log las filas de
+transacciones ya terminadas (xact_id por debajo del xmin del snapshot) y
+nunca corre dos veces a la vez (pg_try_advisory_xact_lock), así que seq crece
+en orden de visibilidad: un lector que pide seq > N nunca se salta una fila
+que confirme más tarde. El precio es latencia: una transacción de escritura
+larga retiene los cambios que confirmen después de que empezara. Fuera de
+PostgreSQL (SQLite, un solo escritor) relay() mueve todo lo visible.
+
+Cada shard tiene su change_log y su propia secuencia de seq, así que cada
+worker tiene un ChangeFeed por shard (feed_for, según X-Store-Id), que lee
+del primario del shard: una tarea llama a relay() (lo hace el worker que
+consiga el lock) y consulta el log cada CHANGES_POLL_SECONDS,
+serializa cada cambio una vez y lo guarda en un buffer en memoria. Los
+suscriptores (SSE o long-poll) sólo esperan un asyncio.Event y leen del
+buffer: no ocupan hilos ni conexiones, de modo que miles de conexiones
+inactivas cuestan poco más que su socket.
+
+    python -m app.changes purge --days 7 [--shard norte]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import BigInteger, Select, Text, cast, delete, func, insert, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .database import DEFAULT_SHARD, SHARD_NAMES, shard_session
+
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", "0.5"))
+CHANGES_BUFFER_SIZE = int(os.getenv("CHANGES_BUFFER_SIZE", "10000"))
+CHANGES_BATCH_SIZE = 500
+CHANGES_RELAY_BATCH_SIZE = int(os.getenv("CHANGES_RELAY_BATCH_SIZE", "5000"))
+# clave del advisory lock del relay (uno a la vez entre todos los workers)
+CHANGE_RELAY_LOCK = 7420001
+
+logger = logging.getLogger("app.changes")
+
+ENTITIES = {
+    "products": (models.Product, models.Product.product_id, schemas.Product),
+    "users": (models.User, models.User.user_id, schemas.User),
+    "employees": (models.Employee, models.Employee.employee_id, schemas.Employee),
+    "invoices": (models.Invoice, models.Invoice.invoice_id, schemas.Invoice),
+    "purchases": (models.Purchase, models.Purchase.purchase_id, schemas.Purchase),
+}
+
+class ChangesExpired(Exception):
+    """since es anterior a lo que conserva change_log: el cliente debe resincronizar."""
+
+def _xid(value):
+    # xid8 no se compara con bigint: se convierte pasando por texto
+    return cast(cast(value, Text), BigInteger)
+
+def record(db: Session, entity: str, op: str, ids):
+    """Añade (entity, id, op) a change_outbox en la transacción actual.
+
+    ids es una lista de PK o un select de una columna (borrados masivos sin traer las PK a Python).
+    """
+    outbox = models.ChangeOutbox
+    xact = {"xact_id": _xid(func.pg_current_xact_id())} if db.get_bind().dialect.name == "postgresql" else {}
+    if isinstance(ids, Select):
+        changed = ids.subquery("changed")
+        source = select(literal(entity), list(changed.c)[0], literal(op), *xact.values())
+        db.execute(insert(outbox).from_select(["entity", "entity_id", "op", *xact], source))
+        return
+    ids = list(ids)
+    if ids:
+        db.execute(insert(outbox).values(**xact), [{"entity": entity, "entity_id": i, "op": op} for i in ids])
+
+def relay(db: Session, limit: int = CHANGES_RELAY_BATCH_SIZE) -> int:
+    """Da seq a los cambios ya confirmados de change_outbox, en orden de transacción; devuelve cuántos."""
+    outbox = models.ChangeOutbox
+    pending = select(outbox.id).order_by(outbox.xact_id, outbox.id).limit(limit)
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.scalar(select(func.pg_try_advisory_xact_lock(CHANGE_RELAY_LOCK))):
+            db.rollback()
+            return 0
+        # por debajo del xmin del snapshot todas las transacciones han terminado
+        pending = pending.where(outbox.xact_id < _xid(func.pg_snapshot_xmin(func.pg_current_snapshot())))
+    ids = db.scalars(pending).all()
+    if ids:
+        moved = (select(outbox.entity, outbox.entity_id, outbox.op, outbox.changed_at)
+                 .where(outbox.id.in_(ids)).order_by(outbox.xact_id, outbox.id))
+        db.execute(insert(models.ChangeLog).from_select(["entity", "entity_id", "op", "changed_at"], moved))
+        db.execute(delete(outbox).where(outbox.id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+# --- Lectura ---
+Change = namedtuple("Change", "seq entity payload")
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return value.isoformat()
+
+def _current_rows(db: Session, rows):
+    """Estado actual de las filas cambiadas, {(entity, id): dict}; ausentes si se borraron."""
+    wanted = {}
+    for row in rows:
+        wanted.setdefault(row.entity, set()).add(row.entity_id)
+    current = {}
+    for entity, ids in wanted.items():
+        model, pk_column, schema = ENTITIES[entity]
+        columns = [getattr(model, name) for name in schema.model_fields]
+        for item in db.execute(select(*columns).where(pk_column.in_(ids))).mappings():
+            current[(entity, item[pk_column.key])] = dict(item)
+    return current
+
+def get_changes(db: Session, since: int, entity: str = None, limit: int = CHANGES_BATCH_SIZE, check_expired: bool = True):
+    """Cambios con seq > since (y su estado actual) y el cursor para la siguiente llamada."""
+    log = models.ChangeLog
+    latest = db.scalar(select(func.coalesce(func.max(log.seq), 0)))
+    if check_expired:
+        oldest = db.scalar(select(func.min(log.seq)))
+        if oldest is not None and since + 1 < oldest:
+            raise ChangesExpired()
+    stmt = select(log.seq, log.entity, log.entity_id, log.op, log.changed_at).where(log.seq > since, log.seq <= latest)
+    if entity is not None:
+        stmt = stmt.where(log.entity == entity)
+    rows = db.execute(stmt.order_by(log.seq).limit(limit)).all()
+    current = _current_rows(db, rows)
+    changes = [Change(row.seq, row.entity, json.dumps({
+        "seq": row.seq, "entity": row.entity, "entity_id": row.entity_id, "op": row.op,
+        "changed_at": row.changed_at, "data": current.get((row.entity, row.entity_id)),
+    }, default=_json_default)) for row in rows]
+    # sin más filas hasta latest el cursor avanza hasta ahí aunque el filtro no devuelva nada
+    cursor = rows[-1].seq if len(rows) == limit else max(since, latest)
+    return changes, cursor
+
+# Siempre en el primario del shard: una réplica puede ir por detrás del cursor
+def _read(shard: str, since: int, entity: str = None, check_expired: bool = True):
+    with shard_session(shard) as db:
+        return get_changes(db, since, entity, check_expired=check_expired)
+
+def _relay_and_read(shard: str, since: int):
+    """(cambios, cursor, movidos): el relay primero, para leer ya lo que acaba de mover."""
+    with shard_session(shard) as db:
+        moved = relay(db)
+        return (*get_changes(db, since, check_expired=False), moved)
+
+def _latest_seq(shard: str) -> int:
+    with shard_session(shard) as db:
+        return db.scalar(select(func.coalesce(func.max(models.ChangeLog.seq), 0)))
+
+class ChangeFeed:
+    def __init__(self, shard: str = DEFAULT_SHARD, buffer_size: int = CHANGES_BUFFER_SIZE):
+        self.shard = shard
+        self.buffer_size = buffer_size
+        self.last_seq = None
+        self.subscribers = 0
+        self._floor = None
+        self._seqs = []
+        self._items = []
+        self._event = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._event = self._event or asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            try:
+                if self.last_seq is None:
+                    # el buffer empieza en el último seq al arrancar: lo anterior se sirve desde la BD
+                    self.last_seq = self._floor = await run_in_threadpool(_latest_seq, self.shard)
+                    continue
+                changes, cursor, moved = await run_in_threadpool(_relay_and_read, self.shard, self.last_seq)
+            except SQLAlchemyError:
+                logger.warning("No se pudo leer change_log del shard %s; se reintenta", self.shard, exc_info=True)
+                await asyncio.sleep(CHANGES_POLL_SECONDS)
+                continue
+            self._append(changes, cursor)
+            if len(changes) < CHANGES_BATCH_SIZE and moved < CHANGES_RELAY_BATCH_SIZE:
+                await asyncio.sleep(CHANGES_POLL_SECONDS)
+
+    def _append(self, changes, cursor):
+        if changes:
+            self._seqs.extend(c.seq for c in changes)
+            self._items.extend(changes)
+            if len(self._items) > 2 * self.buffer_size:
+                drop = len(self._items) - self.buffer_size
+                self._floor = self._seqs[drop - 1]
+                del self._seqs[:drop], self._items[:drop]
+        advanced = cursor > self.last_seq
+        self.last_seq = cursor
+        if advanced:
+            # despierta a todos los suscriptores y deja un evento nuevo para la siguiente espera
+            event, self._event = self._event, asyncio.Event()
+            event.set()
+
+    def _from_buffer(self, since: int, entity: str = None):
+        if self.last_seq is None or since < self._floor:
+            return None
+        items, cursor = [], since
+        for change in islice(self._items, bisect_right(self._seqs, since), None):
+            cursor = change.seq
+            if entity is None or change.entity == entity:
+                items.append(change)
+                if len(items) >= CHANGES_BATCH_SIZE:
+                    return items, cursor
+        return items, max(since, self.last_seq)
+
+    async def current_seq(self) -> int:
+        self._ensure_started()
+        if self.last_seq is not None:
+            return self.last_seq
+        return await run_in_threadpool(_latest_seq, self.shard)
+
+    async def next_batch(self, since: int, entity: str = None, timeout: float = 0):
+        """(cambios, cursor): espera hasta timeout segundos si todavía no hay nada nuevo."""
+        self._ensure_started()
+        batch = self._from_buffer(since, entity)
+        if batch is None:
+            return await run_in_threadpool(_read, self.shard, since, entity)
+        items, cursor = batch
+        if items or timeout <= 0:
+            return batch
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return [], cursor
+        return self._from_buffer(cursor, entity) or await run_in_threadpool(_read, self.shard, cursor, entity)
+
+    async def stream(self, entity: str, first_batch, heartbeat: float):
+        """Server-Sent Events: un evento por cambio (id = seq) y un comentario como latido."""
+        self.subscribers += 1
+        try:
+            items, cursor = first_batch
+            while True:
+                if items:
+                    yield "".join(f"id: {c.seq}\nevent: {c.entity}\ndata: {c.payload}\n\n" for c in items)
+                else:
+                    yield ": keepalive\n\n"
+                try:
+                    items, cursor = await self.next_batch(cursor, entity, heartbeat)
+                except ChangesExpired:
+                    yield "event: expired\ndata: {}\n\n"
+                    return
+        finally:
+            self.subscribers -= 1
+
+def long_poll_body(items, cursor: int) -> str:
+    return f'{{"next": {cursor}, "changes": [{", ".join(c.payload for c in items)}]}}'
+
+# un ChangeFeed por shard, creado en la primera petición (todo en el event loop: sin lock)
+feeds = {}
+
+def feed_for(shard: str) -> ChangeFeed:
+    feed = feeds.get(shard)
+    if feed is None:
+        feed = feeds[shard] = ChangeFeed(shard)
+    return feed
+
+async def stop_feeds():
+    for feed in feeds.values():
+        await feed.stop()
+
+def purge(db: Session, days: int) -> int:
+    cutoff = datetime.now() - timedelta(days=days)
+    result = db.execute(delete(models.ChangeLog).where(models.ChangeLog.changed_at < cutoff))
+    db.commit()
+    return result.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de change_log.")
+    parser.add_argument("command", choices=["purge"])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--shard", choices=SHARD_NAMES, default=DEFAULT_SHARD)
+    args = parser.parse_args()
+    with shard_session(args.shard) as db:
+        print(f"cambios eliminados: {purge(db, args.days)}")
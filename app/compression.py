@@ -0,0 +1,105 @@
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él sólo se negocia gzip
+    brotli = None
+
+# Compresión negociada por Accept-Encoding (br > gzip) para respuestas de al
+# menos COMPRESSION_MIN_SIZE bytes. Soporta respuestas en streaming; los
+# Server-Sent Events no se comprimen para no retrasar los eventos.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+class _Gzip:
+    name = b"gzip"
+
+    def __init__(self, level: int = 6):
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+class _Brotli:
+    name = b"br"
+
+    def __init__(self, quality: int = 4):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.finish()
+
+def _choose_encoding(accept_encoding: str):
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return _Brotli
+    if "gzip" in accepted:
+        return _Gzip
+    return None
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers", []))
+        encoder_class = _choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoder_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                response_headers = dict(message.get("headers", []))
+                content_type = response_headers.get(b"content-type", b"")
+                passthrough = (b"content-encoding" in response_headers
+                               or content_type.startswith(b"text/event-stream")
+                               or message["status"] in (204, 304))
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start_message)
+                    await send(message)
+                    passthrough = True
+                    return
+                encoder = encoder_class()
+                out_headers = [(k, v) for k, v in start_message.get("headers", []) if k != b"content-length"]
+                out_headers.append((b"content-encoding", encoder.name))
+                out_headers.append((b"vary", b"Accept-Encoding"))
+                if not more_body:
+                    compressed = encoder.compress(body) + encoder.flush()
+                    out_headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start_message, "headers": out_headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send({**start_message, "headers": out_headers})
+            chunk = encoder.compress(body)
+            if not more_body:
+                chunk += encoder.flush()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
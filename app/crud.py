@@ -1,14 +1,215 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
+import base64
+import json
+from datetime import date, datetime, time
+from typing import Optional
+
+from sqlalchemy import Integer, column, func, insert, or_, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+from . import analytics, changes, models, purge, schemas, serialization
+from .cache import product_cache, product_id_key, product_sku_key
+
+BULK_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+
+class InvalidCursor(ValueError):
+    pass
+
+class DuplicateKeys(ValueError):
+    """Carga masiva con la misma clave de conflicto en varias filas: {clave: [índices]}."""
+
+    def __init__(self, column: str, duplicates):
+        super().__init__(column, duplicates)
+        self.column = column
+        self.duplicates = duplicates
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = sorted(product_ids)
+
+def schema_columns(model, schema):
+    """Columnas del modelo que expone el schema (p. ej. User sin password_hash)."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+# Camino rápido (FAST_SERIALIZATION=1): sólo las columnas del schema, codificadas con orjson
+def fast_columns(model, schema):
+    return schema_columns(model, schema) if serialization.FAST_SERIALIZATION else None
+
+# Proyección ?fields=: el SELECT sólo trae esos campos más los que necesita la paginación
+def projected_columns(model, schema, fields, *required):
+    if fields is None:
+        return fast_columns(model, schema)
+    columns = [getattr(model, name) for name in fields]
+    return columns + [c for c in required if c is not None and c.key not in fields]
+
+def get_row(db: Session, pk_column, pk: int, columns):
+    """Sólo las columnas pedidas de una fila (proyección ?fields=)."""
+    return db.query(*columns).filter(pk_column == pk).first()
+
+# --- Paginación por cursor (keyset) ---
+# El cursor guarda la última PK vista y, si se ordena por otra columna, su valor
+# y el nombre de la columna: WHERE (col, pk) > (:valor, :pk) ORDER BY col, pk.
+def encode_cursor(last_id: int, sort_column=None, sort_value=None) -> str:
+    data = {"k": last_id}
+    if sort_column is not None:
+        data["s"] = sort_column.key
+        data["v"] = str(sort_value)
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_column=None):
+    """Devuelve (ultima_pk, valor_de_orden), o (None, None) si el cursor está vacío (primera página)."""
+    if not cursor:
+        return None, None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        last_id = int(data["k"])
+        if sort_column is None:
+            return last_id, None
+        if data["s"] != sort_column.key:
+            raise InvalidCursor(cursor)
+        return last_id, sort_column.type.python_type(data["v"])
+    except (ValueError, KeyError, TypeError, ArithmeticError):
+        raise InvalidCursor(cursor)
+
+def keyset_order(pk_column, sort_column=None, descending: bool = False):
+    columns = [pk_column] if sort_column is None else [sort_column, pk_column]
+    return [c.desc() for c in columns] if descending else columns
+
+def keyset_where(pk_column, last_id, sort_column=None, sort_value=None, descending: bool = False):
+    if sort_column is None:
+        return pk_column < last_id if descending else pk_column > last_id
+    row, after = tuple_(sort_column, pk_column), (sort_value, last_id)
+    return row < after if descending else row > after
+
+def next_page_cursor(items, limit: int, pk_column, sort_column=None):
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    sort_value = getattr(last, sort_column.key) if sort_column is not None else None
+    return items, encode_cursor(getattr(last, pk_column.key), sort_column, sort_value)
+
+def get_page_keyset(db: Session, model, pk_column, cursor: str = "", limit: int = 100,
+                    clauses=(), sort_column=None, descending: bool = False, columns=None):
+    """Página por keyset: el costo no depende de la profundidad de la página.
+
+    Con columns se devuelven filas (tuplas) con esas columnas en vez de objetos ORM.
+
+    Devuelve (items, next_cursor); next_cursor es None en la última página.
+    """
+    if sort_column is pk_column:
+        sort_column = None
+    last_id, sort_value = decode_cursor(cursor, sort_column)
+    query = db.query(*(columns or [model])).filter(*clauses)
+    if last_id is not None:
+        query = query.filter(keyset_where(pk_column, last_id, sort_column, sort_value, descending))
+    items = query.order_by(*keyset_order(pk_column, sort_column, descending)).limit(limit + 1).all()
+    return next_page_cursor(items, limit, pk_column, sort_column)
 
 # para actualizaciones PATCH) 
-def update_db_item(db_item, update_data):
+def update_db_item(db_item, update_data, exclude=None):
     """Actualiza un item de la BD con datos de un schema Update."""
-    update_data_dict = update_data.model_dump(exclude_unset=True)
+    update_data_dict = update_data.model_dump(exclude_unset=True, exclude=exclude)
     for key, value in update_data_dict.items():
         setattr(db_item, key, value)
     return db_item
 
+# --- Carga masiva (bulk) ---
+def _bulk_insert_stmt(model, pk_column, values, conflict_column=None):
+    stmt = pg_insert(model).values(values)
+    if conflict_column is not None:
+        update_cols = {c: stmt.excluded[c] for c in values[0] if c != conflict_column}
+        if "version" in model.__table__.c:
+            update_cols["version"] = model.__table__.c.version + 1
+        stmt = stmt.on_conflict_do_update(index_elements=[conflict_column], set_=update_cols)
+    return stmt.returning(pk_column)
+
+def bulk_upsert(db: Session, model, pk_column, rows, conflict_column=None, chunk_size: int = BULK_CHUNK_SIZE, after_chunk=None):
+    """INSERT ... ON CONFLICT DO UPDATE ... RETURNING multi-fila, una transacción por bloque.
+
+    rows es una lista de (indice, dict). Si un bloque falla se reintenta fila por fila
+    con savepoints para aislar las filas con error. after_chunk(db, ids) se ejecuta
+    dentro de la transacción de cada bloque. Devuelve (ids, [(indice, detalle)]).
+    Lanza DuplicateKeys, sin escribir nada, si conflict_column se repite.
+    """
+    if conflict_column is not None:
+        # ON CONFLICT no admite la misma clave dos veces en un INSERT, y elegir una fila
+        # descartaría las demás sin avisar
+        indexes = {}
+        for index, row in rows:
+            indexes.setdefault(row[conflict_column], []).append(index)
+        duplicates = {key: found for key, found in indexes.items() if len(found) > 1}
+        if duplicates:
+            raise DuplicateKeys(conflict_column, duplicates)
+    ids, errors = [], []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            stmt = _bulk_insert_stmt(model, pk_column, [row for _, row in chunk], conflict_column)
+            chunk_ids = db.execute(stmt).scalars().all()
+            if after_chunk is not None:
+                after_chunk(db, chunk_ids)
+            db.commit()
+            ids.extend(chunk_ids)
+            continue
+        except SQLAlchemyError:
+            db.rollback()
+        chunk_ids = []
+        for index, row in chunk:
+            try:
+                with db.begin_nested():
+                    stmt = _bulk_insert_stmt(model, pk_column, [row], conflict_column)
+                    chunk_ids.extend(db.execute(stmt).scalars().all())
+            except SQLAlchemyError as exc:
+                errors.append((index, str(getattr(exc, "orig", None) or exc)))
+        if after_chunk is not None:
+            after_chunk(db, chunk_ids)
+        db.commit()
+        ids.extend(chunk_ids)
+    return ids, errors
+
+# --- Exportación en streaming ---
+def date_range_clauses(date_column, date_from=None, date_to=None):
+    """Filtros por rango de fecha; sobre tablas particionadas permiten descartar particiones."""
+    clauses = []
+    if date_from is not None:
+        clauses.append(date_column >= date_from)
+    if date_to is not None:
+        clauses.append(date_column <= date_to)
+    return clauses
+
+def purchase_date_range(date_from=None, date_to=None):
+    # purchase_date es TIMESTAMP: el filtro por fecha incluye el día completo de date_to
+    date_from = datetime.combine(date_from, time.min) if date_from else None
+    date_to = datetime.combine(date_to, time.max) if date_to else None
+    return date_from, date_to
+
+def iter_export(db: Session, model, pk_column, date_column, date_from=None, date_to=None, user_id=None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Itera bloques de filas (tuplas) con un cursor del lado del servidor.
+
+    Selecciona columnas, no objetos ORM, así la memoria depende sólo de chunk_size.
+    El primer elemento producido son los nombres de columna.
+    """
+    columns = list(model.__table__.columns)
+    stmt = select(*columns).where(*date_range_clauses(date_column, date_from, date_to)).order_by(pk_column)
+    if user_id is not None:
+        stmt = stmt.where(model.user_id == user_id)
+    yield [c.name for c in columns]
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield partition
+
+def iter_invoices_export(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None, user_id: Optional[int] = None):
+    return iter_export(db, models.Invoice, models.Invoice.invoice_id, models.Invoice.invoice_date, date_from, date_to, user_id)
+
+def iter_purchases_export(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None, user_id: Optional[int] = None):
+    date_from, date_to = purchase_date_range(date_from, date_to)
+    return iter_export(db, models.Purchase, models.Purchase.purchase_id, models.Purchase.purchase_date, date_from, date_to, user_id)
+
 # --- CRUD Products ---
 def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.product_id == product_id).first()
@@ -16,53 +217,211 @@ def get_product(db: Session, product_id: int):
 def get_product_by_sku(db: Session, sku: str):
     return db.query(models.Product).filter(models.Product.sku == sku).first()
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Product).offset(skip).limit(limit).all()
-
-def create_product(db: Session, product: schemas.ProductCreate):
+# Lecturas con caché: devuelven el producto como dict (schemas.Product) o None
+def shard_of(db: Session):
+    """Shard de la sesión (None en el default): separa las claves de caché entre shards."""
+    return db.info.get("shard")
+
+def cache_product(db_product: models.Product, shard: str = None):
+    value = schemas.Product.model_validate(db_product).model_dump(mode="json")
+    product_cache.set(product_id_key(value["product_id"], shard), value)
+    product_cache.set(product_sku_key(value["sku"], shard), value)
+    return value
+
+def get_product_cached(db: Session, product_id: int, version: int = None):
+    """version: la ya leída de la base de datos; una entrada de otra versión se recarga."""
+    cached = product_cache.get(product_id_key(product_id, shard_of(db)))
+    if cached is not None and version in (None, cached["version"]):
+        return cached
+    db_product = get_product(db, product_id)
+    return cache_product(db_product, shard_of(db)) if db_product is not None else None
+
+def get_product_by_sku_cached(db: Session, sku: str):
+    cached = product_cache.get(product_sku_key(sku, shard_of(db)))
+    if cached is not None:
+        return cached
+    db_product = get_product_by_sku(db, sku)
+    return cache_product(db_product, shard_of(db)) if db_product is not None else None
+
+def get_product_version(db: Session, product_id: int):
+    """Versión actual sin traer la fila completa (para If-None-Match).
+
+    Sólo se fía de una caché compartida: la de memoria puede no haber visto
+    la escritura de otro worker.
+    """
+    cached = product_cache.get(product_id_key(product_id, shard_of(db))) if product_cache.shared else None
+    if cached is not None:
+        return cached["version"]
+    return db.query(models.Product.version).filter(models.Product.product_id == product_id).scalar()
+
+def invalidate_product(product_id: int, *skus: str, shard: str = None):
+    product_cache.delete(product_id_key(product_id, shard), *(product_sku_key(sku, shard) for sku in skus if sku))
+
+# Filtros y orden de GET /products/ (índices en models.Product)
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def product_filter_clauses(filters: Optional[schemas.ProductFilter]):
+    if filters is None:
+        return []
+    clauses = []
+    if filters.category is not None:
+        clauses.append(models.Product.category == filters.category)
+    if filters.is_active is not None:
+        clauses.append(models.Product.is_active == filters.is_active)
+    if filters.min_price is not None:
+        clauses.append(models.Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        clauses.append(models.Product.price <= filters.max_price)
+    if filters.q:
+        pattern = f"%{_escape_like(filters.q)}%"
+        clauses.append(or_(models.Product.name.ilike(pattern, escape="\\"),
+                           models.Product.description.ilike(pattern, escape="\\")))
+    return clauses
+
+def product_sort(filters: Optional[schemas.ProductFilter]):
+    """Devuelve (columna, descendente) según filters.sort ('price', '-price', ...)."""
+    sort = filters.sort.value if filters is not None else "product_id"
+    name, descending = sort.lstrip("-"), sort.startswith("-")
+    # por PK no hace falta columna de orden adicional
+    return (None if name == "product_id" else getattr(models.Product, name)), descending
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, filters: Optional[schemas.ProductFilter] = None, columns=None):
+    sort_column, descending = product_sort(filters)
+    order = keyset_order(models.Product.product_id, sort_column, descending)
+    query = db.query(*(columns or [models.Product])).filter(*product_filter_clauses(filters))
+    return query.order_by(*order).offset(skip).limit(limit).all()
+
+def get_products_keyset(db: Session, cursor: str = "", limit: int = 100, filters: Optional[schemas.ProductFilter] = None, columns=None):
+    sort_column, descending = product_sort(filters)
+    return get_page_keyset(db, models.Product, models.Product.product_id, cursor=cursor, limit=limit,
+                           clauses=product_filter_clauses(filters), sort_column=sort_column, descending=descending,
+                           columns=columns)
+
+def create_product(db: Session, product: schemas.ProductCreate, on_created=None):
     db_product = models.Product(**product.model_dump())
     db.add(db_product)
+    db.flush()
+    changes.record(db, "products", "create", [db_product.product_id])
+    if on_created:
+        on_created(db, db_product)
     db.commit()
     db.refresh(db_product)
     return db_product
 
+def bulk_upsert_products(db: Session, rows):
+    ids, errors = bulk_upsert(db, models.Product, models.Product.product_id, rows, conflict_column="sku",
+                              after_chunk=lambda db, ids: changes.record(db, "products", "upsert", ids))
+    shard = shard_of(db)
+    product_cache.delete(*(product_id_key(i, shard) for i in ids), *(product_sku_key(row["sku"], shard) for _, row in rows))
+    return ids, errors
+
 def update_product(db: Session, db_product: models.Product, product_update: schemas.ProductUpdate):
+    old_sku = db_product.sku
     db_product = update_db_item(db_product, product_update)
+    changes.record(db, "products", "update", [db_product.product_id])
     db.commit()
     db.refresh(db_product)
+    invalidate_product(db_product.product_id, old_sku, db_product.sku, shard=shard_of(db))
     return db_product
 
+# Ajuste de stock atómico: un solo UPDATE condicional, sin leer-modificar-escribir.
+# El WHERE impide stock negativo aunque haya decrementos concurrentes.
+def _stock_update(delta):
+    stock = func.coalesce(models.Product.stock_quantity, 0)
+    return (update(models.Product)
+            .where(stock + delta >= 0)
+            .values(stock_quantity=stock + delta, version=models.Product.version + 1)
+            .returning(models.Product.product_id, models.Product.sku, models.Product.name, models.Product.price,
+                       models.Product.stock_quantity, models.Product.version))
+
+def adjust_stock(db: Session, product_id: int, delta: int):
+    """Devuelve la fila (product_id, sku, stock_quantity, version) o None si no hay stock suficiente o no existe."""
+    row = db.execute(_stock_update(delta).where(models.Product.product_id == product_id)).first()
+    if row is not None:
+        changes.record(db, "products", "update", [row.product_id])
+    db.commit()
+    if row is not None:
+        invalidate_product(row.product_id, row.sku, shard=shard_of(db))
+    return row
+
+def _apply_stock_deltas(db: Session, deltas: dict):
+    adjustments = values(column("product_id", Integer), column("delta", Integer), name="adjustments")
+    adjustments = adjustments.data(sorted(deltas.items()))
+    stmt = _stock_update(adjustments.c.delta).where(models.Product.product_id == adjustments.c.product_id)
+    rows = db.execute(stmt).all()
+    if len(rows) != len(deltas):
+        db.rollback()
+        raise InsufficientStock(set(deltas) - {row.product_id for row in rows})
+    return rows
+
+def adjust_stock_batch(db: Session, deltas: dict):
+    """Aplica {product_id: delta} en un UPDATE ... FROM (VALUES ...); todo o nada.
+
+    Lanza InsufficientStock con los productos que no pudieron ajustarse.
+    """
+    rows = _apply_stock_deltas(db, deltas)
+    changes.record(db, "products", "update", [row.product_id for row in rows])
+    db.commit()
+    for row in rows:
+        invalidate_product(row.product_id, row.sku, shard=shard_of(db))
+    return sorted(rows, key=lambda row: row.product_id)
+
 def delete_product(db: Session, db_product: models.Product):
     db.delete(db_product)
+    changes.record(db, "products", "delete", [db_product.product_id])
     db.commit()
+    invalidate_product(db_product.product_id, db_product.sku, shard=shard_of(db))
     return db_product
 
 # --- CRUD Users ---
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.user_id == user_id).first()
 
+def get_user_with(db: Session, user_id: int, include=()):
+    """Usuario con las relaciones pedidas: 1 + len(include) consultas (selectinload)."""
+    query = db.query(models.User).filter(models.User.user_id == user_id)
+    for name in include:
+        query = query.options(selectinload(getattr(models.User, name)))
+    return query.first()
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, columns=None):
+    return db.query(*(columns or [models.User])).order_by(models.User.user_id).offset(skip).limit(limit).all()
+
+def get_users_keyset(db: Session, cursor: str = "", limit: int = 100, columns=None):
+    return get_page_keyset(db, models.User, models.User.user_id, cursor=cursor, limit=limit, columns=columns)
 
-def create_user(db: Session, user: schemas.UserCreate):
-    db_user = models.User(**user.model_dump())
+def create_user(db: Session, user: schemas.UserCreate, password_hash: str, on_created=None):
+    db_user = models.User(**user.model_dump(exclude={"password"}), password_hash=password_hash)
     db.add(db_user)
+    db.flush()
+    changes.record(db, "users", "create", [db_user.user_id])
+    if on_created:
+        on_created(db, db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def update_user(db: Session, db_user: models.User, user_update: schemas.UserUpdate):
-    db_user = update_db_item(db_user, user_update)
+def bulk_upsert_users(db: Session, rows):
+    return bulk_upsert(db, models.User, models.User.user_id, rows, conflict_column="email",
+                       after_chunk=lambda db, ids: changes.record(db, "users", "upsert", ids))
+
+def update_user(db: Session, db_user: models.User, user_update: schemas.UserUpdate, password_hash: Optional[str] = None):
+    db_user = update_db_item(db_user, user_update, exclude={"password"})
+    if password_hash is not None:
+        db_user.password_hash = password_hash
+    changes.record(db, "users", "update", [db_user.user_id])
     db.commit()
     db.refresh(db_user)
     return db_user
 
 def delete_user(db: Session, db_user: models.User):
-    db.delete(db_user)
-    db.commit()
+    # facturas y compras se borran por bloques en SQL (purge.py), sin cargarlas en la sesión
+    db.expunge(db_user)
+    purge.purge_users(db, [db_user.user_id])
     return db_user
 
 # --- CRUD Employees ---
@@ -72,24 +431,33 @@ def get_employee(db: Session, employee_id: int):
 def get_employee_by_email(db: Session, email: str):
     return db.query(models.Employee).filter(models.Employee.email == email).first()
 
-def get_employees(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Employee).offset(skip).limit(limit).all()
+def get_employees(db: Session, skip: int = 0, limit: int = 100, columns=None):
+    return db.query(*(columns or [models.Employee])).order_by(models.Employee.employee_id).offset(skip).limit(limit).all()
 
-def create_employee(db: Session, employee: schemas.EmployeeCreate):
+def get_employees_keyset(db: Session, cursor: str = "", limit: int = 100, columns=None):
+    return get_page_keyset(db, models.Employee, models.Employee.employee_id, cursor=cursor, limit=limit, columns=columns)
+
+def create_employee(db: Session, employee: schemas.EmployeeCreate, on_created=None):
     db_employee = models.Employee(**employee.model_dump())
     db.add(db_employee)
+    db.flush()
+    changes.record(db, "employees", "create", [db_employee.employee_id])
+    if on_created:
+        on_created(db, db_employee)
     db.commit()
     db.refresh(db_employee)
     return db_employee
 
 def update_employee(db: Session, db_employee: models.Employee, employee_update: schemas.EmployeeUpdate):
     db_employee = update_db_item(db_employee, employee_update)
+    changes.record(db, "employees", "update", [db_employee.employee_id])
     db.commit()
     db.refresh(db_employee)
     return db_employee
 
 def delete_employee(db: Session, db_employee: models.Employee):
     db.delete(db_employee)
+    changes.record(db, "employees", "delete", [db_employee.employee_id])
     db.commit()
     return db_employee
 
@@ -100,24 +468,66 @@ def get_invoice(db: Session, invoice_id: int):
 def get_invoice_by_number(db: Session, invoice_number: str):
     return db.query(models.Invoice).filter(models.Invoice.invoice_number == invoice_number).first()
 
-def get_invoices(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Invoice).offset(skip).limit(limit).all()
-
-def create_invoice(db: Session, invoice: schemas.InvoiceCreate):
+def get_invoices(db: Session, skip: int = 0, limit: int = 100, columns=None,
+                 date_from: Optional[date] = None, date_to: Optional[date] = None):
+    return (db.query(*(columns or [models.Invoice]))
+            .filter(*date_range_clauses(models.Invoice.invoice_date, date_from, date_to))
+            .order_by(models.Invoice.invoice_id).offset(skip).limit(limit).all())
+
+def get_invoices_keyset(db: Session, cursor: str = "", limit: int = 100, columns=None,
+                        date_from: Optional[date] = None, date_to: Optional[date] = None):
+    return get_page_keyset(db, models.Invoice, models.Invoice.invoice_id, cursor=cursor, limit=limit,
+                           clauses=date_range_clauses(models.Invoice.invoice_date, date_from, date_to), columns=columns)
+
+class InvoiceError(Exception):
+    pass
+
+def invoice_conflict(exc: IntegrityError) -> str:
+    """Motivo de un IntegrityError al escribir una factura (el llamador ya hizo rollback)."""
+    # 23503: user_id sin usuario; el resto, invoice_number repetido (UNIQUE o invoice_numbers si está particionada)
+    if getattr(exc.orig, "pgcode", None) == "23503":
+        return "User not found"
+    return "Invoice number already registered"
+
+def create_invoice(db: Session, invoice: schemas.InvoiceCreate, on_created=None):
+    """Lanza InvoiceError si el número ya existe: la comprobación previa de la API no cubre la carrera."""
     db_invoice = models.Invoice(**invoice.model_dump())
     db.add(db_invoice)
+    try:
+        db.flush()
+    except IntegrityError as exc:
+        db.rollback()
+        raise InvoiceError(invoice_conflict(exc))
+    analytics.record(db, "invoices", [db_invoice.invoice_id])
+    changes.record(db, "invoices", "create", [db_invoice.invoice_id])
+    if on_created:
+        on_created(db, db_invoice)
     db.commit()
     db.refresh(db_invoice)
     return db_invoice
 
 def update_invoice(db: Session, db_invoice: models.Invoice, invoice_update: schemas.InvoiceUpdate):
+    # los resúmenes sólo cambian si cambia fecha, método, importe o usuario
+    touches_summary = bool(analytics.SUMMARY_FIELDS & invoice_update.model_fields_set)
+    if touches_summary:
+        analytics.record(db, "invoices", [db_invoice.invoice_id], sign=-1)
     db_invoice = update_db_item(db_invoice, invoice_update)
+    try:
+        db.flush()
+    except IntegrityError as exc:
+        db.rollback()
+        raise InvoiceError(invoice_conflict(exc))
+    if touches_summary:
+        analytics.record(db, "invoices", [db_invoice.invoice_id])
+    changes.record(db, "invoices", "update", [db_invoice.invoice_id])
     db.commit()
     db.refresh(db_invoice)
     return db_invoice
 
 def delete_invoice(db: Session, db_invoice: models.Invoice):
+    analytics.record(db, "invoices", [db_invoice.invoice_id], sign=-1)
     db.delete(db_invoice)
+    changes.record(db, "invoices", "delete", [db_invoice.invoice_id])
     db.commit()
     return db_invoice
 
@@ -125,24 +535,56 @@ def delete_invoice(db: Session, db_invoice: models.Invoice):
 def get_purchase(db: Session, purchase_id: int):
     return db.query(models.Purchase).filter(models.Purchase.purchase_id == purchase_id).first()
 
-def get_purchases(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Purchase).offset(skip).limit(limit).all()
+def get_purchases(db: Session, skip: int = 0, limit: int = 100, columns=None,
+                  date_from: Optional[date] = None, date_to: Optional[date] = None):
+    clauses = date_range_clauses(models.Purchase.purchase_date, *purchase_date_range(date_from, date_to))
+    return (db.query(*(columns or [models.Purchase])).filter(*clauses)
+            .order_by(models.Purchase.purchase_id).offset(skip).limit(limit).all())
 
-def create_purchase(db: Session, purchase: schemas.PurchaseCreate):
+def get_purchases_keyset(db: Session, cursor: str = "", limit: int = 100, columns=None,
+                         date_from: Optional[date] = None, date_to: Optional[date] = None):
+    clauses = date_range_clauses(models.Purchase.purchase_date, *purchase_date_range(date_from, date_to))
+    return get_page_keyset(db, models.Purchase, models.Purchase.purchase_id, cursor=cursor, limit=limit,
+                           clauses=clauses, columns=columns)
+
+def create_purchase(db: Session, purchase: schemas.PurchaseCreate, on_created=None):
     db_purchase = models.Purchase(**purchase.model_dump())
     db.add(db_purchase)
+    db.flush()
+    analytics.record(db, "purchases", [db_purchase.purchase_id])
+    changes.record(db, "purchases", "create", [db_purchase.purchase_id])
+    if on_created:
+        on_created(db, db_purchase)
     db.commit()
     db.refresh(db_purchase)
     return db_purchase
 
+def _record_purchases_chunk(db: Session, ids):
+    analytics.record(db, "purchases", ids)
+    changes.record(db, "purchases", "create", ids)
+
+def bulk_create_purchases(db: Session, rows):
+    return bulk_upsert(db, models.Purchase, models.Purchase.purchase_id, rows,
+                       after_chunk=_record_purchases_chunk)
+
 def update_purchase(db: Session, db_purchase: models.Purchase, purchase_update: schemas.PurchaseUpdate):
+    # los resúmenes sólo cambian si cambia fecha, método, importe o usuario
+    touches_summary = bool(analytics.SUMMARY_FIELDS & purchase_update.model_fields_set)
+    if touches_summary:
+        analytics.record(db, "purchases", [db_purchase.purchase_id], sign=-1)
     db_purchase = update_db_item(db_purchase, purchase_update)
+    if touches_summary:
+        db.flush()
+        analytics.record(db, "purchases", [db_purchase.purchase_id])
+    changes.record(db, "purchases", "update", [db_purchase.purchase_id])
     db.commit()
     db.refresh(db_purchase)
     return db_purchase
 
 def delete_purchase(db: Session, db_purchase: models.Purchase):
+    analytics.record(db, "purchases", [db_purchase.purchase_id], sign=-1)
     db.delete(db_purchase)
+    changes.record(db, "purchases", "delete", [db_purchase.purchase_id])
     db.commit()
     return db_purchase
 
@@ -154,4 +596,85 @@ def get_invoices_by_user(db: Session, user_id: int):
 
 # obtener compras por usuario
 def get_purchases_by_user(db: Session, user_id: int):
-    return db.query(models.Purchase).filter(models.Purchase.user_id == user_id).all()
\ No newline at end of file
+    return db.query(models.Purchase).filter(models.Purchase.user_id == user_id).all()
+
+# Usuario + hijos en una sola consulta (LEFT JOIN): None si el usuario no existe
+def _children_of_existing_user(db: Session, model, date_column, user_id: int):
+    rows = (db.query(models.User.user_id, model)
+            .outerjoin(model, model.user_id == models.User.user_id)
+            .filter(models.User.user_id == user_id)
+            .order_by(date_column)
+            .all())
+    if not rows:
+        return None
+    return [child for _, child in rows if child is not None]
+
+def get_user_invoices(db: Session, user_id: int):
+    return _children_of_existing_user(db, models.Invoice, models.Invoice.invoice_date, user_id)
+
+def get_user_purchases(db: Session, user_id: int):
+    return _children_of_existing_user(db, models.Purchase, models.Purchase.purchase_date, user_id)
+
+# --- Checkout ---
+class CheckoutError(Exception):
+    pass
+
+# método de pago de la compra (POS) -> método de la factura
+CHECKOUT_INVOICE_METHODS = {
+    schemas.PurchasePaymentMethodEnum.cash: schemas.PaymentMethodEnum.cash,
+    schemas.PurchasePaymentMethodEnum.credit_card: schemas.PaymentMethodEnum.credit,
+    schemas.PurchasePaymentMethodEnum.debit_card: schemas.PaymentMethodEnum.debit,
+    schemas.PurchasePaymentMethodEnum.transfer: schemas.PaymentMethodEnum.transfer,
+}
+
+def checkout(db: Session, basket: schemas.CheckoutCreate, on_created=None):
+    """Factura + líneas de compra + stock en una transacción con un número fijo de sentencias.
+
+    Lanza InsufficientStock o CheckoutError (factura duplicada, usuario inexistente).
+    """
+    deltas = {}
+    for line in basket.lines:
+        deltas[line.product_id] = deltas.get(line.product_id, 0) - line.quantity
+    # el UPDATE de stock devuelve también precio y nombre: no hace falta leer los productos
+    products = {row.product_id: row for row in _apply_stock_deltas(db, deltas)}
+
+    line_totals = [products[line.product_id].price * line.quantity for line in basket.lines]
+    try:
+        db_invoice = db.scalars(insert(models.Invoice).returning(models.Invoice), [{
+            "invoice_number": basket.invoice_number,
+            "invoice_date": basket.invoice_date,
+            "total_amount": sum(line_totals),
+            "payment_status": schemas.PaymentStatusEnum.paid,
+            "payment_method": CHECKOUT_INVOICE_METHODS[basket.payment_method],
+            "billing_address": basket.billing_address,
+            "user_id": basket.user_id,
+        }]).one()
+        db_purchases = db.scalars(insert(models.Purchase).returning(models.Purchase), [{
+            "item_description": line.item_description or products[line.product_id].name,
+            "quantity": line.quantity,
+            "total_amount": total,
+            "payment_method": basket.payment_method,
+            "payment_status": schemas.PurchasePaymentStatusEnum.completed,
+            "delivery_status": basket.delivery_status,
+            "user_id": basket.user_id,
+        } for line, total in zip(basket.lines, line_totals)]).all()
+    except IntegrityError as exc:
+        db.rollback()
+        raise CheckoutError(invoice_conflict(exc))
+    analytics.record(db, "invoices", [db_invoice.invoice_id])
+    analytics.record(db, "purchases", [p.purchase_id for p in db_purchases])
+    changes.record(db, "products", "update", sorted(products))
+    changes.record(db, "invoices", "create", [db_invoice.invoice_id])
+    changes.record(db, "purchases", "create", [p.purchase_id for p in db_purchases])
+    # se arma la respuesta antes del commit: tras él los objetos quedan expirados
+    result = schemas.CheckoutResult(
+        invoice=db_invoice,
+        purchases=db_purchases,
+        stock=[products[product_id] for product_id in sorted(products)],
+    )
+    if on_created:
+        on_created(db, result)
+    db.commit()
+    for row in products.values():
+        invalidate_product(row.product_id, row.sku, shard=shard_of(db))
+    return result
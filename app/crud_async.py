@@ -0,0 +1,319 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from . import analytics, changes, models, purge, schemas
+from .cache import product_cache, product_id_key, product_sku_key
+from .crud import (InvoiceError, cache_product, date_range_clauses, decode_cursor, invalidate_product, invoice_conflict,
+                   keyset_order, keyset_where, next_page_cursor, product_filter_clauses, product_sort,
+                   purchase_date_range, shard_of, update_db_item)
+
+# Versiones async de las funciones de crud.py (modo DB_ASYNC)
+
+async def _all(db: AsyncSession, stmt, columns=None):
+    """Objetos ORM, o filas (tuplas) si se piden columnas concretas."""
+    return (await db.execute(stmt)).all() if columns else (await db.scalars(stmt)).all()
+
+async def get_row(db: AsyncSession, pk_column, pk: int, columns):
+    """Sólo las columnas pedidas de una fila (proyección ?fields=)."""
+    return (await db.execute(select(*columns).where(pk_column == pk))).first()
+
+async def get_page_keyset(db: AsyncSession, model, pk_column, cursor: str = "", limit: int = 100,
+                          clauses=(), sort_column=None, descending: bool = False, columns=None):
+    if sort_column is pk_column:
+        sort_column = None
+    last_id, sort_value = decode_cursor(cursor, sort_column)
+    stmt = select(*(columns or [model])).where(*clauses)
+    if last_id is not None:
+        stmt = stmt.where(keyset_where(pk_column, last_id, sort_column, sort_value, descending))
+    stmt = stmt.order_by(*keyset_order(pk_column, sort_column, descending)).limit(limit + 1)
+    items = list(await _all(db, stmt, columns))
+    return next_page_cursor(items, limit, pk_column, sort_column)
+
+# --- CRUD Products ---
+async def get_product(db: AsyncSession, product_id: int):
+    return await db.get(models.Product, product_id)
+
+async def get_product_by_sku(db: AsyncSession, sku: str):
+    return await db.scalar(select(models.Product).where(models.Product.sku == sku))
+
+# Lecturas con caché: la misma product_cache (y las mismas claves) que crud.py
+async def get_product_cached(db: AsyncSession, product_id: int, version: int = None):
+    cached = product_cache.get(product_id_key(product_id, shard_of(db)))
+    if cached is not None and version in (None, cached["version"]):
+        return cached
+    db_product = await get_product(db, product_id)
+    return cache_product(db_product, shard_of(db)) if db_product is not None else None
+
+async def get_product_by_sku_cached(db: AsyncSession, sku: str):
+    cached = product_cache.get(product_sku_key(sku, shard_of(db)))
+    if cached is not None:
+        return cached
+    db_product = await get_product_by_sku(db, sku)
+    return cache_product(db_product, shard_of(db)) if db_product is not None else None
+
+async def get_product_version(db: AsyncSession, product_id: int):
+    """Versión actual sin traer la fila completa (para If-None-Match); como crud.get_product_version."""
+    cached = product_cache.get(product_id_key(product_id, shard_of(db))) if product_cache.shared else None
+    if cached is not None:
+        return cached["version"]
+    return await db.scalar(select(models.Product.version).where(models.Product.product_id == product_id))
+
+async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, filters: Optional[schemas.ProductFilter] = None, columns=None):
+    sort_column, descending = product_sort(filters)
+    stmt = select(*(columns or [models.Product])).where(*product_filter_clauses(filters))
+    stmt = stmt.order_by(*keyset_order(models.Product.product_id, sort_column, descending)).offset(skip).limit(limit)
+    return await _all(db, stmt, columns)
+
+async def get_products_keyset(db: AsyncSession, cursor: str = "", limit: int = 100, filters: Optional[schemas.ProductFilter] = None, columns=None):
+    sort_column, descending = product_sort(filters)
+    return await get_page_keyset(db, models.Product, models.Product.product_id, cursor=cursor, limit=limit,
+                                 clauses=product_filter_clauses(filters), sort_column=sort_column, descending=descending,
+                                 columns=columns)
+
+async def create_product(db: AsyncSession, product: schemas.ProductCreate, on_created=None):
+    db_product = models.Product(**product.model_dump())
+    db.add(db_product)
+    await db.flush()
+    await db.run_sync(changes.record, "products", "create", [db_product.product_id])
+    if on_created:
+        await db.run_sync(on_created, db_product)
+    await db.commit()
+    await db.refresh(db_product)
+    return db_product
+
+async def update_product(db: AsyncSession, db_product: models.Product, product_update: schemas.ProductUpdate):
+    old_sku = db_product.sku
+    db_product = update_db_item(db_product, product_update)
+    await db.run_sync(changes.record, "products", "update", [db_product.product_id])
+    await db.commit()
+    await db.refresh(db_product)
+    invalidate_product(db_product.product_id, old_sku, db_product.sku, shard=shard_of(db))
+    return db_product
+
+async def delete_product(db: AsyncSession, db_product: models.Product):
+    await db.delete(db_product)
+    await db.run_sync(changes.record, "products", "delete", [db_product.product_id])
+    await db.commit()
+    invalidate_product(db_product.product_id, db_product.sku, shard=shard_of(db))
+    return db_product
+
+# --- CRUD Users ---
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+async def get_user_with(db: AsyncSession, user_id: int, include=()):
+    stmt = select(models.User).where(models.User.user_id == user_id)
+    for name in include:
+        stmt = stmt.options(selectinload(getattr(models.User, name)))
+    return await db.scalar(stmt)
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, columns=None):
+    stmt = select(*(columns or [models.User])).order_by(models.User.user_id).offset(skip).limit(limit)
+    return await _all(db, stmt, columns)
+
+async def get_users_keyset(db: AsyncSession, cursor: str = "", limit: int = 100, columns=None):
+    return await get_page_keyset(db, models.User, models.User.user_id, cursor=cursor, limit=limit, columns=columns)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate, password_hash: str, on_created=None):
+    db_user = models.User(**user.model_dump(exclude={"password"}), password_hash=password_hash)
+    db.add(db_user)
+    await db.flush()
+    await db.run_sync(changes.record, "users", "create", [db_user.user_id])
+    if on_created:
+        await db.run_sync(on_created, db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def update_user(db: AsyncSession, db_user: models.User, user_update: schemas.UserUpdate, password_hash: Optional[str] = None):
+    db_user = update_db_item(db_user, user_update, exclude={"password"})
+    if password_hash is not None:
+        db_user.password_hash = password_hash
+    await db.run_sync(changes.record, "users", "update", [db_user.user_id])
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def delete_user(db: AsyncSession, db_user: models.User):
+    db.expunge(db_user)
+    await db.run_sync(purge.purge_users, [db_user.user_id])
+    return db_user
+
+# --- CRUD Employees ---
+async def get_employee(db: AsyncSession, employee_id: int):
+    return await db.get(models.Employee, employee_id)
+
+async def get_employee_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.Employee).where(models.Employee.email == email))
+
+async def get_employees(db: AsyncSession, skip: int = 0, limit: int = 100, columns=None):
+    stmt = select(*(columns or [models.Employee])).order_by(models.Employee.employee_id).offset(skip).limit(limit)
+    return await _all(db, stmt, columns)
+
+async def get_employees_keyset(db: AsyncSession, cursor: str = "", limit: int = 100, columns=None):
+    return await get_page_keyset(db, models.Employee, models.Employee.employee_id, cursor=cursor, limit=limit,
+                                 columns=columns)
+
+async def create_employee(db: AsyncSession, employee: schemas.EmployeeCreate, on_created=None):
+    db_employee = models.Employee(**employee.model_dump())
+    db.add(db_employee)
+    await db.flush()
+    await db.run_sync(changes.record, "employees", "create", [db_employee.employee_id])
+    if on_created:
+        await db.run_sync(on_created, db_employee)
+    await db.commit()
+    await db.refresh(db_employee)
+    return db_employee
+
+async def update_employee(db: AsyncSession, db_employee: models.Employee, employee_update: schemas.EmployeeUpdate):
+    db_employee = update_db_item(db_employee, employee_update)
+    await db.run_sync(changes.record, "employees", "update", [db_employee.employee_id])
+    await db.commit()
+    await db.refresh(db_employee)
+    return db_employee
+
+async def delete_employee(db: AsyncSession, db_employee: models.Employee):
+    await db.delete(db_employee)
+    await db.run_sync(changes.record, "employees", "delete", [db_employee.employee_id])
+    await db.commit()
+    return db_employee
+
+# --- CRUD Invoices ---
+async def get_invoice(db: AsyncSession, invoice_id: int):
+    return await db.get(models.Invoice, invoice_id)
+
+async def get_invoice_by_number(db: AsyncSession, invoice_number: str):
+    return await db.scalar(select(models.Invoice).where(models.Invoice.invoice_number == invoice_number))
+
+async def get_invoices(db: AsyncSession, skip: int = 0, limit: int = 100, columns=None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None):
+    stmt = (select(*(columns or [models.Invoice]))
+            .where(*date_range_clauses(models.Invoice.invoice_date, date_from, date_to))
+            .order_by(models.Invoice.invoice_id).offset(skip).limit(limit))
+    return await _all(db, stmt, columns)
+
+async def get_invoices_keyset(db: AsyncSession, cursor: str = "", limit: int = 100, columns=None,
+                              date_from: Optional[date] = None, date_to: Optional[date] = None):
+    return await get_page_keyset(db, models.Invoice, models.Invoice.invoice_id, cursor=cursor, limit=limit,
+                                 clauses=date_range_clauses(models.Invoice.invoice_date, date_from, date_to),
+                                 columns=columns)
+
+async def create_invoice(db: AsyncSession, invoice: schemas.InvoiceCreate, on_created=None):
+    db_invoice = models.Invoice(**invoice.model_dump())
+    db.add(db_invoice)
+    try:
+        await db.flush()
+    except IntegrityError as exc:
+        await db.rollback()
+        raise InvoiceError(invoice_conflict(exc))
+    await db.run_sync(analytics.record, "invoices", [db_invoice.invoice_id])
+    await db.run_sync(changes.record, "invoices", "create", [db_invoice.invoice_id])
+    if on_created:
+        await db.run_sync(on_created, db_invoice)
+    await db.commit()
+    await db.refresh(db_invoice)
+    return db_invoice
+
+async def update_invoice(db: AsyncSession, db_invoice: models.Invoice, invoice_update: schemas.InvoiceUpdate):
+    touches_summary = bool(analytics.SUMMARY_FIELDS & invoice_update.model_fields_set)
+    if touches_summary:
+        await db.run_sync(analytics.record, "invoices", [db_invoice.invoice_id], -1)
+    db_invoice = update_db_item(db_invoice, invoice_update)
+    try:
+        await db.flush()
+    except IntegrityError as exc:
+        await db.rollback()
+        raise InvoiceError(invoice_conflict(exc))
+    if touches_summary:
+        await db.run_sync(analytics.record, "invoices", [db_invoice.invoice_id])
+    await db.run_sync(changes.record, "invoices", "update", [db_invoice.invoice_id])
+    await db.commit()
+    await db.refresh(db_invoice)
+    return db_invoice
+
+async def delete_invoice(db: AsyncSession, db_invoice: models.Invoice):
+    await db.run_sync(analytics.record, "invoices", [db_invoice.invoice_id], -1)
+    await db.delete(db_invoice)
+    await db.run_sync(changes.record, "invoices", "delete", [db_invoice.invoice_id])
+    await db.commit()
+    return db_invoice
+
+# --- CRUD Purchases ---
+async def get_purchase(db: AsyncSession, purchase_id: int):
+    return await db.get(models.Purchase, purchase_id)
+
+async def get_purchases(db: AsyncSession, skip: int = 0, limit: int = 100, columns=None,
+                        date_from: Optional[date] = None, date_to: Optional[date] = None):
+    clauses = date_range_clauses(models.Purchase.purchase_date, *purchase_date_range(date_from, date_to))
+    stmt = (select(*(columns or [models.Purchase])).where(*clauses)
+            .order_by(models.Purchase.purchase_id).offset(skip).limit(limit))
+    return await _all(db, stmt, columns)
+
+async def get_purchases_keyset(db: AsyncSession, cursor: str = "", limit: int = 100, columns=None,
+                               date_from: Optional[date] = None, date_to: Optional[date] = None):
+    clauses = date_range_clauses(models.Purchase.purchase_date, *purchase_date_range(date_from, date_to))
+    return await get_page_keyset(db, models.Purchase, models.Purchase.purchase_id, cursor=cursor, limit=limit,
+                                 clauses=clauses, columns=columns)
+
+async def create_purchase(db: AsyncSession, purchase: schemas.PurchaseCreate, on_created=None):
+    db_purchase = models.Purchase(**purchase.model_dump())
+    db.add(db_purchase)
+    await db.flush()
+    await db.run_sync(analytics.record, "purchases", [db_purchase.purchase_id])
+    await db.run_sync(changes.record, "purchases", "create", [db_purchase.purchase_id])
+    if on_created:
+        await db.run_sync(on_created, db_purchase)
+    await db.commit()
+    await db.refresh(db_purchase)
+    return db_purchase
+
+async def update_purchase(db: AsyncSession, db_purchase: models.Purchase, purchase_update: schemas.PurchaseUpdate):
+    touches_summary = bool(analytics.SUMMARY_FIELDS & purchase_update.model_fields_set)
+    if touches_summary:
+        await db.run_sync(analytics.record, "purchases", [db_purchase.purchase_id], -1)
+    db_purchase = update_db_item(db_purchase, purchase_update)
+    if touches_summary:
+        await db.flush()
+        await db.run_sync(analytics.record, "purchases", [db_purchase.purchase_id])
+    await db.run_sync(changes.record, "purchases", "update", [db_purchase.purchase_id])
+    await db.commit()
+    await db.refresh(db_purchase)
+    return db_purchase
+
+async def delete_purchase(db: AsyncSession, db_purchase: models.Purchase):
+    await db.run_sync(analytics.record, "purchases", [db_purchase.purchase_id], -1)
+    await db.delete(db_purchase)
+    await db.run_sync(changes.record, "purchases", "delete", [db_purchase.purchase_id])
+    await db.commit()
+    return db_purchase
+
+# funciones de las uniones
+
+async def get_invoices_by_user(db: AsyncSession, user_id: int):
+    return (await db.scalars(select(models.Invoice).where(models.Invoice.user_id == user_id))).all()
+
+async def get_purchases_by_user(db: AsyncSession, user_id: int):
+    return (await db.scalars(select(models.Purchase).where(models.Purchase.user_id == user_id))).all()
+
+async def _children_of_existing_user(db: AsyncSession, model, date_column, user_id: int):
+    stmt = (select(models.User.user_id, model)
+            .outerjoin(model, model.user_id == models.User.user_id)
+            .where(models.User.user_id == user_id)
+            .order_by(date_column))
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return None
+    return [child for _, child in rows if child is not None]
+
+async def get_user_invoices(db: AsyncSession, user_id: int):
+    return await _children_of_existing_user(db, models.Invoice, models.Invoice.invoice_date, user_id)
+
+async def get_user_purchases(db: AsyncSession, user_id: int):
+    return await _children_of_existing_user(db, models.Purchase, models.Purchase.purchase_date, user_id)
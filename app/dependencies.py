@@ -0,0 +1,35 @@
+from fastapi import HTTPException
+from typing import List, Optional
+
+from . import schemas
+
+# Dependencias compartidas por los endpoints sync (main.py) y async (async_api.py)
+
+def user_include(include: Optional[str] = None) -> List[str]:
+    """?include=invoices,purchases -> ["invoices", "purchases"] (400 si hay nombres desconocidos)."""
+    names = [name.strip() for name in include.split(",") if name.strip()] if include else []
+    unknown = set(names) - set(schemas.USER_INCLUDES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    return list(dict.fromkeys(names))
+
+def field_projection(schema):
+    """Dependencia para ?fields=a,b: None si no se pide proyección (400 si hay campos desconocidos)."""
+    allowed = set(schema.model_fields)
+
+    def fields_dependency(fields: Optional[str] = None) -> Optional[List[str]]:
+        if not fields:
+            return None
+        names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = set(names) - allowed
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return names
+
+    return fields_dependency
+
+product_fields = field_projection(schemas.Product)
+user_fields = field_projection(schemas.User)
+employee_fields = field_projection(schemas.Employee)
+invoice_fields = field_projection(schemas.Invoice)
+purchase_fields = field_projection(schemas.Purchase)
@@ -0,0 +1,26 @@
+import hashlib
+
+# ETags fuertes a partir de la versión de fila (models.Product.version)
+
+def product_etag(product_id: int, version: int) -> str:
+    return f'"p{product_id}-v{version}"'
+
+def page_etag(items) -> str:
+    """ETag de una página: cambia si cambia cualquier fila o el conjunto de filas."""
+    digest = hashlib.sha1()
+    for item in items:
+        digest.update(f"{item.product_id}:{item.version};".encode())
+    return f'"l{digest.hexdigest()}"'
+
+def _tags(header: str):
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+def none_match(if_none_match: str, etag: str) -> bool:
+    """True si If-None-Match coincide (comparación débil, RFC 9110)."""
+    def weak(tag):
+        return tag[2:] if tag.startswith("W/") else tag
+    return any(tag == "*" or weak(tag) == weak(etag) for tag in _tags(if_none_match))
+
+def match(if_match: str, etag: str) -> bool:
+    """True si If-Match coincide (comparación fuerte)."""
+    return any(tag == "*" or tag == etag for tag in _tags(if_match))
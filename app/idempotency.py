@@ -0,0 +1,176 @@
+"""Cabecera Idempotency-Key para los POST que crean recursos.
+
+La clave se guarda con su respuesta en la misma transacción que el recurso,
+justo después del INSERT de éste: un solo INSERT ... ON CONFLICT ... RETURNING,
+sin nada antes del endpoint. Una petición concurrente con la misma clave espera
+en el índice único al commit de la primera; entonces deshace su transacción y
+reproduce la respuesta guardada. Si el endpoint falla antes (p. ej. "Email
+already registered" al repetir una petición ya completada), se busca la
+respuesta guardada antes de devolver el error. Las repeticiones recientes se
+sirven desde memoria sin ir a la base de datos.
+
+    python -m app.idempotency purge   # borra las claves con más de IDEMPOTENCY_TTL_SECONDS
+"""
+import hashlib
+import os
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .analytics import INSERTS
+from .cache import LRUTTLCache
+from .database import get_async_db, get_db
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_MAXSIZE = int(os.getenv("IDEMPOTENCY_CACHE_MAXSIZE", "10000"))
+MAX_KEY_LENGTH = 255
+
+# caché delante de la tabla: key_hash -> (request_hash, status_code, response_body)
+recent = LRUTTLCache(maxsize=IDEMPOTENCY_CACHE_MAXSIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+class IdempotentReplay(Exception):
+    """Respuesta ya guardada para la clave; main.py la devuelve tal cual."""
+
+    def __init__(self, status_code: int, body: str):
+        self.status_code = status_code
+        self.body = body
+
+class Claim:
+    """Se pasa a crud.create_* como on_created: guarda clave y respuesta antes del commit."""
+
+    def __init__(self, key_hash: str, request_hash: str, schema, status_code: int):
+        self.key_hash = key_hash
+        self.request_hash = request_hash
+        self.schema = schema
+        self.status_code = status_code
+        self.stored = None
+
+    def __call__(self, db: Session, obj):
+        db.flush()
+        body = self.schema.model_validate(obj).model_dump_json()
+        if not _store(db, self.key_hash, self.request_hash, self.status_code, body):
+            # otra petición con la clave terminó primero: se deshace la nuestra y se repite la suya
+            db.rollback()
+            raise _replay(_stored(db, self.key_hash), self.request_hash)
+        self.stored = (self.request_hash, self.status_code, body)
+
+def _expired():
+    return models.IdempotencyKey.created_at < func.now() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+
+def _store(db: Session, key_hash: str, request_hash: str, status_code: int, body: str) -> bool:
+    """False si la clave ya existe y no ha expirado (espera al commit de quien la tenga)."""
+    table = models.IdempotencyKey
+    values = {"request_hash": request_hash, "status_code": status_code, "response_body": body}
+    stmt = INSERTS[db.get_bind().dialect.name](table).values(key_hash=key_hash, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.key_hash],
+        set_={**values, "created_at": func.now()},
+        where=_expired(),
+    ).returning(table.key_hash)
+    return db.execute(stmt).first() is not None
+
+def _stored(db: Session, key_hash: str):
+    """(request_hash, status_code, response_body) de la clave vigente, o None."""
+    table = models.IdempotencyKey
+    row = db.execute(select(table.request_hash, table.status_code, table.response_body)
+                     .where(table.key_hash == key_hash, ~_expired())).first()
+    return tuple(row) if row is not None else None
+
+def _replay(stored, request_hash: str):
+    stored_hash, status_code, body = stored
+    if stored_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key already used with a different request")
+    if body is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    return IdempotentReplay(status_code, body)
+
+async def request_fingerprint(request: Request) -> str:
+    body = await request.body()
+    return hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+
+def _key_hash(request: Request, idempotency_key: str, shard: Optional[str]) -> str:
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must have 1-{MAX_KEY_LENGTH} characters")
+    scope = f"{request.method} {request.url.path} {idempotency_key}"
+    # con shards la misma clave puede llegar a tiendas distintas: la caché en memoria es común
+    return hashlib.sha256((f"{shard} {scope}" if shard else scope).encode()).hexdigest()
+
+def idempotency_key(schema, status_code: int = 200):
+    """Dependencia: None sin cabecera; con ella, un Claim o la respuesta guardada (IdempotentReplay)."""
+
+    def dependency(request: Request, idempotency_key: Optional[str] = Header(None),
+                   fingerprint: str = Depends(request_fingerprint), db: Session = Depends(get_db)):
+        if idempotency_key is None:
+            yield None
+            return
+        key_hash = _key_hash(request, idempotency_key, db.info.get("shard"))
+        stored = recent.get(key_hash)
+        if stored is not None:
+            raise _replay(stored, fingerprint)
+        claim = Claim(key_hash, fingerprint, schema, status_code)
+        try:
+            yield claim
+        except IdempotentReplay:
+            raise
+        except Exception:
+            # el error puede venir de repetir una petición que ya creó el recurso (en otro worker)
+            if claim.stored is None:
+                db.rollback()
+                stored = _stored(db, key_hash)
+                if stored is not None:
+                    raise _replay(stored, fingerprint)
+            raise
+        if claim.stored is not None:
+            recent.set(key_hash, claim.stored)
+
+    return dependency
+
+def async_idempotency_key(schema, status_code: int = 200):
+    """idempotency_key para los endpoints async: crud_async ejecuta el Claim con run_sync."""
+
+    async def dependency(request: Request, idempotency_key: Optional[str] = Header(None),
+                         fingerprint: str = Depends(request_fingerprint), db: AsyncSession = Depends(get_async_db)):
+        if idempotency_key is None:
+            yield None
+            return
+        key_hash = _key_hash(request, idempotency_key, db.info.get("shard"))
+        stored = recent.get(key_hash)
+        if stored is not None:
+            raise _replay(stored, fingerprint)
+        claim = Claim(key_hash, fingerprint, schema, status_code)
+        try:
+            yield claim
+        except IdempotentReplay:
+            raise
+        except Exception:
+            if claim.stored is None:
+                await db.rollback()
+                stored = await db.run_sync(_stored, key_hash)
+                if stored is not None:
+                    raise _replay(stored, fingerprint)
+            raise
+        if claim.stored is not None:
+            recent.set(key_hash, claim.stored)
+
+    return dependency
+
+def purge_expired(db: Session) -> int:
+    result = db.execute(delete(models.IdempotencyKey).where(_expired()))
+    db.commit()
+    return result.rowcount
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import SessionLocal, get_engine
+
+    if sys.argv[1:] != ["purge"]:
+        raise SystemExit("uso: python -m app.idempotency purge")
+    get_engine()
+    with SessionLocal() as db:
+        print(f"claves eliminadas: {purge_expired(db)}")
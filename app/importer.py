@@ -0,0 +1,274 @@
+"""Importación masiva de catálogo (products) y ventas históricas (purchases) desde CSV o Parquet.
+
+El archivo se lee por bloques de IMPORT_CHUNK_ROWS filas: la memoria depende
+del tamaño del bloque, no del archivo. Cada bloque se valida con los schemas
+de creación en un pool de procesos, que devuelve las filas válidas ya
+codificadas para COPY y las rechazadas con su motivo. En la base de datos cada
+bloque entra por COPY a una tabla temporal y de ahí, con un INSERT ... SELECT,
+a la tabla final en su propia transacción (como crud.bulk_upsert): products
+por sku (gana la última fila), purchases sólo si existe el usuario. Resúmenes,
+change_log y la caché de productos se actualizan igual que en la carga por la API.
+
+    python -m app.importer products catalogo.csv --rejects rechazos.csv
+    python -m app.importer purchases ventas.parquet   # Parquet necesita pyarrow
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import islice
+
+import psycopg2
+from pydantic import ValidationError
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table, exists, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import analytics, changes, models, schemas
+from .cache import product_cache, product_id_key, product_sku_key
+from .crud import shard_of
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 1)))
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "10000"))
+# POST /import/{kind} devuelve como mucho estos rechazos (el total va en "rejected")
+IMPORT_MAX_REJECTS = int(os.getenv("IMPORT_MAX_REJECTS", "1000"))
+
+class ImportFormatError(ValueError):
+    """Archivo ilegible o formato no disponible."""
+
+Target = namedtuple("Target", "schema model")
+
+TARGETS = {
+    "products": Target(schemas.ProductCreate, models.Product),
+    "purchases": Target(schemas.PurchaseImport, models.Purchase),
+}
+
+def _staging_table(target: Target):
+    # ON COMMIT DELETE ROWS: vacía tras cada bloque y reutilizable en la misma conexión
+    table = target.model.__table__
+    return Table(f"import_{table.name}", MetaData(), Column("row_number", Integer),
+                 *(Column(name, table.c[name].type) for name in target.schema.model_fields),
+                 prefixes=["TEMPORARY"], postgresql_on_commit="DELETE ROWS")
+
+STAGING = {kind: _staging_table(target) for kind, target in TARGETS.items()}
+
+# --- Lectura por bloques: (número de la primera fila, [dict]) ---
+def _csv_chunks(stream, chunk_rows: int):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    first = 1
+    while True:
+        try:
+            rows = list(islice(reader, chunk_rows))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ImportFormatError(f"Invalid CSV near row {first}: {exc}")
+        if not rows:
+            return
+        yield first, rows
+        first += len(rows)
+
+def _parquet_chunks(stream, chunk_rows: int):
+    try:
+        import pyarrow.parquet as pq  # dependencia opcional, sólo para Parquet
+    except ImportError:
+        raise ImportFormatError("Parquet import requires pyarrow")
+    try:
+        parquet = pq.ParquetFile(stream)
+    except Exception as exc:
+        raise ImportFormatError(f"Invalid Parquet file: {exc}")
+    first = 1
+    for batch in parquet.iter_batches(batch_size=chunk_rows):
+        rows = batch.to_pylist()
+        yield first, rows
+        first += len(rows)
+
+# --- Validación (se ejecuta en los procesos del pool) ---
+def _column_checks(model, fields):
+    """Límites de columna que COPY rechazaría (y con ello todo el bloque): se comprueban por fila."""
+    checks = []
+    for name in fields:
+        type_ = model.__table__.c[name].type
+        if isinstance(type_, String) and type_.length:
+            checks.append((name, lambda v, n=type_.length: len(v) <= n, f"longer than {type_.length} characters"))
+        elif isinstance(type_, Numeric) and type_.precision:
+            bound = 10 ** (type_.precision - (type_.scale or 0))
+            checks.append((name, lambda v, b=bound: abs(Decimal(v)) < b, f"out of range for {type_}"))
+        elif isinstance(type_, Integer):
+            checks.append((name, lambda v: -2**31 <= v < 2**31, "out of range for integer"))
+    return checks
+
+_checks = {}
+
+def _validate_chunk(kind: str, first_row: int, rows):
+    """Devuelve (CSV para COPY, números de fila válidos, [(fila, motivo)])."""
+    target = TARGETS[kind]
+    fields = list(target.schema.model_fields)
+    if kind not in _checks:
+        _checks[kind] = _column_checks(target.model, fields)
+    checks = _checks[kind]
+    out = io.StringIO()
+    writer = csv.writer(out)
+    valid, rejects = [], []
+    for row_number, raw in enumerate(rows, start=first_row):
+        # celdas vacías como NULL: en CSV no hay otra forma de escribirlo
+        raw = {key: (None if value == "" else value) for key, value in raw.items() if key}
+        try:
+            item = target.schema.model_validate(raw).model_dump(mode="json")
+        except ValidationError as exc:
+            rejects.append((row_number, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())))
+            continue
+        failed = next((f"{name}: {message}" for name, ok, message in checks
+                       if item[name] is not None and not ok(item[name])), None)
+        if failed is not None:
+            rejects.append((row_number, failed))
+            continue
+        writer.writerow([row_number, *("" if item[name] is None else item[name] for name in fields)])
+        valid.append(row_number)
+    return out.getvalue(), valid, rejects
+
+# --- Carga ---
+def _copy_chunk(db: Session, staging: Table, payload: str):
+    staging.create(db.connection(), checkfirst=True)
+    columns = ", ".join(c.name for c in staging.columns)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {staging.name} ({columns}) FROM STDIN WITH (FORMAT csv)", io.StringIO(payload))
+    finally:
+        cursor.close()
+
+def _merge_products(db: Session, staging: Table):
+    fields = list(schemas.ProductCreate.model_fields)
+    # ON CONFLICT no admite el mismo sku dos veces en un INSERT: gana la última fila del bloque
+    latest = (select(*(staging.c[name] for name in fields))
+              .distinct(staging.c.sku).order_by(staging.c.sku, staging.c.row_number.desc()))
+    stmt = pg_insert(models.Product).from_select(fields, latest)
+    update_cols = {name: stmt.excluded[name] for name in fields if name != "sku"}
+    update_cols["version"] = models.Product.__table__.c.version + 1
+    stmt = stmt.on_conflict_do_update(index_elements=["sku"], set_=update_cols)
+    rows = db.execute(stmt.returning(models.Product.product_id, models.Product.sku)).all()
+    changes.record(db, "products", "upsert", [row.product_id for row in rows])
+    return rows, []
+
+def _merge_purchases(db: Session, staging: Table):
+    fields = list(schemas.PurchaseImport.model_fields)
+    user_exists = exists().where(models.User.user_id == staging.c.user_id)
+    rejects = [(row.row_number, f"user_id: user {row.user_id} does not exist")
+               for row in db.execute(select(staging.c.row_number, staging.c.user_id).where(~user_exists))]
+    source = select(*(func.coalesce(staging.c[name], func.now()) if name == "purchase_date" else staging.c[name]
+                      for name in fields)).where(user_exists)
+    ids = db.execute(insert(models.Purchase).from_select(fields, source)
+                     .returning(models.Purchase.purchase_id)).scalars().all()
+    analytics.record(db, "purchases", ids)
+    changes.record(db, "purchases", "create", ids)
+    return ids, rejects
+
+MERGES = {"products": _merge_products, "purchases": _merge_purchases}
+
+def _load_chunk(db: Session, kind: str, payload: str, valid_rows):
+    """COPY + merge del bloque en una transacción; devuelve (filas escritas, rechazos de la base de datos).
+
+    En products las filas escritas son una por sku: las repetidas en el bloque no cuentan.
+    """
+    if not valid_rows:
+        return 0, []
+    try:
+        _copy_chunk(db, STAGING[kind], payload)
+        merged, rejects = MERGES[kind](db, STAGING[kind])
+        db.commit()
+    # copy_expert va por el cursor de psycopg2: sus errores no llegan envueltos en SQLAlchemyError
+    except (SQLAlchemyError, psycopg2.Error) as exc:
+        db.rollback()
+        detail = str(getattr(exc, "orig", None) or exc).strip()
+        return 0, [(row_number, f"chunk rejected by the database: {detail}") for row_number in valid_rows]
+    if kind == "products":
+        shard = shard_of(db)
+        product_cache.delete(*(product_id_key(row.product_id, shard) for row in merged),
+                             *(product_sku_key(row.sku, shard) for row in merged))
+    return len(merged), rejects
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los procesos no heredan hilos ni conexiones del worker
+            _pool = ProcessPoolExecutor(IMPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def import_stream(db: Session, kind: str, stream, fmt: str = "csv", chunk_rows: int = IMPORT_CHUNK_ROWS,
+                  on_reject=None):
+    """Importa un archivo binario por bloques; devuelve {"rows", "loaded", "rejected", "seconds"}.
+
+    loaded cuenta filas escritas: en products, un sku repetido dentro de un bloque cuenta una vez.
+
+    on_reject(fila, motivo) se llama por cada fila rechazada, en orden de bloque.
+    """
+    started = time.perf_counter()
+    chunks = _csv_chunks(stream, chunk_rows) if fmt == "csv" else _parquet_chunks(stream, chunk_rows)
+    totals = {"rows": 0, "loaded": 0, "rejected": 0}
+    pending = deque()
+
+    def load_next():
+        payload, valid_rows, rejects = pending.popleft().result()
+        loaded, db_rejects = _load_chunk(db, kind, payload, valid_rows)
+        totals["loaded"] += loaded
+        totals["rejected"] += len(rejects) + len(db_rejects)
+        if on_reject is not None:
+            for row_number, detail in sorted(rejects + db_rejects):
+                on_reject(row_number, detail)
+
+    # como mucho IMPORT_WORKERS + 1 bloques en memoria: validándose o esperando a cargarse
+    for first_row, rows in chunks:
+        totals["rows"] += len(rows)
+        pending.append(_executor().submit(_validate_chunk, kind, first_row, rows))
+        if len(pending) > IMPORT_WORKERS:
+            load_next()
+    while pending:
+        load_next()
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    return totals
+
+if __name__ == "__main__":
+    from .database import UnknownStore, shard_for, shard_session
+
+    parser = argparse.ArgumentParser(description="Importación masiva desde CSV o Parquet.")
+    parser.add_argument("kind", choices=sorted(TARGETS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="por defecto, según la extensión")
+    parser.add_argument("--rejects", help="CSV con las filas rechazadas (fila, motivo)")
+    parser.add_argument("--store", help="tienda destino (su shard); por defecto DATABASE_URL")
+    args = parser.parse_args()
+    try:
+        shard = shard_for(args.store)
+    except UnknownStore:
+        parser.error(f"la tienda {args.store} no está en STORE_SHARDS")
+    fmt = args.format or ("parquet" if args.path.endswith(".parquet") else "csv")
+    report = open(args.rejects, "w", newline="") if args.rejects else None
+    writer = csv.writer(report) if report else None
+    if writer:
+        writer.writerow(["row", "detail"])
+    try:
+        with open(args.path, "rb") as stream, shard_session(shard) as session:
+            totals = import_stream(session, args.kind, stream, fmt,
+                                   on_reject=(lambda row, detail: writer.writerow([row, detail])) if writer else None)
+    finally:
+        if report:
+            report.close()
+        shutdown()
+    totals["rows_per_second"] = round(totals["rows"] / totals["seconds"]) if totals["seconds"] else None
+    print(totals)
@@ -1,48 +1,325 @@
-from fastapi import FastAPI, Depends, HTTPException
+import csv
+import io
+import json
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from functools import partial
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import List
-
-from . import crud, models, schemas
-from .database import engine, get_db
-
-# Crea las tablas en la base de datos (si no existen)
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="API de Supermercado")
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+
+from . import (analytics, changes, crud, etag, idempotency, importer, metrics, models, partitioning, passwords, purge,
+               schemas, serialization, sharding)
+from .cache import product_cache
+from .compression import CompressionMiddleware
+from .database import (DB_ASYNC, DEFAULT_SHARD, SessionRoute, dispose_engines, get_async_engine, get_db, get_engine,
+                       shard_session, store_shard)
+from .dependencies import (employee_fields, invoice_fields, product_fields, purchase_fields, user_fields,
+                           user_include)
+from .replicas import ReadAfterWriteMiddleware, get_read_db, read_session, replicas, wants_primary
+
+logger = logging.getLogger("app.startup")
+
+# El esquema se gestiona con Alembic (alembic upgrade head), no al importar la app.
+# Al arrancar sólo se crean los engines; si la BD no responde el worker arranca
+# igualmente y /health/ready devuelve 503 hasta que vuelva.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_engine()
+    if DB_ASYNC:
+        get_async_engine()
+    try:
+        # si purchases/invoices están particionadas, crea las particiones de los próximos meses;
+        # cualquier otro error (no de conexión) detiene el arranque en lugar de quedar en un aviso
+        await run_in_threadpool(partitioning.maintain, get_engine())
+    except OperationalError:
+        logger.warning("Base de datos no disponible al arrancar; se omite el mantenimiento de particiones")
+    yield
+    await changes.stop_feeds()
+    passwords.hasher.shutdown()
+    purge.shutdown()
+    importer.shutdown()
+    await dispose_engines()
+
+app = FastAPI(title="API de Supermercado", lifespan=lifespan)
+app.router.route_class = SessionRoute
+app.add_middleware(ReadAfterWriteMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+# Respuesta guardada para un Idempotency-Key repetido: se devuelve sin volver a crear nada
+@app.exception_handler(idempotency.IdempotentReplay)
+def replay_idempotent_response(request: Request, exc: idempotency.IdempotentReplay):
+    return Response(content=exc.body, status_code=exc.status_code, media_type="application/json",
+                    headers={"Idempotent-Replayed": "true"})
+
+# Pool de hash de contraseñas saturado: se rechaza en lugar de encolar sin límite
+@app.exception_handler(passwords.HasherBusy)
+def password_hasher_busy(request: Request, exc: passwords.HasherBusy):
+    return JSONResponse(status_code=503, content={"detail": "Password hashing is saturated, retry later"},
+                        headers={"Retry-After": "1"})
+
+# Número de factura repetido (o usuario inexistente) detectado al escribir: la comprobación
+# previa de POST /invoices/ no cubre dos peticiones simultáneas ni PUT/PATCH
+@app.exception_handler(crud.InvoiceError)
+def invoice_conflict(request: Request, exc: crud.InvoiceError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# Carga masiva con claves repetidas (sku, email): se rechaza entera indicando las filas
+@app.exception_handler(crud.DuplicateKeys)
+def duplicate_bulk_keys(request: Request, exc: crud.DuplicateKeys):
+    return JSONResponse(status_code=400, content={
+        "detail": f"Duplicate {exc.column} in rows",
+        "duplicates": [{exc.column: key, "indexes": indexes} for key, indexes in exc.duplicates.items()],
+    })
+
+# Paginación: con ?cursor= (vacío para la primera página) se usa keyset sobre la PK
+# y el cursor de la siguiente página se devuelve en la cabecera X-Next-Cursor.
+def paginate(keyset_fn, offset_fn, db: Session, response: Response, skip: int, limit: int, cursor: Optional[str], columns=None):
+    extra = {"columns": columns} if columns else {}
+    if cursor is None:
+        return offset_fn(db, skip=skip, limit=limit, **extra)
+    try:
+        items, next_cursor = keyset_fn(db, cursor=cursor, limit=limit, **extra)
+    except crud.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+def projected_detail(db: Session, response: Response, pk_column, pk: int, fields: List[str], not_found: str):
+    model = pk_column.class_
+    row = crud.get_row(db, pk_column, pk, [getattr(model, name) for name in fields])
+    if row is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return serialization.row_response(row, response)
+
+# Carga masiva: acepta un array JSON o NDJSON (Content-Type: application/x-ndjson).
+# El cuerpo se lee en una dependencia async para que el endpoint siga siendo sync.
+async def read_raw_body(request: Request) -> bytes:
+    return await request.body()
+
+def parse_bulk_rows(request: Request, body: bytes, schema):
+    errors = []
+    if "ndjson" in request.headers.get("content-type", ""):
+        raw = []
+        for index, line in enumerate(l for l in body.splitlines() if l.strip()):
+            try:
+                raw.append((index, json.loads(line)))
+            except ValueError as exc:
+                errors.append(schemas.BulkRowError(index=index, detail=str(exc)))
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        raw = list(enumerate(items))
+    rows = []
+    for index, item in raw:
+        try:
+            rows.append((index, schema.model_validate(item).model_dump()))
+        except ValidationError as exc:
+            errors.append(schemas.BulkRowError(index=index, detail=str(exc)))
+    return rows, errors
+
+def bulk_load(bulk_fn, db: Session, request: Request, body: bytes, schema):
+    rows, errors = parse_bulk_rows(request, body, schema)
+    ids, db_errors = bulk_fn(db, rows) if rows else ([], [])
+    errors.extend(schemas.BulkRowError(index=index, detail=detail) for index, detail in db_errors)
+    errors.sort(key=lambda e: e.index)
+    return schemas.BulkResult(ids=ids, errors=errors)
+
+# Exportación: la sesión se abre dentro del generador porque el streaming
+# continúa después de que termina el endpoint.
+class ExportFormat(str, Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Unserializable type: {type(value).__name__}")
+
+def stream_export(iter_fn, fmt: ExportFormat, pin_primary: bool = False, shard: str = DEFAULT_SHARD, **filters):
+    def generate():
+        # como get_read_db: réplicas sólo en el shard default, el resto lee de su primario
+        db = read_session(pin_primary) if shard == DEFAULT_SHARD else shard_session(shard)
+        try:
+            chunks = iter_fn(db, **filters)
+            names = next(chunks)
+            if fmt == ExportFormat.csv:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(names)
+                for chunk in chunks:
+                    writer.writerows(chunk)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                yield buffer.getvalue()
+            elif serialization.FAST_SERIALIZATION:
+                for chunk in chunks:
+                    yield b"".join(serialization.dumps(dict(zip(names, row))) + b"\n" for row in chunk)
+            else:
+                for chunk in chunks:
+                    yield "".join(json.dumps(dict(zip(names, row)), default=_json_default) + "\n" for row in chunk)
+        finally:
+            db.close()
+    media_type = "text/csv" if fmt == ExportFormat.csv else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type)
+
+# --- Métricas ---
+@app.get("/health/live", tags=["Health"])
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["Health"])
+def readiness(response: Response):
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except SQLAlchemyError:
+        response.status_code = 503
+        return {"status": "unavailable"}
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Metrics"])
+def read_metrics():
+    return (metrics.render_request_metrics() + metrics.render_pool_metrics(get_engine())
+            + metrics.render_cache_metrics("product", product_cache)
+            + metrics.render_cache_metrics("idempotency", idempotency.recent)
+            + metrics.render_password_hasher_metrics(passwords.hasher)
+            + metrics.render_change_feed_metrics(changes.feeds))
 
 # --- Endpoints de Products ---
 @app.post("/products/", response_model=schemas.Product, tags=["Products"])
-def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
-    db_product = crud.get_product_by_sku(db, sku=product.sku)
+def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db),
+                   claim=Depends(idempotency.idempotency_key(schemas.Product))):
+    db_product = crud.get_product_by_sku_cached(db, sku=product.sku)
     if db_product:
         raise HTTPException(status_code=400, detail="SKU already registered")
-    return crud.create_product(db=db, product=product)
+    return crud.create_product(db=db, product=product, on_created=claim)
 
+@app.post("/products/bulk", response_model=schemas.BulkResult, tags=["Products"])
+def create_products_bulk(request: Request, body: bytes = Depends(read_raw_body), db: Session = Depends(get_db)):
+    return bulk_load(crud.bulk_upsert_products, db, request, body, schemas.ProductCreate)
+
+# Con X-Store-Id: * lista los productos de todas las tiendas (fan-out a los shards, sólo por cursor)
+# y cada fila lleva "shard"
 @app.get("/products/", response_model=List[schemas.Product], tags=["Products"])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_products(db, skip=skip, limit=limit)
+def read_products(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  filters: schemas.ProductFilter = Depends(), fields: Optional[List[str]] = Depends(product_fields),
+                  if_none_match: Optional[str] = Header(None), db: Optional[Session] = Depends(sharding.get_list_db)):
+    sort_column, descending = crud.product_sort(filters)
+    columns = crud.projected_columns(models.Product, schemas.Product, fields, models.Product.product_id,
+                                models.Product.version, sort_column)
+    if db is None:
+        if skip:
+            raise HTTPException(status_code=400, detail="skip is not supported across stores, use cursor")
+        extra = {"columns": columns} if columns else {}
+        try:
+            page, next_cursor = sharding.fanout_page(partial(crud.get_products_keyset, filters=filters, **extra),
+                                                     models.Product.product_id, sort_column, descending, limit, cursor or "")
+        except crud.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        items = [item for _, item in page]
+    else:
+        items = paginate(partial(crud.get_products_keyset, filters=filters), partial(crud.get_products, filters=filters),
+                         db, response, skip, limit, cursor, columns=columns)
+    page_etag = etag.page_etag(items)
+    if if_none_match is not None and etag.none_match(if_none_match, page_etag):
+        return Response(status_code=304, headers={"ETag": page_etag})
+    response.headers["ETag"] = page_etag
+    if db is None:
+        return serialization.dicts_response(sharding.with_shard(page, schemas.Product, fields), response)
+    return serialization.list_response(items, response, fields)
 
 @app.get("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = crud.get_product(db, product_id=product_id)
+def read_product(product_id: int, response: Response, fields: Optional[List[str]] = Depends(product_fields),
+                 if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    if fields is not None:
+        return projected_detail(db, response, models.Product.product_id, product_id, fields, "Product not found")
+    # con If-None-Match sólo se consulta la versión (o la caché compartida) antes de traer la fila
+    version = None
+    if if_none_match is not None:
+        version = crud.get_product_version(db, product_id=product_id)
+        if version is not None and etag.none_match(if_none_match, etag.product_etag(product_id, version)):
+            return Response(status_code=304, headers={"ETag": etag.product_etag(product_id, version)})
+    db_product = crud.get_product_cached(db, product_id=product_id, version=version)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    response.headers["ETag"] = etag.product_etag(product_id, db_product["version"])
+    return db_product
+
+# If-Match contra la versión ya cargada; la versión se vuelve a comprobar en el UPDATE
+def update_product_conditional(db: Session, response: Response, db_product: models.Product,
+                               product_update: schemas.ProductUpdate, if_match: Optional[str]):
+    if if_match is not None and not etag.match(if_match, etag.product_etag(db_product.product_id, db_product.version)):
+        raise HTTPException(status_code=412, detail="Product has been modified")
+    try:
+        db_product = crud.update_product(db=db, db_product=db_product, product_update=product_update)
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=412 if if_match else 409, detail="Product has been modified")
+    response.headers["ETag"] = etag.product_etag(db_product.product_id, db_product.version)
     return db_product
 
 @app.put("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
-def update_product_put(product_id: int, product: schemas.ProductCreate, db: Session = Depends(get_db)):
+def update_product_put(product_id: int, product: schemas.ProductCreate, response: Response,
+                       if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     db_product = crud.get_product(db, product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     update_schema = schemas.ProductUpdate(**product.model_dump())
-    return crud.update_product(db=db, db_product=db_product, product_update=update_schema)
+    return update_product_conditional(db, response, db_product, update_schema, if_match)
 
 @app.patch("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
-def update_product_patch(product_id: int, product: schemas.ProductUpdate, db: Session = Depends(get_db)):
+def update_product_patch(product_id: int, product: schemas.ProductUpdate, response: Response,
+                         if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     db_product = crud.get_product(db, product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return crud.update_product(db=db, db_product=db_product, product_update=product)
+    return update_product_conditional(db, response, db_product, product, if_match)
+
+@app.post("/products/stock/adjust", response_model=List[schemas.StockLevel], tags=["Products"])
+def adjust_stock_batch(adjustments: List[schemas.StockBatchItem], db: Session = Depends(get_db)):
+    deltas = {}
+    for item in adjustments:
+        deltas[item.product_id] = deltas.get(item.product_id, 0) + item.delta
+    if not deltas:
+        return []
+    try:
+        return crud.adjust_stock_batch(db, deltas)
+    except crud.InsufficientStock as exc:
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock or product not found",
+                                                     "product_ids": exc.product_ids})
+
+@app.post("/products/{product_id}/stock/adjust", response_model=schemas.StockLevel, tags=["Products"])
+def adjust_stock(product_id: int, adjustment: schemas.StockAdjustment, db: Session = Depends(get_db)):
+    row = crud.adjust_stock(db, product_id=product_id, delta=adjustment.delta)
+    if row is None:
+        # sólo en el camino de error se distingue "no existe" de "sin stock"
+        if crud.get_product(db, product_id=product_id) is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        raise HTTPException(status_code=409, detail="Insufficient stock")
+    return row
 
 @app.delete("/products/{product_id}", response_model=schemas.Product, tags=["Products"])
 def delete_product(product_id: int, db: Session = Depends(get_db)):
@@ -51,39 +328,96 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Product not found")
     return crud.delete_product(db=db, db_product=db_product)
 
+# --- Autenticación ---
+@app.post("/auth/login", response_model=schemas.User, tags=["Auth"])
+def login(credentials: schemas.LoginRequest, db: Session = Depends(get_db)):
+    db_user = crud.get_user_by_email(db, email=credentials.email)
+    # libera la conexión antes de verificar: bcrypt tarda decenas de ms
+    db.close()
+    # sin usuario se verifica igualmente contra un hash ficticio (mismo tiempo de respuesta)
+    password_hash = db_user.password_hash if db_user is not None else passwords.hasher.dummy_hash()
+    if not passwords.hasher.verify(credentials.password, password_hash) or db_user is None:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    return db_user
+
 # --- Endpoints de Users ---
+# bcrypt en una dependencia: termina antes de abrir la transacción que guarda el usuario y su
+# Idempotency-Key, así que ninguna fila queda bloqueada mientras se calcula el hash
+def new_password_hash(user: schemas.UserCreate) -> str:
+    return passwords.hasher.hash(user.password)
+
 @app.post("/users/", response_model=schemas.User, tags=["Users"])
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def create_user(user: schemas.UserCreate, password_hash: str = Depends(new_password_hash),
+                db: Session = Depends(get_db), claim=Depends(idempotency.idempotency_key(schemas.User))):
     db_user = crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return crud.create_user(db=db, user=user, password_hash=password_hash, on_created=claim)
 
-@app.get("/users/", response_model=List[schemas.User], tags=["Users"])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_users(db, skip=skip, limit=limit)
+@app.post("/users/bulk", response_model=schemas.BulkResult, tags=["Users"])
+def create_users_bulk(request: Request, body: bytes = Depends(read_raw_body), db: Session = Depends(get_db)):
+    return bulk_load(crud.bulk_upsert_users, db, request, body, schemas.UserImport)
 
-@app.get("/users/{user_id}", response_model=schemas.User, tags=["Users"])
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, user_id=user_id)
+@app.get("/users/", response_model=List[schemas.User], tags=["Users"])
+def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+               fields: Optional[List[str]] = Depends(user_fields), db: Session = Depends(get_read_db)):
+    columns = crud.projected_columns(models.User, schemas.User, fields, models.User.user_id)
+    items = paginate(crud.get_users_keyset, crud.get_users, db, response, skip, limit, cursor, columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@app.get("/users/{user_id}", response_model=schemas.UserDetail, response_model_exclude_unset=True, tags=["Users"])
+def read_user(user_id: int, response: Response, names: List[str] = Depends(user_include),
+              fields: Optional[List[str]] = Depends(user_fields), db: Session = Depends(get_read_db)):
+    if fields is not None:
+        if names:
+            raise HTTPException(status_code=400, detail="fields cannot be combined with include")
+        return projected_detail(db, response, models.User.user_id, user_id, fields, "User not found")
+    db_user = crud.get_user_with(db, user_id=user_id, include=names)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return db_user
+    return schemas.UserDetail.from_user(db_user, names)
 
 @app.put("/users/{user_id}", response_model=schemas.User, tags=["Users"])
 def update_user_put(user_id: int, user: schemas.UserCreate, db: Session = Depends(get_db)):
+    # el usuario primero: un 404 no debe costar un hash bcrypt
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    password_hash = passwords.hasher.hash(user.password)
     update_schema = schemas.UserUpdate(**user.model_dump())
-    return crud.update_user(db=db, db_user=db_user, user_update=update_schema)
+    return crud.update_user(db=db, db_user=db_user, user_update=update_schema, password_hash=password_hash)
 
 @app.patch("/users/{user_id}", response_model=schemas.User, tags=["Users"])
 def update_user_patch(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_db)):
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return crud.update_user(db=db, db_user=db_user, user_update=user)
+    password_hash = passwords.hasher.hash(user.password) if user.password is not None else None
+    return crud.update_user(db=db, db_user=db_user, user_update=user, password_hash=password_hash)
+
+# Borrado o anonimización masiva; va antes de /users/{user_id} para que "bulk" no se lea como id
+@app.delete("/users/bulk", response_model=schemas.UserPurgeResult, tags=["Users"],
+            responses={202: {"model": schemas.UserPurgeJob}})
+def delete_users_bulk(purge_request: schemas.UserPurgeRequest, shard: str = Depends(store_shard),
+                      db: Session = Depends(get_db)):
+    user_ids = sorted(set(purge_request.user_ids))
+    mode = purge_request.mode.value
+    if not purge_request.background:
+        if len(user_ids) > purge.USER_PURGE_SYNC_MAX:
+            raise HTTPException(status_code=400,
+                                detail=f"More than {purge.USER_PURGE_SYNC_MAX} users: use background=true")
+        return {"mode": mode, **purge.purge_users(db, user_ids, mode)}
+    job = purge.create_job(db, len(user_ids), mode)
+    purge.submit(job.job_id, user_ids, mode, shard)
+    return JSONResponse(status_code=202, content=schemas.UserPurgeJob.model_validate(job).model_dump(mode="json"),
+                        headers={"Location": f"/users/bulk/jobs/{job.job_id}"})
+
+@app.get("/users/bulk/jobs/{job_id}", response_model=schemas.UserPurgeJob, tags=["Users"])
+def read_users_bulk_job(job_id: int, db: Session = Depends(get_db)):
+    job = purge.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.delete("/users/{user_id}", response_model=schemas.User, tags=["Users"])
 def delete_user(user_id: int, db: Session = Depends(get_db)):
@@ -94,18 +428,25 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 
 # --- Endpoints de Employees ---
 @app.post("/employees/", response_model=schemas.Employee, tags=["Employees"])
-def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
+def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db),
+                    claim=Depends(idempotency.idempotency_key(schemas.Employee))):
     db_employee = crud.get_employee_by_email(db, email=employee.email)
     if db_employee:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_employee(db=db, employee=employee)
+    return crud.create_employee(db=db, employee=employee, on_created=claim)
 
 @app.get("/employees/", response_model=List[schemas.Employee], tags=["Employees"])
-def read_employees(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_employees(db, skip=skip, limit=limit)
+def read_employees(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                   fields: Optional[List[str]] = Depends(employee_fields), db: Session = Depends(get_read_db)):
+    columns = crud.projected_columns(models.Employee, schemas.Employee, fields, models.Employee.employee_id)
+    items = paginate(crud.get_employees_keyset, crud.get_employees, db, response, skip, limit, cursor, columns=columns)
+    return serialization.list_response(items, response, fields)
 
 @app.get("/employees/{employee_id}", response_model=schemas.Employee, tags=["Employees"])
-def read_employee(employee_id: int, db: Session = Depends(get_db)):
+def read_employee(employee_id: int, response: Response, fields: Optional[List[str]] = Depends(employee_fields),
+                  db: Session = Depends(get_read_db)):
+    if fields is not None:
+        return projected_detail(db, response, models.Employee.employee_id, employee_id, fields, "Employee not found")
     db_employee = crud.get_employee(db, employee_id=employee_id)
     if db_employee is None:
         raise HTTPException(status_code=404, detail="Employee not found")
@@ -135,18 +476,34 @@ def delete_employee(employee_id: int, db: Session = Depends(get_db)):
 
 # --- Endpoints de Invoices ---
 @app.post("/invoices/", response_model=schemas.Invoice, tags=["Invoices"])
-def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)):
+def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db),
+                   claim=Depends(idempotency.idempotency_key(schemas.Invoice))):
     db_invoice = crud.get_invoice_by_number(db, invoice_number=invoice.invoice_number)
     if db_invoice:
         raise HTTPException(status_code=400, detail="Invoice number already registered")
-    return crud.create_invoice(db=db, invoice=invoice)
+    return crud.create_invoice(db=db, invoice=invoice, on_created=claim)
 
 @app.get("/invoices/", response_model=List[schemas.Invoice], tags=["Invoices"])
-def read_invoices(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_invoices(db, skip=skip, limit=limit)
+def read_invoices(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  date_from: Optional[date] = None, date_to: Optional[date] = None,
+                  fields: Optional[List[str]] = Depends(invoice_fields), db: Session = Depends(get_read_db)):
+    columns = crud.projected_columns(models.Invoice, schemas.Invoice, fields, models.Invoice.invoice_id)
+    keyset_fn = partial(crud.get_invoices_keyset, date_from=date_from, date_to=date_to)
+    offset_fn = partial(crud.get_invoices, date_from=date_from, date_to=date_to)
+    items = paginate(keyset_fn, offset_fn, db, response, skip, limit, cursor, columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@app.get("/invoices/export", tags=["Invoices"])
+def export_invoices(request: Request, format: ExportFormat = ExportFormat.ndjson, date_from: Optional[date] = None,
+                    date_to: Optional[date] = None, user_id: Optional[int] = None, shard: str = Depends(store_shard)):
+    return stream_export(crud.iter_invoices_export, format, wants_primary(request), shard,
+                         date_from=date_from, date_to=date_to, user_id=user_id)
 
 @app.get("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
-def read_invoice(invoice_id: int, db: Session = Depends(get_db)):
+def read_invoice(invoice_id: int, response: Response, fields: Optional[List[str]] = Depends(invoice_fields),
+                 db: Session = Depends(get_read_db)):
+    if fields is not None:
+        return projected_detail(db, response, models.Invoice.invoice_id, invoice_id, fields, "Invoice not found")
     db_invoice = crud.get_invoice(db, invoice_id=invoice_id)
     if db_invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
@@ -154,12 +511,12 @@ def read_invoice(invoice_id: int, db: Session = Depends(get_db)):
 
 # un get que es de la union de tablas...
 @app.get("/users/{user_id}/invoices/", response_model=List[schemas.Invoice], tags=["Users"])
-def read_invoices_for_user(user_id: int, db: Session = Depends(get_db)):
-# Primero, verifica que el usuario exista para dar un error claro
-    db_user = crud.get_user(db, user_id=user_id)
-    if db_user is None:
+def read_invoices_for_user(user_id: int, db: Session = Depends(get_read_db)):
+# Una sola consulta: None indica que el usuario no existe, para dar un error claro
+    db_invoices = crud.get_user_invoices(db=db, user_id=user_id)
+    if db_invoices is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return crud.get_invoices_by_user(db=db, user_id=user_id)
+    return db_invoices
 
 @app.put("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
 def update_invoice_put(invoice_id: int, invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)):
@@ -185,15 +542,35 @@ def delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
 
 # --- Endpoints de Purchases ---
 @app.post("/purchases/", response_model=schemas.Purchase, tags=["Purchases"])
-def create_purchase(purchase: schemas.PurchaseCreate, db: Session = Depends(get_db)):
-    return crud.create_purchase(db=db, purchase=purchase)
+def create_purchase(purchase: schemas.PurchaseCreate, db: Session = Depends(get_db),
+                    claim=Depends(idempotency.idempotency_key(schemas.Purchase))):
+    return crud.create_purchase(db=db, purchase=purchase, on_created=claim)
+
+@app.post("/purchases/bulk", response_model=schemas.BulkResult, tags=["Purchases"])
+def create_purchases_bulk(request: Request, body: bytes = Depends(read_raw_body), db: Session = Depends(get_db)):
+    return bulk_load(crud.bulk_create_purchases, db, request, body, schemas.PurchaseCreate)
 
 @app.get("/purchases/", response_model=List[schemas.Purchase], tags=["Purchases"])
-def read_purchases(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_purchases(db, skip=skip, limit=limit)
+def read_purchases(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                   date_from: Optional[date] = None, date_to: Optional[date] = None,
+                   fields: Optional[List[str]] = Depends(purchase_fields), db: Session = Depends(get_read_db)):
+    columns = crud.projected_columns(models.Purchase, schemas.Purchase, fields, models.Purchase.purchase_id)
+    keyset_fn = partial(crud.get_purchases_keyset, date_from=date_from, date_to=date_to)
+    offset_fn = partial(crud.get_purchases, date_from=date_from, date_to=date_to)
+    items = paginate(keyset_fn, offset_fn, db, response, skip, limit, cursor, columns=columns)
+    return serialization.list_response(items, response, fields)
+
+@app.get("/purchases/export", tags=["Purchases"])
+def export_purchases(request: Request, format: ExportFormat = ExportFormat.ndjson, date_from: Optional[date] = None,
+                     date_to: Optional[date] = None, user_id: Optional[int] = None, shard: str = Depends(store_shard)):
+    return stream_export(crud.iter_purchases_export, format, wants_primary(request), shard,
+                         date_from=date_from, date_to=date_to, user_id=user_id)
 
 @app.get("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
-def read_purchase(purchase_id: int, db: Session = Depends(get_db)):
+def read_purchase(purchase_id: int, response: Response, fields: Optional[List[str]] = Depends(purchase_fields),
+                  db: Session = Depends(get_read_db)):
+    if fields is not None:
+        return projected_detail(db, response, models.Purchase.purchase_id, purchase_id, fields, "Purchase not found")
     db_purchase = crud.get_purchase(db, purchase_id=purchase_id)
     if db_purchase is None:
         raise HTTPException(status_code=404, detail="Purchase not found")
@@ -201,12 +578,12 @@ def read_purchase(purchase_id: int, db: Session = Depends(get_db)):
 
 # el otro get de la unin de tablas
 @app.get("/users/{user_id}/purchases/", response_model=List[schemas.Purchase], tags=["Users"])
-def read_purchases_for_user(user_id: int, db: Session = Depends(get_db)):
-# Verifica que el usuario exista
-    db_user = crud.get_user(db, user_id=user_id)
-    if db_user is None:
+def read_purchases_for_user(user_id: int, db: Session = Depends(get_read_db)):
+# Verifica que el usuario exista en la misma consulta
+    db_purchases = crud.get_user_purchases(db=db, user_id=user_id)
+    if db_purchases is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return crud.get_purchases_by_user(db=db, user_id=user_id)
+    return db_purchases
 
 @app.put("/purchases/{purchase_id}", response_model=schemas.Purchase, tags=["Purchases"])
 def update_purchase_put(purchase_id: int, purchase: schemas.PurchaseCreate, db: Session = Depends(get_db)):
@@ -228,4 +605,114 @@ def delete_purchase(purchase_id: int, db: Session = Depends(get_db)):
     db_purchase = crud.get_purchase(db, purchase_id=purchase_id)
     if db_purchase is None:
         raise HTTPException(status_code=404, detail="Purchase not found")
-    return crud.delete_purchase(db=db, db_purchase=db_purchase)
\ No newline at end of file
+    return crud.delete_purchase(db=db, db_purchase=db_purchase)
+
+# --- Checkout (factura, compras y stock en una transacción) ---
+@app.post("/checkout", response_model=schemas.CheckoutResult, tags=["Checkout"])
+def checkout(basket: schemas.CheckoutCreate, db: Session = Depends(get_db),
+             claim=Depends(idempotency.idempotency_key(schemas.CheckoutResult))):
+    try:
+        return crud.checkout(db, basket, on_created=claim)
+    except crud.InsufficientStock as exc:
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock or product not found",
+                                                     "product_ids": exc.product_ids})
+    except crud.CheckoutError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+# --- Importación masiva (CSV/Parquet por COPY, ver importer.py) ---
+# El cuerpo se vuelca por trozos a un archivo temporal: la memoria no depende del tamaño del archivo.
+# Las operaciones del archivo van al threadpool (como UploadFile de Starlette) para no bloquear
+# el event loop, agrupadas en escrituras de hasta IMPORT_SPOOL_WRITE_BYTES.
+IMPORT_SPOOL_WRITE_BYTES = 1024 * 1024
+
+async def spool_upload(request: Request):
+    upload = await run_in_threadpool(tempfile.TemporaryFile)
+    try:
+        pending, size = [], 0
+        async for chunk in request.stream():
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= IMPORT_SPOOL_WRITE_BYTES:
+                await run_in_threadpool(upload.write, b"".join(pending))
+                pending, size = [], 0
+        await run_in_threadpool(upload.write, b"".join(pending))
+        await run_in_threadpool(upload.seek, 0)
+        yield upload
+    finally:
+        await run_in_threadpool(upload.close)
+
+@app.post("/import/{kind}", response_model=schemas.ImportResult, tags=["Import"])
+def import_file(kind: schemas.ImportKindEnum, format: schemas.ImportFormatEnum = schemas.ImportFormatEnum.csv,
+                upload=Depends(spool_upload), db: Session = Depends(get_db)):
+    rejects = []
+
+    def on_reject(row: int, detail: str):
+        if len(rejects) < importer.IMPORT_MAX_REJECTS:
+            rejects.append(schemas.ImportRejectedRow(row=row, detail=detail))
+
+    try:
+        totals = importer.import_stream(db, kind.value, upload, format.value, on_reject=on_reject)
+    except importer.ImportFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return schemas.ImportResult(**totals, rejects=rejects)
+
+# --- Feed de cambios ---
+# Long-poll por defecto ({"next": seq, "changes": [...]}, espera hasta timeout s) o
+# Server-Sent Events con Accept: text/event-stream (reanuda con Last-Event-ID).
+# Sin since se empieza en el último cambio; 410 si since ya se purgó del log.
+# Cada shard tiene su propio log y sus seq: el feed es el de la tienda de X-Store-Id.
+CHANGES_HEARTBEAT_SECONDS = 15
+
+@app.get("/changes", tags=["Changes"])
+async def read_changes(request: Request, since: Optional[int] = None, entity: Optional[schemas.ChangeEntityEnum] = None,
+                       timeout: float = Query(25, ge=0, le=60), last_event_id: Optional[int] = Header(None),
+                       shard: str = Depends(store_shard)):
+    feed = changes.feed_for(shard)
+    entity = entity.value if entity else None
+    if since is None:
+        since = last_event_id if last_event_id is not None else await feed.current_seq()
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    try:
+        items, cursor = await feed.next_batch(since, entity, 0 if sse else timeout)
+    except changes.ChangesExpired:
+        raise HTTPException(status_code=410, detail="since is older than the retained change log, resync")
+    if sse:
+        return StreamingResponse(feed.stream(entity, (items, cursor), CHANGES_HEARTBEAT_SECONDS),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return Response(content=changes.long_poll_body(items, cursor), media_type="application/json")
+
+# --- Endpoints de Analytics (servidos desde las tablas de resumen) ---
+@app.get("/analytics/revenue", response_model=List[schemas.RevenuePoint], tags=["Analytics"])
+def read_revenue(granularity: schemas.GranularityEnum = schemas.GranularityEnum.day,
+                 source: schemas.SalesSourceEnum = schemas.SalesSourceEnum.purchases,
+                 date_from: Optional[date] = None, date_to: Optional[date] = None, db: Session = Depends(get_read_db)):
+    return analytics.revenue(db, source.value, granularity.value, date_from, date_to)
+
+@app.get("/analytics/top-users", response_model=List[schemas.TopUser], tags=["Analytics"])
+def read_top_users(source: schemas.SalesSourceEnum = schemas.SalesSourceEnum.purchases, limit: int = 10,
+                   db: Session = Depends(get_read_db)):
+    return analytics.top_users(db, source.value, limit)
+
+@app.get("/analytics/payment-mix", response_model=List[schemas.PaymentMix], tags=["Analytics"])
+def read_payment_mix(source: schemas.SalesSourceEnum = schemas.SalesSourceEnum.purchases,
+                     date_from: Optional[date] = None, date_to: Optional[date] = None, db: Session = Depends(get_read_db)):
+    return analytics.payment_mix(db, source.value, date_from, date_to)
+
+# Modo async: sustituye los endpoints CRUD sync por los de async_api (mismo path y método).
+# async_api lee siempre del primario: con réplicas los GET siguen siendo los sync (get_read_db).
+def with_async_routes(routes):
+    from fastapi.routing import APIRoute
+    from . import async_api
+
+    replaced = {(route.path, method) for route in async_api.router.routes for method in route.methods
+                if not (replicas.engines and method == "GET")}
+
+    def swapped(route):
+        return isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods)
+
+    return ([route for route in routes if not swapped(route)]
+            + [route for route in async_api.router.routes if swapped(route)])
+
+if DB_ASYNC:
+    app.router.routes = with_async_routes(app.router.routes)
@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+
+from fastapi.routing import APIRoute
+
+# Métricas en formato de texto de Prometheus, sin dependencias externas.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Cabecera de depuración X-Query-Count en cada respuesta
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "0").lower() in ("1", "true", "yes")
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+class PoolMetrics:
+    """Espera para obtener conexión del pool y errores de conexión (acumulados por proceso)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_seconds_sum = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.connection_errors = 0
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_sum += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def connection_error(self):
+        with self._lock:
+            self.connection_errors += 1
+
+pool_metrics = PoolMetrics()
+
+def _line(name: str, kind: str, help_text: str, value) -> str:
+    return f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n{name} {value}\n"
+
+def render_pool_metrics(engine) -> str:
+    pool = engine.pool
+    out = []
+    # Sólo QueuePool expone tamaño y overflow (sqlite en memoria usa otros pools)
+    if hasattr(pool, "checkedout"):
+        out.append(_line("db_pool_size", "gauge", "Configured pool size.", pool.size()))
+        out.append(_line("db_pool_checked_out", "gauge", "Connections currently checked out.", pool.checkedout()))
+        out.append(_line("db_pool_checked_in", "gauge", "Idle connections in the pool.", pool.checkedin()))
+        out.append(_line("db_pool_overflow", "gauge", "Overflow connections currently open.", max(pool.overflow(), 0)))
+    m = pool_metrics
+    out.append(_line("db_pool_acquire_wait_seconds_sum", "counter", "Total time spent waiting for a pooled connection.", m.wait_seconds_sum))
+    out.append(_line("db_pool_acquire_wait_seconds_count", "counter", "Number of pooled connection acquisitions.", m.wait_count))
+    out.append(_line("db_pool_acquire_wait_seconds_max", "gauge", "Longest wait for a pooled connection.", m.wait_seconds_max))
+    out.append(_line("db_pool_timeouts_total", "counter", "Acquisitions that hit pool_timeout.", m.timeouts))
+    out.append(_line("db_connection_errors_total", "counter", "Errors connecting to or losing the database connection.", m.connection_errors))
+    return "".join(out)
+
+def render_cache_metrics(name: str, cache) -> str:
+    stats = cache.stats
+    return "".join([
+        _line(f"cache_{name}_hits_total", "counter", f"{name} cache hits.", stats.hits),
+        _line(f"cache_{name}_misses_total", "counter", f"{name} cache misses.", stats.misses),
+        _line(f"cache_{name}_evictions_total", "counter", f"{name} cache evictions (LRU or TTL).", stats.evictions),
+    ])
+
+def render_password_hasher_metrics(hasher) -> str:
+    return "".join([
+        _line("password_hash_pending", "gauge", "Password hash/verify operations running or queued.", hasher.pending),
+        _line("password_hash_max_pending", "gauge", "Queue limit before rejecting with 503.", hasher.max_pending),
+        _line("password_hash_rejected_total", "counter", "Operations rejected because the pool was saturated.", hasher.rejected),
+    ])
+
+def render_change_feed_metrics(feeds) -> str:
+    """feeds: {shard: ChangeFeed}; una serie por shard."""
+    out = []
+    for name, help_text, value in (
+        ("changes_subscribers", "Open Server-Sent Events connections on /changes.", lambda feed: feed.subscribers),
+        ("changes_last_seq", "Last change_log seq seen by this worker.", lambda feed: feed.last_seq or 0),
+    ):
+        out.append(f"# HELP {name} {help_text}\n# TYPE {name} gauge\n")
+        for shard, feed in sorted(feeds.items()):
+            out.append(f'{name}{{shard="{shard}"}} {value(feed)}\n')
+    return "".join(out)
+
+# --- Métricas por petición ---
+class RequestStats:
+    """Acumulado de una petición; se comparte con el threadpool vía contextvar."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.endpoint_done = None
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RouteMetrics:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds_sum = 0.0
+        self.queries_sum = 0
+        self.db_seconds_sum = 0.0
+        self.serialization_seconds_sum = 0.0
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats, serialization: float):
+        with self._lock:
+            m = self.routes.setdefault((method, route, status), RouteMetrics())
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    m.buckets[i] += 1
+            m.count += 1
+            m.seconds_sum += seconds
+            m.queries_sum += stats.queries
+            m.db_seconds_sum += stats.db_seconds
+            m.serialization_seconds_sum += serialization
+
+request_metrics = RequestMetrics()
+
+def instrument_engine(sync_engine):
+    """Cuenta sentencias y tiempo de BD por petición, y registra las consultas lentas."""
+    from sqlalchemy import event
+
+    # query_start es una pila de (contexto, inicio) por conexión
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append((context, time.perf_counter()))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _observe(conn.info["query_start"].pop()[1], statement, parameters)
+
+    # una sentencia que falla no llega a after_cursor_execute: sin esto su inicio se quedaría en la pila
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None and not conn.closed else None
+        if starts and starts[-1][0] is exception_context.execution_context:
+            _observe(starts.pop()[1], exception_context.statement, exception_context.parameters)
+
+def _observe(started: float, statement, parameters):
+    elapsed = time.perf_counter() - started
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning("slow query (%.1f ms): %s | params=%r", elapsed * 1000, statement, parameters)
+
+class InstrumentedRoute(APIRoute):
+    """Marca cuándo termina el endpoint; lo que sigue hasta la respuesta es serialización."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed(*args, **kw):
+                try:
+                    return await endpoint(*args, **kw)
+                finally:
+                    _mark_endpoint_done()
+        else:
+            @functools.wraps(endpoint)
+            def timed(*args, **kw):
+                try:
+                    return endpoint(*args, **kw)
+                finally:
+                    _mark_endpoint_done()
+        super().__init__(path, timed, **kwargs)
+
+def _mark_endpoint_done():
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.endpoint_done = time.perf_counter()
+
+class RequestMetricsMiddleware:
+    """Middleware ASGI: latencia, consultas SQL, tiempo de BD y de serialización por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+        response_started = None
+
+        async def send_wrapper(message):
+            nonlocal status, response_started
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_started = time.perf_counter()
+                if QUERY_COUNT_HEADER:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-count", str(stats.queries).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "<unmatched>")
+            serialization = 0.0
+            if stats.endpoint_done is not None and response_started is not None:
+                serialization = max(response_started - stats.endpoint_done, 0.0)
+            request_metrics.observe(scope["method"], path, status, time.perf_counter() - start, stats, serialization)
+
+def render_request_metrics() -> str:
+    with request_metrics._lock:
+        routes = sorted(request_metrics.routes.items())
+        out = [
+            "# HELP http_request_duration_seconds Request latency by route.\n",
+            "# TYPE http_request_duration_seconds histogram\n",
+        ]
+        for (method, route, status), m in routes:
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            for bound, count in zip(LATENCY_BUCKETS, m.buckets):
+                out.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}\n')
+            out.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {m.count}\n')
+            out.append(f"http_request_duration_seconds_sum{{{labels}}} {m.seconds_sum}\n")
+            out.append(f"http_request_duration_seconds_count{{{labels}}} {m.count}\n")
+        for name, help_text, attr in (
+            ("http_request_sql_queries_total", "SQL statements executed by route.", "queries_sum"),
+            ("http_request_db_seconds_total", "Time spent in SQL statements by route.", "db_seconds_sum"),
+            ("http_request_serialization_seconds_total", "Time from endpoint return to response start by route.", "serialization_seconds_sum"),
+        ):
+            out.append(f"# HELP {name} {help_text}\n# TYPE {name} counter\n")
+            for (method, route, status), m in routes:
+                out.append(f'{name}{{method="{method}",route="{route}",status="{status}"}} {getattr(m, attr)}\n')
+    return "".join(out)
@@ -1,6 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, TIMESTAMP, Date, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Numeric, Boolean, TIMESTAMP, Date, ForeignKey, Index, DDL, event, func
+from sqlalchemy.orm import relationship
 from .database import Base
 
+# pg_trgm para los índices de búsqueda por subcadena (ILIKE '%...%')
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+# Las fechas por defecto usan func.now(): con create_all (pruebas), now() en PostgreSQL y
+# CURRENT_TIMESTAMP en SQLite; el literal 'now()' quedaba fijo o se guardaba como texto.
+
 class Product(Base):
     __tablename__ = "products"
     
@@ -12,6 +19,20 @@ class Product(Base):
     category = Column(String(100))
     stock_quantity = Column(Integer, default=0)
     is_active = Column(Boolean, default=True)
+    # versión de fila: ETag y control de concurrencia optimista (UPDATE ... WHERE version = :v)
+    version = Column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        Index("ix_products_category_active_price", "category", "is_active", "price"),
+        Index("ix_products_price", "price"),
+        Index("ix_products_name", "name"),
+        Index("ix_products_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_products_description_trgm", "description", postgresql_using="gin",
+              postgresql_ops={"description": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -23,7 +44,12 @@ class User(Base):
     last_name = Column(String(100))
     phone_number = Column(String(20))
     address = Column(Text)
-    registration_date = Column(TIMESTAMP, server_default='now()')
+    registration_date = Column(TIMESTAMP, server_default=func.now())
+
+    # lazy="raise": se cargan sólo con selectinload explícito (sin N+1 implícitos);
+    # passive_deletes: el ORM no carga los hijos al borrar el usuario
+    invoices = relationship("Invoice", lazy="raise", passive_deletes=True, order_by="Invoice.invoice_date")
+    purchases = relationship("Purchase", lazy="raise", passive_deletes=True, order_by="Purchase.purchase_date")
 
 class Employee(Base):
     __tablename__ = "employees"
@@ -44,22 +70,115 @@ class Invoice(Base):
     invoice_number = Column(String(50), unique=True, index=True, nullable=False)
     invoice_date = Column(Date, nullable=False)
     due_date = Column(Date)
-    created_at = Column(TIMESTAMP, server_default='now()')
+    created_at = Column(TIMESTAMP, server_default=func.now())
     total_amount = Column(Numeric(12, 2), nullable=False)
     payment_status = Column(String(50))  
     payment_method = Column(String(50))  
     billing_address = Column(Text)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
 
+    __table_args__ = (
+        Index("ix_invoices_user_id_invoice_date", "user_id", "invoice_date"),
+    )
+
 class Purchase(Base):
     __tablename__ = "purchases"
     
     purchase_id = Column(Integer, primary_key=True, index=True)
-    purchase_date = Column(TIMESTAMP, server_default='now()')
+    purchase_date = Column(TIMESTAMP, server_default=func.now())
     item_description = Column(Text)
     quantity = Column(Integer, nullable=False)
     total_amount = Column(Numeric(12, 2), nullable=False)
     payment_method = Column(String(50)) 
     payment_status = Column(String(50))  
     delivery_status = Column(String(50)) 
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
\ No newline at end of file
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_purchases_user_id_purchase_date", "user_id", "purchase_date"),
+    )
+
+# --- Resúmenes de ventas (mantenidos de forma incremental por analytics.py) ---
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+
+    source = Column(String(20), primary_key=True)  # 'invoices' | 'purchases'
+    day = Column(Date, primary_key=True)
+    payment_method = Column(String(50), primary_key=True)
+    # fila parcial del hilo que escribe (analytics.ANALYTICS_SLOTS): reparte el bloqueo de la fila del día
+    slot = Column(Integer, primary_key=True, server_default="0")
+    sales_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Numeric(14, 2), nullable=False, default=0)
+
+class SalesByUser(Base):
+    __tablename__ = "sales_by_user"
+
+    source = Column(String(20), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    sales_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_sales_by_user_source_total", "source", "total_amount"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 de método + ruta + cabecera Idempotency-Key
+    key_hash = Column(String(64), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    # NULL hasta que la petición original guarda su respuesta (en su misma transacción)
+    status_code = Column(Integer)
+    response_body = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False, index=True)
+
+# BIGINT en PostgreSQL; en SQLite sólo INTEGER PRIMARY KEY se autonumera
+SequenceKey = BigInteger().with_variant(Integer, "sqlite")
+
+# Registro de cambios para GET /changes (changes.relay lo llena desde change_outbox en orden de commit)
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+
+    seq = Column(SequenceKey, primary_key=True)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)  # 'create' | 'update' | 'delete' | 'upsert'
+    changed_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_change_log_entity_seq", "entity", "seq"),
+        Index("ix_change_log_changed_at", "changed_at"),
+    )
+
+# Cambios todavía sin seq: changes.record los escribe sin bloqueos en cada escritura de crud.py
+class ChangeOutbox(Base):
+    __tablename__ = "change_outbox"
+
+    id = Column(SequenceKey, primary_key=True)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)
+    changed_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    # transacción que escribió la fila (pg_current_xact_id); NULL fuera de PostgreSQL
+    xact_id = Column(BigInteger)
+
+    __table_args__ = (
+        Index("ix_change_outbox_xact_id_id", "xact_id", "id"),
+    )
+
+# Trabajos de borrado/anonimización masiva de usuarios (purge.py): progreso consultable
+class UserPurgeJob(Base):
+    __tablename__ = "user_purge_jobs"
+
+    job_id = Column(Integer, primary_key=True)
+    mode = Column(String(10), nullable=False)  # 'delete' | 'anonymize'
+    status = Column(String(10), nullable=False, default="pending")  # 'pending' | 'running' | 'done' | 'failed'
+    user_count = Column(Integer, nullable=False)
+    # filas afectadas hasta ahora (se actualizan en la transacción de cada bloque)
+    users = Column(Integer, nullable=False, default=0)
+    invoices = Column(Integer, nullable=False, default=0)
+    purchases = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    finished_at = Column(TIMESTAMP)
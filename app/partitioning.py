@@ -0,0 +1,216 @@
+"""Particionado mensual por rango de purchases (purchase_date) e invoices (invoice_date).
+
+    python -m app.partitioning migrate [--months-ahead 3] [--drop-legacy]
+    python -m app.partitioning maintain [--months-ahead 3]
+    python -m app.partitioning retention --keep-months 24 [--detach-only]
+
+migrate convierte la tabla existente en una tabla particionada (la original
+queda como <tabla>_legacy hasta verificar los datos, sin sus claves foráneas:
+la tabla nueva tiene la suya a users, y la copia no debe impedir borrar usuarios). maintain crea las
+particiones de los próximos meses; la API lo ejecuta al arrancar. retention
+separa (DETACH) y elimina particiones completas en lugar de borrar filas.
+Si la partición DEFAULT ya tiene filas del mes que se crea, éstas pasan a la
+partición nueva en la misma transacción (si no, CREATE ... PARTITION OF falla).
+
+En PostgreSQL una restricción UNIQUE de una tabla particionada debe incluir la
+clave de partición: tras migrar, invoice_number sólo sería único por
+invoice_date. La unicidad global la mantiene invoice_numbers, una tabla sin
+particionar con invoice_number como PK que un trigger de invoices actualiza en
+la misma transacción que cada INSERT, UPDATE o DELETE. Retention no libera los
+números de las particiones que separa o elimina.
+"""
+import argparse
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+PARTITIONED_TABLES = {
+    "purchases": {
+        "column": "purchase_date",
+        "pk": "purchase_id",
+        "indexes": [
+            "CREATE INDEX ix_purchases_user_id_purchase_date ON purchases (user_id, purchase_date)",
+        ],
+    },
+    "invoices": {
+        "column": "invoice_date",
+        "pk": "invoice_id",
+        "indexes": [
+            "CREATE UNIQUE INDEX ix_invoices_invoice_number_date ON invoices (invoice_number, invoice_date)",
+            "CREATE INDEX ix_invoices_invoice_number ON invoices (invoice_number)",
+            "CREATE INDEX ix_invoices_user_id_invoice_date ON invoices (user_id, invoice_date)",
+        ],
+        # se ejecuta antes de copiar las filas: la copia ya rellena invoice_numbers
+        "setup": [
+            "CREATE TABLE invoice_numbers (invoice_number VARCHAR(50) PRIMARY KEY)",
+            """CREATE OR REPLACE FUNCTION invoice_numbers_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM invoice_numbers WHERE invoice_number = OLD.invoice_number;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO invoice_numbers (invoice_number) VALUES (NEW.invoice_number);
+                END IF;
+                RETURN NULL;
+            END $$""",
+            "CREATE TRIGGER invoices_invoice_numbers AFTER INSERT OR DELETE OR UPDATE OF invoice_number "
+            "ON invoices FOR EACH ROW EXECUTE FUNCTION invoice_numbers_sync()",
+        ],
+    },
+}
+
+# clave del advisory lock de maintain: varios workers arrancan a la vez
+PARTITION_MAINTENANCE_LOCK = 7420002
+
+def _month_start(day: date, offset: int = 0) -> date:
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :t"
+    ), {"t": table}).first() is not None
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar() is not None
+
+def create_partition(conn, table: str, month: date):
+    """Crea la partición del mes; las filas de ese mes que haya en la partición DEFAULT pasan a ella."""
+    name = partition_name(table, month)
+    if _exists(conn, name):
+        return
+    column = PARTITIONED_TABLES[table]["column"]
+    bounds = {"start": month, "end": _month_start(month, 1)}
+    moved = 0
+    if _exists(conn, f"{table}_default"):
+        # se sacan y se vuelven a insertar por la tabla padre: los triggers (invoice_numbers) ven ambos pasos
+        conn.execute(text(f"CREATE TEMPORARY TABLE {name}_moving (LIKE {table}) ON COMMIT DROP"))
+        moved = conn.execute(text(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE {column} >= :start AND {column} < :end RETURNING *) "
+            f"INSERT INTO {name}_moving SELECT * FROM moved"
+        ), bounds).rowcount
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_month_start(month, 1).isoformat()}')"
+    ))
+    if moved:
+        conn.execute(text(f"INSERT INTO {table} SELECT * FROM {name}_moving"))
+
+def ensure_partitions(conn, table: str, months_ahead: int = 3, today: date = None):
+    """Crea las particiones del mes actual y de los próximos months_ahead meses."""
+    current = _month_start(today or date.today())
+    for offset in range(months_ahead + 1):
+        create_partition(conn, table, _month_start(current, offset))
+
+def migrate(conn, table: str, months_ahead: int = 3, drop_legacy: bool = False):
+    """Convierte la tabla en particionada copiando sus filas; todo en la transacción de conn."""
+    config = PARTITIONED_TABLES[table]
+    column, pk = config["column"], config["pk"]
+    legacy = f"{table}_legacy"
+
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    # si no, DELETE FROM users (app/purge.py) fallaría por las filas de la copia
+    for (constraint,) in conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'f'"
+    ), {"t": legacy}):
+        conn.execute(text(f'ALTER TABLE {legacy} DROP CONSTRAINT "{constraint}"'))
+    # los nombres de índices son globales en el esquema: se renombran los de la tabla vieja
+    for (index_name,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": legacy}):
+        conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+
+    conn.execute(text(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                      f"PARTITION BY RANGE ({column})"))
+    conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({pk}, {column})"))
+    conn.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES users (user_id)"))
+    for ddl in config["indexes"] + config.get("setup", []):
+        conn.execute(text(ddl))
+
+    first = conn.execute(text(f"SELECT min({column}) FROM {legacy}")).scalar()
+    month = _month_start(first) if first is not None else _month_start(date.today())
+    last = _month_start(date.today(), months_ahead)
+    latest = conn.execute(text(f"SELECT max({column}) FROM {legacy}")).scalar()
+    if latest is not None:
+        last = max(last, _month_start(latest))
+    while month <= last:
+        create_partition(conn, table, month)
+        month = _month_start(month, 1)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+    columns = [row[0] for row in conn.execute(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = :t ORDER BY ordinal_position"
+    ), {"t": legacy})]
+    select_list = ", ".join(f"COALESCE({c}, now())" if c == column else c for c in columns)
+    conn.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select_list} FROM {legacy}"))
+
+    # la secuencia del id pasa a pertenecer a la tabla nueva
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, :c)"), {"t": legacy, "c": pk}).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{pk}"))
+    if drop_legacy:
+        conn.execute(text(f"DROP TABLE {legacy}"))
+
+def apply_retention(conn, table: str, keep_months: int, detach_only: bool = False, today: date = None):
+    """Separa/elimina las particiones mensuales anteriores a keep_months meses. Devuelve sus nombres."""
+    cutoff = _month_start(today or date.today(), -keep_months)
+    pattern = re.compile(rf"^{table}_y(\d{{4}})m(\d{{2}})$")
+    removed = []
+    partitions = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :t ORDER BY c.relname"
+    ), {"t": table}).scalars().all()
+    for name in partitions:
+        match = pattern.match(name)
+        if not match or date(int(match.group(1)), int(match.group(2)), 1) >= cutoff:
+            continue
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if not detach_only:
+            conn.execute(text(f"DROP TABLE {name}"))
+        removed.append(name)
+    return removed
+
+def maintain(engine, months_ahead: int = 3):
+    """Crea las próximas particiones de las tablas que ya estén particionadas."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PARTITION_MAINTENANCE_LOCK})
+        for table in PARTITIONED_TABLES:
+            if is_partitioned(conn, table):
+                ensure_partitions(conn, table, months_ahead)
+
+def main():
+    from .database import get_engine
+
+    engine = get_engine()
+    parser = argparse.ArgumentParser(description="Particionado mensual de purchases e invoices.")
+    parser.add_argument("command", choices=["migrate", "maintain", "retention"])
+    parser.add_argument("--table", choices=sorted(PARTITIONED_TABLES), action="append")
+    parser.add_argument("--months-ahead", type=int, default=3)
+    parser.add_argument("--keep-months", type=int, default=24)
+    parser.add_argument("--detach-only", action="store_true")
+    parser.add_argument("--drop-legacy", action="store_true")
+    args = parser.parse_args()
+    tables = args.table or list(PARTITIONED_TABLES)
+
+    with engine.begin() as conn:
+        for table in tables:
+            if args.command == "migrate":
+                if is_partitioned(conn, table):
+                    print(f"{table}: ya está particionada")
+                    continue
+                migrate(conn, table, args.months_ahead, args.drop_legacy)
+                print(f"{table}: migrada" + ("" if args.drop_legacy else f" ({table}_legacy conservada)"))
+            elif args.command == "maintain":
+                if is_partitioned(conn, table):
+                    ensure_partitions(conn, table, args.months_ahead)
+            else:
+                for name in apply_retention(conn, table, args.keep_months, args.detach_only):
+                    print(f"{table}: {'separada' if args.detach_only else 'eliminada'} {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Hash de contraseñas con bcrypt en un pool de procesos acotado.
+
+bcrypt es deliberadamente lento (decenas a cientos de ms de CPU por hash): en
+el threadpool de los endpoints sync, o en el event loop, frenaría al resto de
+peticiones del worker. Aquí se ejecuta en PASSWORD_HASH_WORKERS procesos; si
+ya hay PASSWORD_HASH_MAX_PENDING operaciones en curso o en cola se rechaza
+con HasherBusy (503) en lugar de acumular esperas.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 4)))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+class HasherBusy(Exception):
+    """Cola del pool llena: el cliente debe reintentar más tarde."""
+
+# Se ejecutan en los procesos del pool (funciones de módulo: deben poder serializarse)
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+    except ValueError:
+        # hash que no es bcrypt (usuarios anteriores al hash en servidor)
+        return False
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._dummy_hash = None
+        self._lock = threading.Lock()
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy()
+            if self._executor is None:
+                # spawn: los procesos no heredan hilos ni conexiones del worker
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self.pending += 1
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    # Versiones bloqueantes para los endpoints sync (el hilo espera sin usar CPU)
+    def hash(self, password: str) -> str:
+        return self._submit(_hash, password, self.rounds).result()
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._submit(_verify, password, password_hash).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(_hash, password, self.rounds))
+
+    async def verify_async(self, password: str, password_hash: str) -> bool:
+        return await asyncio.wrap_future(self._submit(_verify, password, password_hash))
+
+    def dummy_hash(self) -> str:
+        """Hash para verificar cuando el email no existe: misma duración que un login real."""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(os.urandom(16).hex())
+        return self._dummy_hash
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, BCRYPT_ROUNDS)
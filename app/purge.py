@@ -0,0 +1,181 @@
+"""Borrado y anonimización masiva de usuarios (DELETE /users/bulk).
+
+Todo es SQL por conjuntos: las facturas y compras nunca se cargan en Python.
+Cada transacción bloquea como mucho USER_PURGE_CHUNK_ROWS filas (SELECT ...
+FOR UPDATE), copia sus PK a una tabla temporal y sobre ella resta de los
+resúmenes, borra o anonimiza y escribe change_log; luego hace commit. Así los
+bloqueos duran un bloque y un trabajo interrumpido se puede relanzar con los
+mismos ids: lo ya hecho no se repite.
+
+- delete: borra compras, facturas, los resúmenes por usuario y el usuario.
+- anonymize: conserva el historial de ventas pero borra los datos personales
+  (email, nombre, teléfono, direcciones) y el hash de la contraseña.
+
+    python -m app.purge delete --ids-file usuarios.txt
+"""
+import argparse
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, cast, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import analytics, changes, models
+from .database import DEFAULT_SHARD, SessionLocal, shard_session
+
+USER_PURGE_BATCH_USERS = int(os.getenv("USER_PURGE_BATCH_USERS", "500"))
+USER_PURGE_CHUNK_ROWS = int(os.getenv("USER_PURGE_CHUNK_ROWS", "5000"))
+# DELETE /users/bulk sin background acepta como mucho estos usuarios
+USER_PURGE_SYNC_MAX = int(os.getenv("USER_PURGE_SYNC_MAX", "100"))
+# password_hash de un usuario anonimizado: no es bcrypt, nunca verifica
+ANONYMIZED_HASH = "!"
+
+logger = logging.getLogger("app.purge")
+
+# PK del bloque actual. En PostgreSQL ON COMMIT DROP la borra al terminar cada transacción;
+# en el resto de dialectos la tabla temporal dura lo que la conexión y se vacía tras cada bloque
+_chunk = Table("purge_chunk", MetaData(), Column("id", Integer, primary_key=True),
+               prefixes=["TEMPORARY"], postgresql_on_commit="DROP")
+
+class PurgeInterrupted(Exception):
+    """La API se está deteniendo; el trabajo se puede relanzar con los mismos ids."""
+
+_stopping = threading.Event()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-purge")
+
+def _no_progress(db: Session, field: str, count: int):
+    pass
+
+def _in_chunks(db: Session, pk_select, apply, field: str, on_progress):
+    """Repite hasta agotar pk_select: bloquea un bloque, apply(db, pk_del_bloque) y commit."""
+    total = 0
+    while True:
+        if _stopping.is_set():
+            raise PurgeInterrupted()
+        _chunk.create(db.connection(), checkfirst=True)
+        locked = pk_select.limit(USER_PURGE_CHUNK_ROWS).with_for_update()
+        count = db.execute(insert(_chunk).from_select(["id"], locked)).rowcount
+        if not count:
+            db.rollback()
+            return total
+        on_progress(db, field, count)
+        apply(db, select(_chunk.c.id))
+        db.execute(delete(_chunk))
+        db.commit()
+        total += count
+
+def _bulk(stmt):
+    # sin sincronizar la sesión: el ORM no trae las PK afectadas (RETURNING) a Python
+    return stmt.execution_options(synchronize_session=False)
+
+def _delete_children(source: str, model, pk_column):
+    def apply(db: Session, chunk_ids):
+        in_chunk = pk_column.in_(chunk_ids)
+        analytics.record(db, source, sign=-1, where=in_chunk)
+        db.execute(_bulk(delete(model).where(in_chunk)))
+        changes.record(db, source, "delete", chunk_ids)
+    return apply
+
+def _delete_users(db: Session, chunk_ids):
+    # sus compras y facturas ya se restaron: las filas por usuario quedaron a cero
+    db.execute(_bulk(delete(models.SalesByUser).where(models.SalesByUser.user_id.in_(chunk_ids))))
+    db.execute(_bulk(delete(models.User).where(models.User.user_id.in_(chunk_ids))))
+    changes.record(db, "users", "delete", chunk_ids)
+
+def _anonymize_invoices(db: Session, chunk_ids):
+    db.execute(_bulk(update(models.Invoice).where(models.Invoice.invoice_id.in_(chunk_ids))
+                     .values(billing_address=None)))
+    changes.record(db, "invoices", "update", chunk_ids)
+
+def _anonymize_users(db: Session, chunk_ids):
+    user = models.User
+    db.execute(_bulk(update(user).where(user.user_id.in_(chunk_ids)).values(
+        email="deleted-" + cast(user.user_id, String) + "@anonymized.invalid", password_hash=ANONYMIZED_HASH,
+        first_name=None, last_name=None, phone_number=None, address=None)))
+    changes.record(db, "users", "update", chunk_ids)
+
+def purge_users(db: Session, user_ids, mode: str = "delete", on_progress=None):
+    """Borra o anonimiza los usuarios por bloques; devuelve las filas afectadas por tabla.
+
+    on_progress(db, campo, n) se llama dentro de la transacción de cada bloque.
+    """
+    on_progress = on_progress or _no_progress
+    user_ids = sorted(set(user_ids))
+    totals = {"users": 0, "invoices": 0, "purchases": 0}
+    for start in range(0, len(user_ids), USER_PURGE_BATCH_USERS):
+        batch = user_ids[start:start + USER_PURGE_BATCH_USERS]
+        if mode == "delete":
+            for source, model, pk_column in (("purchases", models.Purchase, models.Purchase.purchase_id),
+                                             ("invoices", models.Invoice, models.Invoice.invoice_id)):
+                totals[source] += _in_chunks(db, select(pk_column).where(model.user_id.in_(batch)),
+                                             _delete_children(source, model, pk_column), source, on_progress)
+            users = select(models.User.user_id).where(models.User.user_id.in_(batch))
+            totals["users"] += _in_chunks(db, users, _delete_users, "users", on_progress)
+        else:
+            invoices = select(models.Invoice.invoice_id).where(models.Invoice.user_id.in_(batch),
+                                                               models.Invoice.billing_address.isnot(None))
+            totals["invoices"] += _in_chunks(db, invoices, _anonymize_invoices, "invoices", on_progress)
+            users = select(models.User.user_id).where(models.User.user_id.in_(batch),
+                                                      models.User.password_hash != ANONYMIZED_HASH)
+            totals["users"] += _in_chunks(db, users, _anonymize_users, "users", on_progress)
+    return totals
+
+# --- Trabajos en segundo plano ---
+def create_job(db: Session, user_count: int, mode: str):
+    job = models.UserPurgeJob(mode=mode, status="pending", user_count=user_count,
+                              users=0, invoices=0, purchases=0)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: int):
+    return db.get(models.UserPurgeJob, job_id)
+
+def _set_job(db: Session, job_id: int, **values):
+    db.execute(_bulk(update(models.UserPurgeJob).where(models.UserPurgeJob.job_id == job_id).values(**values)))
+    db.commit()
+
+def _job_progress(job_id: int):
+    def on_progress(db: Session, field: str, count: int):
+        column = getattr(models.UserPurgeJob, field)
+        db.execute(_bulk(update(models.UserPurgeJob).where(models.UserPurgeJob.job_id == job_id)
+                         .values({field: column + count})))
+    return on_progress
+
+def run_job(job_id: int, user_ids, mode: str, shard: str = DEFAULT_SHARD):
+    with shard_session(shard) as db:
+        _set_job(db, job_id, status="running")
+        try:
+            purge_users(db, user_ids, mode, on_progress=_job_progress(job_id))
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Falló el trabajo de borrado de usuarios %s", job_id)
+            _set_job(db, job_id, status="failed", error=str(exc), finished_at=func.now())
+            return
+        _set_job(db, job_id, status="done", finished_at=func.now())
+
+def submit(job_id: int, user_ids, mode: str, shard: str = DEFAULT_SHARD):
+    """Ejecuta el trabajo fuera de la petición (de uno en uno por worker), en el shard donde se creó."""
+    _executor.submit(run_job, job_id, list(user_ids), mode, shard)
+
+def shutdown():
+    # el bloque en curso termina con commit y el trabajo queda 'failed'; los que esperaban, 'pending'
+    _stopping.set()
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    from .database import get_engine
+
+    parser = argparse.ArgumentParser(description="Borrado o anonimización masiva de usuarios.")
+    parser.add_argument("mode", choices=["delete", "anonymize"])
+    parser.add_argument("--ids-file", required=True, help="un user_id por línea")
+    args = parser.parse_args()
+    with open(args.ids_file) as f:
+        ids = [int(line) for line in f if line.strip()]
+    get_engine()
+    with SessionLocal() as session:
+        print(purge_users(session, ids, args.mode,
+                          on_progress=lambda db, field, count: print(f"{field} +{count}", flush=True)))
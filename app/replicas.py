@@ -0,0 +1,106 @@
+import itertools
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import Header, Request
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from .database import (DEFAULT_SHARD, SessionLocal, get_engine, instrument, pool_options, request_session, shard_session,
+                       store_shard)
+
+# Réplicas de lectura (DATABASE_REPLICA_URLS, separadas por comas). Los GET
+# usan get_read_db: réplica por round-robin, saltando las que fallaron en los
+# últimos REPLICA_RETRY_SECONDS, y el primario si no queda ninguna. Tras una
+# escritura el cliente queda fijado al primario READ_AFTER_WRITE_SECONDS
+# (cookie), para que lea sus propias escrituras pese al retraso de replicación.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+READ_AFTER_WRITE_SECONDS = int(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+PIN_PRIMARY_COOKIE = "db_pin_primary"
+PIN_PRIMARY_HEADER = "x-read-primary"
+
+def _read_only(engine):
+    # en PostgreSQL cada transacción de la réplica es READ ONLY: una escritura que llegue
+    # por error a una sesión de lectura falla en lugar de intentar escribir en la réplica
+    if engine.dialect.name == "postgresql":
+        return engine.execution_options(postgresql_readonly=True)
+    return engine
+
+class ReplicaSet:
+    def __init__(self, urls):
+        self.engines = [create_engine(url, **pool_options(url)) for url in urls]
+        for replica in self.engines:
+            instrument(replica)
+        self.engines = [_read_only(replica) for replica in self.engines]
+        self.sessionmakers = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in self.engines]
+        self._down_until = [0.0] * len(self.engines)
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def _candidates(self):
+        n = len(self.engines)
+        start = next(self._counter) % n
+        now = time.monotonic()
+        with self._lock:
+            return [i % n for i in range(start, start + n) if self._down_until[i % n] <= now]
+
+    def _mark_down(self, index: int):
+        with self._lock:
+            self._down_until[index] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def open_session(self):
+        """Sesión en una réplica sana (se comprueba al obtener la conexión) o en el primario."""
+        for index in self._candidates():
+            db = self.sessionmakers[index]()
+            try:
+                db.connection()
+                return db
+            except OperationalError:
+                db.close()
+                self._mark_down(index)
+        return SessionLocal()
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS)
+
+def read_session(pin_primary: bool = False):
+    get_engine()
+    if pin_primary or not replicas.engines:
+        return SessionLocal()
+    return replicas.open_session()
+
+def wants_primary(request: Request) -> bool:
+    return request.headers.get(PIN_PRIMARY_HEADER) == "1" or PIN_PRIMARY_COOKIE in request.cookies
+
+# Dependencia de sólo lectura para los endpoints GET (las réplicas son del shard default;
+# las tiendas de otros shards leen de su primario)
+def get_read_db(request: Request, x_store_id: Optional[str] = Header(None)):
+    shard = store_shard(x_store_id)
+    db = read_session(wants_primary(request)) if shard == DEFAULT_SHARD else shard_session(shard)
+    request_session(db)
+    try:
+        yield db
+    finally:
+        db.close()
+
+class ReadAfterWriteMiddleware:
+    """Tras una escritura exitosa fija al cliente al primario durante READ_AFTER_WRITE_SECONDS."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or not replicas.engines:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 300:
+                cookie = f"{PIN_PRIMARY_COOKIE}=1; Max-Age={READ_AFTER_WRITE_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,8 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import AfterValidator, BaseModel, EmailStr, Field
+from typing import Annotated, List, Optional, Sequence
 from datetime import datetime, date
 from decimal import Decimal
 from enum import Enum
+import re
 
 # --- Enums (para validación en endpoints) ---
 class PaymentStatusEnum(str, Enum):
@@ -35,6 +36,14 @@ class DeliveryStatusEnum(str, Enum):
     delivered = 'delivered'
     cancelled = 'cancelled'
 
+class ProductSortEnum(str, Enum):
+    product_id = 'product_id'
+    product_id_desc = '-product_id'
+    name = 'name'
+    name_desc = '-name'
+    price = 'price'
+    price_desc = '-price'
+
 # --- Products ---
 class ProductBase(BaseModel):
     name: str
@@ -59,9 +68,33 @@ class ProductUpdate(BaseModel):
 
 class Product(ProductBase):
     product_id: int
+    version: int
     class Config:
         from_attributes = True
 
+# --- Stock ---
+class StockAdjustment(BaseModel):
+    delta: int  # negativo para descontar
+
+class StockBatchItem(StockAdjustment):
+    product_id: int
+
+class StockLevel(BaseModel):
+    product_id: int
+    stock_quantity: int
+    version: int
+    class Config:
+        from_attributes = True
+
+# Filtros de GET /products/ (se leen como query params)
+class ProductFilter(BaseModel):
+    category: Optional[str] = None
+    is_active: Optional[bool] = None
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    q: Optional[str] = None  # subcadena en name o description
+    sort: ProductSortEnum = ProductSortEnum.product_id
+
 # --- Users ---
 class UserBase(BaseModel):
     email: EmailStr
@@ -70,8 +103,31 @@ class UserBase(BaseModel):
     phone_number: Optional[str] = None
     address: Optional[str] = None
 
+# bcrypt sólo admite 72 bytes (a partir de ahí lanza ValueError): se rechaza con 422
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+def _bcrypt_length(password: str) -> str:
+    if len(password.encode()) > BCRYPT_MAX_PASSWORD_BYTES:
+        raise ValueError(f"must be at most {BCRYPT_MAX_PASSWORD_BYTES} bytes in UTF-8")
+    return password
+
+Password = Annotated[str, Field(min_length=8), AfterValidator(_bcrypt_length)]
+
+# $2b$12$ + 22 caracteres de sal + 31 de hash, en el base64 de bcrypt
+BCRYPT_HASH = re.compile(r"\$2[abxy]\$(0[4-9]|[12]\d|3[01])\$[./A-Za-z0-9]{53}")
+
+def _bcrypt_hash(value: str) -> str:
+    if not BCRYPT_HASH.fullmatch(value):
+        raise ValueError("must be a bcrypt hash ($2b$<cost>$...)")
+    return value
+
+BcryptHash = Annotated[str, AfterValidator(_bcrypt_hash)]
+
 class UserCreate(UserBase):
-    password_hash: str # Siguiendo el modelo, se espera el hash
+    password: Password  # se guarda sólo su hash bcrypt (app/passwords.py)
+
+class UserImport(UserBase):
+    password_hash: BcryptHash  # carga masiva: hash bcrypt ya calculado (migración desde otro sistema)
 
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
@@ -79,7 +135,7 @@ class UserUpdate(BaseModel):
     last_name: Optional[str] = None
     phone_number: Optional[str] = None
     address: Optional[str] = None
-    password_hash: Optional[str] = None
+    password: Optional[Password] = None
 
 class User(UserBase):
     user_id: int
@@ -87,6 +143,10 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class LoginRequest(BaseModel):
+    email: EmailStr
+    password: str
+
 # --- Employees ---
 class EmployeeBase(BaseModel):
     first_name: str
@@ -155,6 +215,10 @@ class PurchaseBase(BaseModel):
 class PurchaseCreate(PurchaseBase):
     pass
 
+class PurchaseImport(PurchaseCreate):
+    """Compra histórica (importer.py): admite la fecha original; sin ella, now()."""
+    purchase_date: Optional[datetime] = None
+
 class PurchaseUpdate(BaseModel):
     item_description: Optional[str] = None
     quantity: Optional[int] = None
@@ -167,4 +231,134 @@ class Purchase(PurchaseBase):
     purchase_id: int
     purchase_date: datetime
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Carga masiva (bulk) ---
+class BulkRowError(BaseModel):
+    index: int
+    detail: str
+
+class BulkResult(BaseModel):
+    ids: List[int]
+    errors: List[BulkRowError]
+
+# --- Usuario con relaciones (GET /users/{id}?include=invoices,purchases) ---
+USER_INCLUDES = ("invoices", "purchases")
+
+class UserDetail(User):
+    invoices: Optional[List[Invoice]] = None
+    purchases: Optional[List[Purchase]] = None
+
+    @classmethod
+    def from_user(cls, db_user, include: Sequence[str] = ()):
+        """Construye sin leer relaciones no cargadas (son lazy="raise")."""
+        data = User.model_validate(db_user).model_dump()
+        for name in include:
+            data[name] = getattr(db_user, name)
+        return cls(**data)
+
+# --- Analítica de ventas ---
+class SalesSourceEnum(str, Enum):
+    invoices = 'invoices'
+    purchases = 'purchases'
+
+class GranularityEnum(str, Enum):
+    day = 'day'
+    week = 'week'
+    month = 'month'
+
+class RevenuePoint(BaseModel):
+    period: date
+    sales_count: int
+    total_amount: Decimal
+
+class TopUser(BaseModel):
+    user_id: int
+    sales_count: int
+    total_amount: Decimal
+
+class PaymentMix(BaseModel):
+    payment_method: str
+    sales_count: int
+    total_amount: Decimal
+
+# --- Checkout ---
+class CheckoutLine(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+    item_description: Optional[str] = None
+
+class CheckoutCreate(BaseModel):
+    invoice_number: str
+    invoice_date: date
+    user_id: int
+    payment_method: PurchasePaymentMethodEnum
+    delivery_status: DeliveryStatusEnum = DeliveryStatusEnum.delivered
+    billing_address: Optional[str] = None
+    lines: List[CheckoutLine] = Field(min_length=1)
+
+class CheckoutResult(BaseModel):
+    invoice: Invoice
+    purchases: List[Purchase]
+    stock: List[StockLevel]
+
+# --- Feed de cambios ---
+class ChangeEntityEnum(str, Enum):
+    products = 'products'
+    users = 'users'
+    employees = 'employees'
+    invoices = 'invoices'
+    purchases = 'purchases'
+
+# --- Borrado masivo de usuarios ---
+class UserPurgeModeEnum(str, Enum):
+    delete = 'delete'
+    anonymize = 'anonymize'
+
+class UserPurgeRequest(BaseModel):
+    user_ids: List[int] = Field(min_length=1)
+    mode: UserPurgeModeEnum = UserPurgeModeEnum.delete
+    # en segundo plano: responde 202 con el trabajo y el progreso se consulta en /users/bulk/jobs/{id}
+    background: bool = False
+
+class UserPurgeResult(BaseModel):
+    mode: UserPurgeModeEnum
+    users: int
+    invoices: int
+    purchases: int
+
+class UserPurgeJob(BaseModel):
+    job_id: int
+    mode: UserPurgeModeEnum
+    status: str
+    user_count: int
+    users: int
+    invoices: int
+    purchases: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# --- Importación masiva (CSV/Parquet) ---
+class ImportKindEnum(str, Enum):
+    products = 'products'
+    purchases = 'purchases'
+
+class ImportFormatEnum(str, Enum):
+    csv = 'csv'
+    parquet = 'parquet'
+
+class ImportRejectedRow(BaseModel):
+    row: int  # fila de datos, empezando en 1 (sin contar la cabecera)
+    detail: str
+
+class ImportResult(BaseModel):
+    rows: int
+    loaded: int
+    rejected: int
+    seconds: float
+    # como mucho importer.IMPORT_MAX_REJECTS; el total está en rejected
+    rejects: List[ImportRejectedRow]
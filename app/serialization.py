@@ -0,0 +1,54 @@
+import os
+from decimal import Decimal
+
+import orjson
+from fastapi import Response
+
+# Camino rápido opcional (FAST_SERIALIZATION=1) para listados y exportaciones:
+# las filas (tuplas de columnas) se codifican directamente con orjson, sin
+# crear objetos ORM ni revalidar con el response_model. La salida es la misma
+# que produce el schema: Decimal como string y fechas en ISO 8601.
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "0").lower() in ("1", "true", "yes")
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Unserializable type: {type(value).__name__}")
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=_default)
+
+def rows_to_dicts(rows, fields=None):
+    """Filas -> dicts; con fields sólo esas claves (las columnas extra de paginación se omiten)."""
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    if fields is None:
+        return [dict(zip(keys, row)) for row in rows]
+    positions = [(name, keys.index(name)) for name in fields]
+    return [{name: row[i] for name, i in positions} for row in rows]
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def _headers(response: Response) -> dict:
+    return {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+
+def rows_response(rows, response: Response, fields=None) -> ORJSONResponse:
+    """Respuesta JSON de filas, conservando las cabeceras puestas en el Response del endpoint."""
+    return ORJSONResponse(rows_to_dicts(rows, fields), headers=_headers(response))
+
+def dicts_response(items, response: Response) -> ORJSONResponse:
+    return ORJSONResponse(items, headers=_headers(response))
+
+def row_response(row, response: Response) -> ORJSONResponse:
+    return ORJSONResponse(dict(row._mapping), headers=_headers(response))
+
+def list_response(items, response: Response, fields=None):
+    """Listado: filas con orjson si hay proyección o camino rápido; si no, los objetos para el response_model."""
+    if fields is not None or FAST_SERIALIZATION:
+        return rows_response(items, response, fields)
+    return items
@@ -0,0 +1,106 @@
+"""Listados de todas las tiendas (X-Store-Id: *): una consulta por shard y mezcla ordenada.
+
+Cada shard devuelve en paralelo su página por keyset, con el mismo orden y
+filtros. heapq.merge las combina por (valor de orden, pk, shard) y se corta en
+limit. El cursor de la siguiente página guarda la posición de cada shard (la
+última fila suya que entró en la página), así que ninguna fila se repite ni se
+salta. Las PK se repiten entre bases de datos: cada fila lleva su "shard".
+"""
+import base64
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Optional
+
+from fastapi import Header, Request
+
+from .crud import InvalidCursor, encode_cursor
+from .database import ALL_STORES, DEFAULT_SHARD, SHARD_NAMES, get_async_db, shard_session
+from .replicas import get_read_db, read_session
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", str(4 * len(SHARD_NAMES))))
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+# Dependencia de los listados que admiten X-Store-Id: *; None indica fan-out
+def get_list_db(request: Request, x_store_id: Optional[str] = Header(None)):
+    if x_store_id == ALL_STORES:
+        yield None
+        return
+    yield from get_read_db(request, x_store_id)
+
+# La misma para los endpoints async (async_api.py)
+async def get_async_list_db(x_store_id: Optional[str] = Header(None)):
+    if x_store_id == ALL_STORES:
+        yield None
+        return
+    async for db in get_async_db(x_store_id):
+        yield db
+
+def _encode(positions: dict) -> str:
+    raw = json.dumps(positions, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode(cursor: str) -> dict:
+    """{shard: cursor del shard, o None si ya se recorrió entero}; vacío es la primera página."""
+    if not cursor:
+        return {name: "" for name in SHARD_NAMES}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if not isinstance(positions, dict) or set(positions) != set(SHARD_NAMES):
+        raise InvalidCursor(cursor)
+    return positions
+
+def _shard_page(name: str, keyset_fn, cursor: str, limit: int):
+    with read_session() if name == DEFAULT_SHARD else shard_session(name) as db:
+        return keyset_fn(db, cursor=cursor, limit=limit)
+
+def fanout_page(keyset_fn, pk_column, sort_column=None, descending: bool = False, limit: int = 100, cursor: str = ""):
+    """Página mezclada de todos los shards: ([(shard, fila)], next_cursor).
+
+    keyset_fn(db, cursor=, limit=) es la función keyset de crud.py del listado.
+    """
+    positions = _decode(cursor)
+    active = [name for name in SHARD_NAMES if positions[name] is not None]
+    pages = dict(zip(active, _executor.map(lambda name: _shard_page(name, keyset_fn, positions[name], limit), active)))
+
+    def keyed(index: int, name: str):
+        for item in pages[name][0]:
+            sort_value = (getattr(item, sort_column.key),) if sort_column is not None else ()
+            yield (*sort_value, getattr(item, pk_column.key), index), name, item
+
+    merged = heapq.merge(*(keyed(i, name) for i, name in enumerate(active)), key=lambda entry: entry[0],
+                         reverse=descending)
+    page = [(name, item) for _, name, item in islice(merged, limit)]
+
+    last_taken, taken = {}, {}
+    for name, item in page:
+        last_taken[name] = item
+        taken[name] = taken.get(name, 0) + 1
+    for name in active:
+        items, next_cursor = pages[name]
+        if taken.get(name, 0) == len(items) and next_cursor is None:
+            positions[name] = None
+        elif name in last_taken:
+            item = last_taken[name]
+            sort_value = getattr(item, sort_column.key) if sort_column is not None else None
+            positions[name] = encode_cursor(getattr(item, pk_column.key), sort_column, sort_value)
+    more = any(position is not None for position in positions.values())
+    return page, _encode(positions) if more else None
+
+def with_shard(page, schema, fields=None):
+    """Filas de fanout_page como dicts del schema (o sólo fields) con la clave "shard"."""
+    rows = []
+    for name, item in page:
+        if hasattr(item, "_mapping"):
+            row = dict(item._mapping)
+            row = {key: row[key] for key in fields} if fields is not None else row
+        else:
+            row = schema.model_validate(item).model_dump()
+        row["shard"] = name
+        rows.append(row)
+    return rows
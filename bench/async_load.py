@@ -0,0 +1,113 @@
+"""Modo sync frente a DB_ASYNC=1 con muchos clientes concurrentes.
+
+    python -m bench.async_load --clients 500 --seconds 20 [--workers 1]
+
+Arranca uvicorn dos veces contra la misma DATABASE_URL (DB_ASYNC=0 y
+DB_ASYNC=1; en async se usa ASYNC_DATABASE_URL o la derivada de DATABASE_URL)
+y lanza --clients clientes concurrentes, cada uno con su conexión, contra
+GET /products/?limit=100 y GET /products/{id}. Informa peticiones/s, p50 y p99
+por modo y ruta. Necesita datos cargados (python -m bench.seed).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .run import _percentile
+from .shards import _wait_ready
+
+ROUTES = ("products.list", "products.get")
+
+def _request(rng, product_ids):
+    if rng.random() < 0.5:
+        return "products.list", "/products/", {"limit": 100}
+    return "products.get", f"/products/{rng.choice(product_ids)}", None
+
+async def _load(base_url: str, clients: int, seconds: float, product_ids, seed: int = 7):
+    latencies = {route: [] for route in ROUTES}
+    errors = {}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        deadline = time.monotonic() + seconds
+
+        async def client_loop(index: int):
+            rng = random.Random(seed + index)
+            while time.monotonic() < deadline:
+                route, path, params = _request(rng, product_ids)
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params)
+                    outcome = response.status_code
+                except httpx.HTTPError as exc:
+                    outcome = type(exc).__name__
+                if outcome == 200:
+                    latencies[route].append(time.perf_counter() - started)
+                else:
+                    errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop(i) for i in range(clients)))
+        elapsed = time.monotonic() - started
+
+    # errors: {código HTTP o excepción de httpx: peticiones}
+    result = {"errors": errors, "rps": round(sum(len(v) for v in latencies.values()) / elapsed, 1)}
+    everything = sorted(latency for values in latencies.values() for latency in values)
+    result["p50_ms"] = round(_percentile(everything, 0.50) * 1000, 1) if everything else None
+    result["p99_ms"] = round(_percentile(everything, 0.99) * 1000, 1) if everything else None
+    for route, values in latencies.items():
+        values.sort()
+        result[route] = {"rps": round(len(values) / elapsed, 1),
+                         "p99_ms": round(_percentile(values, 0.99) * 1000, 1) if values else None}
+    return result
+
+def _product_ids(base_url: str):
+    ids = [item["product_id"] for item in httpx.get(f"{base_url}/products/", params={"limit": 1000}).json()]
+    if not ids:
+        raise SystemExit("No hay productos: ejecuta primero python -m bench.seed")
+    return ids
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento de la API en modo sync y DB_ASYNC=1.")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--output", default="async_load.json")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for mode, db_async in (("sync", "0"), ("async", "1")):
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+                                   "--workers", str(args.workers), "--log-level", "warning"],
+                                  env={**os.environ, "DB_ASYNC": db_async, "DATABASE_REPLICA_URLS": ""})
+        try:
+            _wait_ready(base_url)
+            product_ids = _product_ids(base_url)
+            if args.warmup:
+                asyncio.run(_load(base_url, args.clients, args.warmup, product_ids))
+            results[mode] = asyncio.run(_load(base_url, args.clients, args.seconds, product_ids))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                # el apagado ordenado espera a las peticiones en curso, que pueden estar bloqueadas
+                server.kill()
+                server.wait()
+        print(f"{mode:6s} clientes={args.clients}  rps={results[mode]['rps']}  p50={results[mode]['p50_ms']} ms  "
+              f"p99={results[mode]['p99_ms']} ms  errors={results[mode]['errors']}")
+    report = {"clients": args.clients, "seconds": args.seconds, "workers": args.workers, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"resultados en {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Fan-out de GET /changes: muchos suscriptores SSE inactivos contra una API en ejecución.
+
+    ulimit -n 20000
+    python -m bench.changes_fanout --url http://localhost:8000 --subscribers 5000
+
+Abre las conexiones, espera a que todas reciban el primer latido, modifica un
+producto y mide cuánto tarda el cambio en llegar a cada suscriptor.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+async def _subscribe(client, since, ready, received, product_id, changed_at):
+    async with client.stream("GET", "/changes", params={"since": since, "entity": "products"},
+                             headers={"Accept": "text/event-stream"}) as response:
+        response.raise_for_status()
+        signalled = False
+        async for line in response.aiter_lines():
+            if not signalled:
+                signalled = True
+                ready.release()
+            if line.startswith("data: ") and json.loads(line[6:])["entity_id"] == product_id:
+                received.append(time.perf_counter() - changed_at[0])
+                return
+
+async def run(url: str, subscribers: int, timeout: float):
+    limits = httpx.Limits(max_connections=subscribers + 10, max_keepalive_connections=subscribers + 10)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=None) as client:
+        since = json.loads((await client.get("/changes", params={"timeout": 0})).content)["next"]
+        product = random.choice((await client.get("/products/", params={"limit": 100})).json())
+        ready, received, changed_at = asyncio.Semaphore(0), [], [0.0]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(_subscribe(client, since, ready, received, product["product_id"], changed_at))
+                 for _ in range(subscribers)]
+        for _ in range(subscribers):
+            await ready.acquire()
+        connected = time.perf_counter() - started
+        print(f"{subscribers} suscriptores conectados en {connected:.1f} s")
+
+        changed_at[0] = time.perf_counter()
+        await client.patch(f"/products/{product['product_id']}", json={"price": product["price"]})
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        errors = sum(1 for task in done if task.exception() is not None)
+        ordered = sorted(received)
+        report = {
+            "subscribers": subscribers,
+            "connect_seconds": round(connected, 2),
+            "delivered": len(ordered),
+            "errors": errors,
+            "p50_ms": round(statistics.median(ordered) * 1000, 1) if ordered else None,
+            "p99_ms": round(ordered[int(0.99 * (len(ordered) - 1))] * 1000, 1) if ordered else None,
+            "max_ms": round(ordered[-1] * 1000, 1) if ordered else None,
+        }
+        metrics = (await client.get("/metrics")).text
+        report["server_subscribers"] = next((line.split()[-1] for line in metrics.splitlines()
+                                             if line.startswith("changes_subscribers ")), None)
+        print(json.dumps(report, indent=2))
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-out de /changes con muchos suscriptores SSE.")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.subscribers, args.timeout))
+
+if __name__ == "__main__":
+    main()
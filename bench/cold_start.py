@@ -0,0 +1,56 @@
+"""Tiempo de arranque en frío de un worker, cada muestra en un proceso nuevo.
+
+    python -m bench.cold_start --runs 10 --output cold_start.json
+
+Mide por separado la importación de app.main, el arranque (lifespan) y la
+primera petición. Para comparar dos commits, ejecútalo en cada uno contra la
+misma base de datos.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+def _child():
+    started = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from app.main import app
+    imported = time.perf_counter()
+    with TestClient(app) as client:
+        ready = time.perf_counter()
+        status = client.get("/products/", params={"limit": 1}).status_code
+        first = time.perf_counter()
+    print(json.dumps({
+        "import_ms": round((imported - started) * 1000, 1),
+        "startup_ms": round((ready - imported) * 1000, 1),
+        "first_request_ms": round((first - ready) * 1000, 1),
+        "total_ms": round((first - started) * 1000, 1),
+        "first_status": status,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío de la API por proceso.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child()
+        return
+
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.check_output([sys.executable, "-m", "bench.cold_start", "--child"], text=True)
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    report = {key: statistics.median(s[key] for s in samples)
+              for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms")}
+    report["runs"] = args.runs
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"median": report, "samples": samples}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
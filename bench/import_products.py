@@ -0,0 +1,60 @@
+"""Rendimiento de la importación masiva de productos (app.importer).
+
+    python -m bench.import_products --rows 1000000 [--chunk-rows 10000]
+
+Genera un CSV de catálogo (con un 1% de filas inválidas y SKU nuevos en cada
+ejecución), lo importa con importer.import_stream contra DATABASE_URL e
+informa filas/s y la memoria máxima del proceso, que debe depender de
+--chunk-rows y no de --rows.
+"""
+import argparse
+import csv
+import json
+import random
+import resource
+import tempfile
+import time
+import uuid
+
+from app import importer
+from app.database import SessionLocal, get_engine
+
+CATEGORIES = ["lacteos", "panaderia", "bebidas", "limpieza", "frutas", "verduras", "carnes", "congelados"]
+
+def _write_catalog(path: str, rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "description", "sku", "price", "category", "stock_quantity", "is_active"])
+        for i in range(rows):
+            price = f"{rng.uniform(0.5, 500):.2f}" if rng.random() > 0.01 else "no-es-un-precio"
+            writer.writerow([f"producto {i}", f"descripcion {i}", f"IMP-{run}-{i:09d}", price,
+                             rng.choice(CATEGORIES), rng.randint(0, 1000), "true"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de importación de productos por COPY.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=importer.IMPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+    get_engine()
+
+    with tempfile.NamedTemporaryFile(suffix=".csv") as catalog:
+        started = time.perf_counter()
+        _write_catalog(catalog.name, args.rows)
+        print(f"CSV generado en {time.perf_counter() - started:.1f} s")
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open(catalog.name, "rb") as stream, SessionLocal() as db:
+            totals = importer.import_stream(db, "products", stream, "csv", chunk_rows=args.chunk_rows)
+    importer.shutdown()
+    totals.update({
+        "chunk_rows": args.chunk_rows,
+        "rows_per_second": round(totals["rows"] / totals["seconds"]),
+        # ru_maxrss en KiB (Linux); sólo el proceso principal, la validación va en el pool
+        "max_rss_mb_before": round(rss_before / 1024, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+    print(json.dumps(totals, indent=2))
+
+if __name__ == "__main__":
+    main()
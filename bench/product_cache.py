@@ -0,0 +1,114 @@
+"""GET /products/{id} sobre unos pocos productos calientes, con y sin caché.
+
+    python -m bench.product_cache --hot-keys 20 --clients 50 --seconds 15
+
+Arranca uvicorn con PRODUCT_CACHE_BACKEND=none y después =memory contra la
+misma DATABASE_URL y lanza --clients clientes contra --hot-keys productos
+(una proporción --conditional de las peticiones con If-None-Match). Informa
+peticiones/s, p50 y p99 por backend y los aciertos de la caché según /metrics.
+Necesita datos cargados (python -m bench.seed).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .async_load import _product_ids
+from .run import _percentile
+from .shards import _wait_ready
+
+async def _load(base_url: str, clients: int, seconds: float, hot_ids, conditional: float, seed: int = 7):
+    latencies = []
+    errors = {}
+    # ETag de cada producto, para las peticiones condicionales
+    etags = {}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        deadline = time.monotonic() + seconds
+
+        async def client_loop(index: int):
+            rng = random.Random(seed + index)
+            while time.monotonic() < deadline:
+                product_id = rng.choice(hot_ids)
+                headers = {}
+                if product_id in etags and rng.random() < conditional:
+                    headers["If-None-Match"] = etags[product_id]
+                started = time.perf_counter()
+                try:
+                    response = await client.get(f"/products/{product_id}", headers=headers)
+                    outcome = response.status_code
+                except httpx.HTTPError as exc:
+                    outcome = type(exc).__name__
+                if outcome in (200, 304):
+                    latencies.append(time.perf_counter() - started)
+                    etags[product_id] = response.headers["etag"]
+                else:
+                    errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop(i) for i in range(clients)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+def _cache_stats(base_url: str):
+    stats = {}
+    for line in httpx.get(f"{base_url}/metrics").text.splitlines():
+        if line.startswith("cache_product_"):
+            name, value = line.split()
+            stats[name.removeprefix("cache_product_").removesuffix("_total")] = int(float(value))
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de productos calientes con y sin caché.")
+    parser.add_argument("--hot-keys", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--conditional", type=float, default=0.5, help="proporción de GET con If-None-Match")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--output", default="product_cache.json")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for backend in ("none", "memory"):
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+                                   "--workers", str(args.workers), "--log-level", "warning"],
+                                  env={**os.environ, "PRODUCT_CACHE_BACKEND": backend, "DATABASE_REPLICA_URLS": ""})
+        try:
+            _wait_ready(base_url)
+            hot_ids = random.Random(1).sample(_product_ids(base_url), args.hot_keys)
+            if args.warmup:
+                asyncio.run(_load(base_url, args.clients, args.warmup, hot_ids, args.conditional))
+            before = _cache_stats(base_url)
+            results[backend] = asyncio.run(_load(base_url, args.clients, args.seconds, hot_ids, args.conditional))
+            after = _cache_stats(base_url)
+            results[backend]["cache"] = {name: after[name] - before.get(name, 0) for name in after}
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        print(f"{backend:6s} hot_keys={args.hot_keys}  rps={results[backend]['rps']}  "
+              f"p50={results[backend]['p50_ms']} ms  p99={results[backend]['p99_ms']} ms  "
+              f"cache={results[backend]['cache']}  errors={results[backend]['errors']}")
+    report = {"hot_keys": args.hot_keys, "clients": args.clients, "seconds": args.seconds,
+              "conditional": args.conditional, "workers": args.workers, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"resultados en {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Suite de benchmarks por familia de rutas, con salida JSON para comparar commits.
+
+    python -m bench.run --output bench_results.json            # en proceso (TestClient)
+    python -m bench.run --url http://localhost:8000 --iterations 500
+
+Necesita datos cargados (python -m bench.seed). Cada escenario reporta
+latencias p50/p95/p99, media y peticiones por segundo. Además: filas/s de la
+carga masiva frente al alta de una en una y cestas/s de POST /checkout (con
+QUERY_COUNT_HEADER=1 en la API, también sentencias SQL por cesta). La
+comparación sync/async con 500 clientes concurrentes está en bench.async_load.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from app.crud import encode_cursor
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def _summary(latencies, errors):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3) if ordered else None,
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3) if ordered else None,
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3) if ordered else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else None,
+        "rps": round(len(ordered) / total, 1) if total else None,
+    }
+
+class Runner:
+    def __init__(self, client, iterations: int):
+        self.client = client
+        self.iterations = iterations
+        self.results = {}
+
+    def measure(self, name, make_request, ok_status=(200,), on_response=None, count=None):
+        latencies, errors = [], 0
+        cpu_start = time.process_time()
+        for _ in range(self.iterations if count is None else count):
+            method, url, kwargs = make_request()
+            start = time.perf_counter()
+            response = self.client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in ok_status:
+                errors += 1
+            elif on_response is not None:
+                on_response(response)
+        self.results[name] = _summary(latencies, errors)
+        # en modo en proceso incluye la CPU del servidor (útil para comparar serialización)
+        self.results[name]["cpu_ms_per_request"] = round((time.process_time() - cpu_start) * 1000 / max(len(latencies), 1), 3)
+        print(f"{name:40s} p50={self.results[name]['p50_ms']} ms  p99={self.results[name]['p99_ms']} ms  errors={errors}")
+
+def _sample_ids(client, path, key, pages: int = 5):
+    ids, cursor = [], ""
+    for _ in range(pages):
+        response = client.get(path, params={"cursor": cursor, "limit": 1000})
+        ids.extend(item[key] for item in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    if not ids:
+        raise SystemExit(f"No hay datos en {path}: ejecuta primero python -m bench.seed")
+    return ids
+
+def check_idempotency(client, attempts: int = 50):
+    """Lanza el mismo POST /purchases/ con la misma Idempotency-Key en paralelo: debe crear una sola fila."""
+    sample = client.get("/purchases/", params={"limit": 1}).json()[0]
+    body = {k: v for k, v in sample.items() if k not in ("purchase_id", "purchase_date")}
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    with ThreadPoolExecutor(max_workers=attempts) as pool:
+        responses = list(pool.map(lambda _: client.post("/purchases/", json=body, headers=headers), range(attempts)))
+    ids = {r.json()["purchase_id"] for r in responses if r.status_code == 200}
+    for purchase_id in ids:
+        client.delete(f"/purchases/{purchase_id}")
+    result = {"attempts": attempts, "distinct_rows": len(ids),
+              "statuses": dict(Counter(str(r.status_code) for r in responses)),
+              "replayed": sum(r.headers.get("idempotent-replayed") == "true" for r in responses)}
+    print(f"{'purchases.create.same_key_x' + str(attempts):40s} filas={len(ids)}  estados={result['statuses']}")
+    return result
+
+def check_login_isolation(r, login_threads: int = 8):
+    """Latencia de /products/ en reposo y con logins (bcrypt) concurrentes de fondo."""
+    client = r.client
+    credentials = {"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": "bench-password"}
+    user_id = client.post("/users/", json=credentials).json()["user_id"]
+    r.measure("products.list.no_login_load", lambda: ("GET", "/products/", {"params": {"limit": 100}}))
+
+    stop, lock, statuses = threading.Event(), threading.Lock(), Counter()
+
+    def login_loop():
+        while not stop.is_set():
+            status = client.post("/auth/login", json=credentials).status_code
+            with lock:
+                statuses[str(status)] += 1
+
+    threads = [threading.Thread(target=login_loop) for _ in range(login_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        r.measure("products.list.with_login_load", lambda: ("GET", "/products/", {"params": {"limit": 100}}))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    client.delete(f"/users/{user_id}")
+    result = {"threads": login_threads, "statuses": dict(statuses),
+              "logins_per_second": round(statuses["200"] / elapsed, 1) if elapsed else None}
+    print(f"{'auth.login.background':40s} login/s={result['logins_per_second']}  estados={result['statuses']}")
+    return result
+
+def bench_bulk_upsert(client, rows: int = 2000, batch: int = 500):
+    """Filas/s de POST /products/ (una fila por petición) frente a POST /products/bulk (alta y upsert)."""
+    run_id = uuid.uuid4().hex[:8]
+
+    def product(i: int, price: str = "1.00"):
+        return {"name": f"bench {i}", "sku": f"BULK-{run_id}-{i:07d}", "price": price, "stock_quantity": 10}
+
+    result, created, errors = {"rows": rows, "batch": batch}, [], 0
+    started = time.perf_counter()
+    for i in range(rows):
+        response = client.post("/products/", json=product(i))
+        if response.status_code == 200:
+            created.append(response.json()["product_id"])
+        else:
+            errors += 1
+    result["single_rows_per_second"] = round(rows / (time.perf_counter() - started), 1)
+
+    # el upsert reenvía los SKU de la pasada de alta con otro precio: todo son ON CONFLICT DO UPDATE
+    for mode, price in (("insert", "1.00"), ("upsert", "2.00")):
+        started = time.perf_counter()
+        for start in range(rows, 2 * rows, batch):
+            response = client.post("/products/bulk", json=[product(i, price) for i in range(start, min(start + batch, 2 * rows))])
+            if response.status_code != 200:
+                errors += min(batch, 2 * rows - start)
+                continue
+            body = response.json()
+            errors += len(body["errors"])
+            if mode == "insert":
+                created.extend(body["ids"])
+        result[f"bulk_{mode}_rows_per_second"] = round(rows / (time.perf_counter() - started), 1)
+    result["errors"] = errors
+    result["speedup"] = round(result["bulk_insert_rows_per_second"] / result["single_rows_per_second"], 1)
+    for product_id in created:
+        client.delete(f"/products/{product_id}")
+    print(f"{'products.bulk':40s} una a una={result['single_rows_per_second']} filas/s  "
+          f"bulk={result['bulk_insert_rows_per_second']} filas/s  upsert={result['bulk_upsert_rows_per_second']} filas/s")
+    return result
+
+def bench_checkout(r, rng, user_ids, line_counts=(1, 5, 20)):
+    """Cestas/s de POST /checkout según el número de líneas; las sentencias por cesta no deben crecer."""
+    stocked = [p["product_id"] for p in r.client.get("/products/", params={"limit": 1000}).json()
+               if p["is_active"] is not False and (p["stock_quantity"] or 0) >= r.iterations]
+    if len(stocked) < max(line_counts):
+        raise SystemExit("No hay bastantes productos con stock para POST /checkout")
+    run_id = uuid.uuid4().hex[:8]
+    numbers = iter(range(10**9))
+    results = {}
+    for lines in line_counts:
+        queries = []
+
+        def basket(n=lines):
+            return ("POST", "/checkout", {"json": {
+                "invoice_number": f"CHK-{run_id}-{next(numbers)}", "invoice_date": date.today().isoformat(),
+                "user_id": rng.choice(user_ids), "payment_method": "cash",
+                "lines": [{"product_id": product_id, "quantity": 1} for product_id in rng.sample(stocked, n)],
+            }})
+
+        def count_queries(response, seen=queries):
+            if "x-query-count" in response.headers:
+                seen.append(int(response.headers["x-query-count"]))
+
+        name = f"checkout.lines_{lines}"
+        r.measure(name, basket, on_response=count_queries)
+        r.results[name]["baskets_per_second"] = r.results[name]["rps"]
+        if queries:
+            r.results[name]["queries_per_basket"] = round(statistics.fmean(queries), 1)
+        results[lines] = r.results[name]
+    return results
+
+def run(client, iterations: int, seed: int = 7):
+    rng = random.Random(seed)
+    r = Runner(client, iterations)
+    product_ids = _sample_ids(client, "/products/", "product_id")
+    user_ids = _sample_ids(client, "/users/", "user_id")
+    max_product = client.get("/products/", params={"sort": "-product_id", "limit": 1}).json()[0]["product_id"]
+
+    # --- CRUD ---
+    r.measure("products.get", lambda: ("GET", f"/products/{rng.choice(product_ids)}", {}))
+    r.measure("users.get", lambda: ("GET", f"/users/{rng.choice(user_ids)}", {}))
+    r.measure("products.patch", lambda: ("PATCH", f"/products/{rng.choice(product_ids)}",
+                                         {"json": {"price": f"{rng.uniform(1, 100):.2f}"}}))
+
+    created = []
+    r.measure("products.create", lambda: ("POST", "/products/", {"json": {
+        "name": "bench", "sku": f"BENCH-{uuid.uuid4().hex[:16]}", "price": "1.00", "stock_quantity": 10}}),
+        on_response=lambda response: created.append(response.json()["product_id"]))
+    pending = iter(created)
+    r.measure("products.delete", lambda: ("DELETE", f"/products/{next(pending)}", {}), count=len(created))
+
+    # --- Paginación: offset vs cursor a distintas profundidades ---
+    for depth in (0, 1_000, 10_000, 100_000, 1_000_000):
+        if depth > max_product:
+            break
+        r.measure(f"products.list.offset@{depth}", lambda d=depth: ("GET", "/products/", {"params": {"skip": d, "limit": 100}}))
+        r.measure(f"products.list.cursor@{depth}", lambda d=depth: ("GET", "/products/",
+                                                                    {"params": {"cursor": encode_cursor(d) if d else "", "limit": 100}}))
+    for path in ("/users/", "/employees/", "/invoices/", "/purchases/"):
+        r.measure(f"{path.strip('/')}.list", lambda p=path: ("GET", p, {"params": {"limit": 100}}))
+    # respuestas de 1000 filas: comparar con y sin FAST_SERIALIZATION=1
+    for path in ("/products/", "/users/", "/invoices/", "/purchases/"):
+        r.measure(f"{path.strip('/')}.list.1000", lambda p=path: ("GET", p, {"params": {"limit": 1000}}))
+    r.measure("products.list.filtered", lambda: ("GET", "/products/", {"params": {"category": "bebidas", "is_active": True,
+                                                                                  "sort": "price", "limit": 100}}))
+
+    # --- Filtros por fecha (con tablas particionadas sólo se leen las particiones del rango) ---
+    last_month = {"date_from": (date.today() - timedelta(days=30)).isoformat(), "date_to": date.today().isoformat()}
+    for path in ("/invoices/", "/purchases/"):
+        r.measure(f"{path.strip('/')}.list.last_month", lambda p=path: ("GET", p, {"params": {**last_month, "limit": 100}}))
+        r.measure(f"{path.strip('/')}.export.last_month", lambda p=path: ("GET", f"{p}export", {"params": last_month}))
+
+    # --- Uniones por usuario ---
+    r.measure("users.invoices", lambda: ("GET", f"/users/{rng.choice(user_ids)}/invoices/", {}))
+    r.measure("users.purchases", lambda: ("GET", f"/users/{rng.choice(user_ids)}/purchases/", {}))
+    r.measure("users.get.include", lambda: ("GET", f"/users/{rng.choice(user_ids)}",
+                                            {"params": {"include": "invoices,purchases"}}))
+
+    # --- Analítica ---
+    r.measure("analytics.revenue.month", lambda: ("GET", "/analytics/revenue", {"params": {"granularity": "month"}}))
+    r.measure("analytics.top_users", lambda: ("GET", "/analytics/top-users", {}))
+
+    # --- Escrituras en lote: carga masiva y checkout en una transacción ---
+    r.results["products.bulk"] = bench_bulk_upsert(client)
+    bench_checkout(r, rng, user_ids)
+
+    # --- Login (bcrypt en el pool de procesos) no debe degradar las rutas de E/S ---
+    r.results["auth.login.background"] = check_login_isolation(r)
+
+    # --- Idempotencia: 50 reintentos concurrentes con la misma clave ---
+    r.results["purchases.create.same_key_x50"] = check_idempotency(client)
+    return r.results
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la API de Supermercado.")
+    parser.add_argument("--url", help="URL de una API en ejecución; por defecto se usa la app en proceso")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    if args.url:
+        import httpx
+        client = httpx.Client(base_url=args.url, timeout=60)
+    else:
+        from fastapi.testclient import TestClient
+        from app.main import app
+        client = TestClient(app)
+
+    from app.database import SQLALCHEMY_DATABASE_URL
+    results = run(client, args.iterations)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.url or "in-process",
+            "database": SQLALCHEMY_DATABASE_URL.split("@")[-1],
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "fast_serialization": os.getenv("FAST_SERIALIZATION", "0"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"resultados en {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Generador de datos sintéticos.
+
+    python -m bench.seed --scale 0.01
+
+Con scale=1 genera 1M productos, 5M usuarios, 5M facturas, 50M compras y 10k
+empleados. En PostgreSQL carga con COPY ... FROM STDIN; en SQLite con executemany.
+Usa la misma DATABASE_URL que la API.
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, insert, select, text
+
+from app import analytics, models
+from app.database import SessionLocal, get_engine
+
+engine = get_engine()
+
+BASE_COUNTS = {
+    "products": 1_000_000,
+    "users": 5_000_000,
+    "employees": 10_000,
+    "invoices": 5_000_000,
+    "purchases": 50_000_000,
+}
+CHUNK_ROWS = 50_000
+HISTORY_DAYS = 3 * 365
+
+CATEGORIES = ["lacteos", "panaderia", "bebidas", "limpieza", "frutas", "verduras", "carnes", "congelados", "snacks", "higiene"]
+WORDS = ["leche", "pan", "queso", "arroz", "aceite", "jugo", "cafe", "azucar", "galletas", "yogur", "detergente", "jabon"]
+INVOICE_METHODS = ["cash", "credit", "debit", "check", "transfer"]
+INVOICE_STATUS = ["paid", "partial", "unpaid", "overdue"]
+PURCHASE_METHODS = ["cash", "credit_card", "debit_card", "transfer"]
+PURCHASE_STATUS = ["completed", "pending", "failed"]
+DELIVERY_STATUS = ["pending", "shipped", "delivered", "cancelled"]
+
+def _products(rng, first_id, count):
+    for i in range(first_id, first_id + count):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+        yield (i, name, f"{name} - descripcion generada", f"SKU-{i:09d}", f"{rng.uniform(0.5, 500):.2f}",
+               rng.choice(CATEGORIES), rng.randint(0, 1000), rng.random() > 0.05, 1)
+
+def _users(rng, first_id, count, start):
+    for i in range(first_id, first_id + count):
+        registered = start + timedelta(seconds=rng.randint(0, HISTORY_DAYS * 86400))
+        yield (i, f"user{i}@example.com", "x" * 60, f"Nombre{i % 997}", f"Apellido{i % 991}",
+               f"+506{rng.randint(10000000, 99999999)}", f"Calle {i % 500} #{i % 97}", registered)
+
+def _employees(rng, first_id, count, start):
+    for i in range(first_id, first_id + count):
+        yield (i, f"Empleado{i}", f"Apellido{i}", f"employee{i}@example.com", "Cajero", "Ventas",
+               f"{rng.uniform(400, 4000):.2f}", (start + timedelta(days=rng.randint(0, HISTORY_DAYS))).date())
+
+def _invoices(rng, first_id, count, user_ids, start):
+    for i in range(first_id, first_id + count):
+        day = (start + timedelta(days=rng.randint(0, HISTORY_DAYS))).date()
+        yield (i, f"INV-{i:010d}", day, day + timedelta(days=30), datetime.combine(day, datetime.min.time()),
+               f"{rng.uniform(1, 2000):.2f}", rng.choice(INVOICE_STATUS), rng.choice(INVOICE_METHODS),
+               None, rng.randint(*user_ids))
+
+def _purchases(rng, first_id, count, user_ids, start):
+    for i in range(first_id, first_id + count):
+        quantity = rng.randint(1, 10)
+        yield (i, start + timedelta(seconds=rng.randint(0, HISTORY_DAYS * 86400)), f"item {i % 10007}", quantity,
+               f"{quantity * rng.uniform(0.5, 200):.2f}", rng.choice(PURCHASE_METHODS), rng.choice(PURCHASE_STATUS),
+               rng.choice(DELIVERY_STATUS), rng.randint(*user_ids))
+
+class _CsvStream(io.RawIOBase):
+    """Archivo de sólo lectura que va generando CSV a partir de un iterador de filas."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            out = io.StringIO()
+            writer = csv.writer(out)
+            written = 0
+            for row in self._rows:
+                writer.writerow(["" if v is None else v for v in row])
+                written += 1
+                if written >= 1000:
+                    break
+            if not written:
+                break
+            self._buffer += out.getvalue().encode()
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+def _load(model, rows):
+    table = model.__table__
+    columns = [c.name for c in table.columns]
+    if engine.dialect.name == "postgresql":
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", _CsvStream(rows))
+            raw.commit()
+        finally:
+            raw.close()
+        return
+    with engine.begin() as conn:
+        batch = []
+        for row in rows:
+            batch.append(dict(zip(columns, row)))
+            if len(batch) >= CHUNK_ROWS:
+                conn.execute(insert(table), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(table), batch)
+
+def _next_id(pk_column):
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(pk_column))).scalar() or 0) + 1
+
+def _reset_sequence(table: str, pk: str):
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', '{pk}'), (SELECT max({pk}) FROM {table}))"))
+
+def seed(scale: float, seed_value: int = 42):
+    command.upgrade(Config(str(Path(__file__).resolve().parent.parent / "alembic.ini")), "head")
+    rng = random.Random(seed_value)
+    start = datetime.combine(date.today() - timedelta(days=HISTORY_DAYS), datetime.min.time())
+    counts = {name: max(int(base * scale), 1) for name, base in BASE_COUNTS.items()}
+    timings = {}
+
+    def load(name, model, pk_column, make_rows):
+        began = time.perf_counter()
+        first_id = _next_id(pk_column)
+        _load(model, make_rows(first_id, counts[name]))
+        _reset_sequence(model.__tablename__, pk_column.key)
+        timings[name] = round(time.perf_counter() - began, 3)
+        print(f"{name}: {counts[name]} filas en {timings[name]} s")
+        return first_id, first_id + counts[name] - 1
+
+    load("products", models.Product, models.Product.product_id, lambda f, n: _products(rng, f, n))
+    user_ids = load("users", models.User, models.User.user_id, lambda f, n: _users(rng, f, n, start))
+    load("employees", models.Employee, models.Employee.employee_id, lambda f, n: _employees(rng, f, n, start))
+    load("invoices", models.Invoice, models.Invoice.invoice_id, lambda f, n: _invoices(rng, f, n, user_ids, start))
+    load("purchases", models.Purchase, models.Purchase.purchase_id, lambda f, n: _purchases(rng, f, n, user_ids, start))
+
+    # COPY no pasa por crud: los resúmenes de analytics se recalculan al final
+    if engine.dialect.name == "postgresql":
+        with SessionLocal() as db:
+            analytics.rebuild(db)
+            db.execute(text("ANALYZE"))
+            db.commit()
+    return {"counts": counts, "seconds": timings}
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga datos sintéticos en la base de datos de la API.")
+    parser.add_argument("--scale", type=float, default=0.001, help="1.0 = 1M productos, 5M usuarios, 50M compras")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    seed(args.scale, args.seed)
+
+if __name__ == "__main__":
+    main()
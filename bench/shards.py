@@ -0,0 +1,122 @@
+"""Escalado por shards: rendimiento de la API con 1..N bases de datos.
+
+    python -m bench.shards --urls postgresql://.../shard0,postgresql://.../shard1,... --seconds 20
+
+Migra cada base de datos, carga productos si está vacía y, para k = 1..N,
+arranca uvicorn con los k primeros shards (las tiendas repartidas por turno)
+y lanza escrituras (PATCH /products/{id}) y lecturas (GET /products/{id}) con
+X-Store-Id aleatorio. Informa peticiones/s por número de shards.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from sqlalchemy import create_engine, text
+
+def _prepare(url: str, products: int):
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], check=True,
+                   env={**os.environ, "DATABASE_URL": url})
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        if not conn.scalar(text("SELECT count(*) FROM products")):
+            conn.execute(text("""
+                INSERT INTO products (product_id, name, sku, price, category, stock_quantity, is_active)
+                SELECT g, 'producto ' || g, 'SKU-' || g, (g % 500) + 0.5, 'bebidas', 1000, true
+                FROM generate_series(1, :n) g"""), {"n": products})
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('products', 'product_id'), :n)"), {"n": products})
+    engine.dispose()
+
+def _shard_env(urls, k: int, stores: int) -> dict:
+    names = ["default"] + [f"s{i}" for i in range(1, k)]
+    return {
+        **os.environ,
+        "DATABASE_URL": urls[0],
+        "DATABASE_SHARD_URLS": ",".join(f"s{i}={urls[i]}" for i in range(1, k)),
+        "STORE_SHARDS": ",".join(f"{store}={names[store % k]}" for store in range(stores)),
+        "DATABASE_REPLICA_URLS": "",
+    }
+
+def _wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health/ready").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit("la API no arrancó")
+
+def _load(base_url: str, clients: int, seconds: float, stores: int, products: int, write_ratio: float):
+    deadline = time.monotonic() + seconds
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def client_loop(seed: int):
+        rng = random.Random(seed)
+        ok = errors = 0
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.monotonic() < deadline:
+                headers = {"X-Store-Id": str(rng.randrange(stores))}
+                product_id = rng.randint(1, products)
+                if rng.random() < write_ratio:
+                    response = client.patch(f"/products/{product_id}", headers=headers,
+                                            json={"stock_quantity": rng.randint(0, 1000)})
+                else:
+                    response = client.get(f"/products/{product_id}", headers=headers)
+                if response.status_code == 200:
+                    ok += 1
+                else:
+                    errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client_loop, range(clients)))
+    elapsed = time.monotonic() - started
+    return {"rps": round(counts["ok"] / elapsed, 1), **counts}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento de la API según el número de shards.")
+    parser.add_argument("--urls", required=True, help="URLs de PostgreSQL separadas por comas (una por shard)")
+    parser.add_argument("--stores", type=int, default=32)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--write-ratio", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    urls = [url.strip() for url in args.urls.split(",") if url.strip()]
+    for url in urls:
+        _prepare(url, args.products)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    for k in range(1, len(urls) + 1):
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+                                   "--workers", str(args.workers), "--log-level", "warning"],
+                                  env=_shard_env(urls, k, args.stores))
+        try:
+            _wait_ready(base_url)
+            result = {"shards": k, **_load(base_url, args.clients, args.seconds, args.stores, args.products,
+                                            args.write_ratio)}
+        finally:
+            server.terminate()
+            server.wait()
+        result["speedup"] = round(result["rps"] / results[0]["rps"], 2) if results else 1.0
+        results.append(result)
+        print(f"shards={k}  rps={result['rps']}  speedup={result['speedup']}  errors={result['errors']}")
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
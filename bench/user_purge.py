@@ -0,0 +1,102 @@
+"""Borrado masivo de usuarios: 100k usuarios con 10M filas hijas.
+
+    python -m bench.user_purge --users 100000 --children 10000000 [--mode anonymize]
+
+Genera los usuarios y sus facturas/compras en el servidor (generate_series, ids
+por encima de los existentes), los suma a los resúmenes y ejecuta
+purge.purge_users. Informa filas/s, la duración de cada bloque (lo que dura
+un bloqueo) y si los resúmenes siguen cuadrando con las tablas.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy import and_, func, select, text
+
+from app import analytics, models, purge
+from app.database import SessionLocal, get_engine
+
+# 10% facturas, 90% compras (la misma proporción que bench.seed)
+INVOICE_SHARE = 0.1
+
+def _seed(db, users: int, children: int):
+    first = db.scalar(select(func.coalesce(func.max(models.User.user_id), 0))) + 1
+    last = first + users - 1
+    invoices = int(children * INVOICE_SHARE)
+    params = {"first": first, "users": users, "invoices": invoices, "purchases": children - invoices}
+    db.execute(text("""
+        INSERT INTO users (user_id, email, password_hash, first_name, last_name, phone_number, address)
+        SELECT g, 'purge' || g || '@example.com', 'x', 'Nombre', 'Apellido', '+50600000000', 'Calle ' || g
+        FROM generate_series(:first, :first + :users - 1) g"""), params)
+    db.execute(text("SELECT setval(pg_get_serial_sequence('users', 'user_id'), :last)"), {"last": last})
+    db.execute(text("""
+        INSERT INTO invoices (invoice_number, invoice_date, total_amount, payment_status, payment_method,
+                              billing_address, user_id)
+        SELECT 'PURGE-' || :first || '-' || g, current_date - (g % 365), (g % 500) + 0.5, 'paid', 'cash',
+               'Calle ' || g, :first + g % :users
+        FROM generate_series(1, :invoices) g"""), params)
+    db.execute(text("""
+        INSERT INTO purchases (purchase_date, item_description, quantity, total_amount, payment_method,
+                               payment_status, delivery_status, user_id)
+        SELECT now() - make_interval(days => g % 365), 'compra', 1, (g % 200) + 0.5, 'cash', 'completed',
+               'delivered', :first + g % :users
+        FROM generate_series(1, :purchases) g"""), params)
+    for source, model in (("invoices", models.Invoice), ("purchases", models.Purchase)):
+        analytics.record(db, source, where=model.user_id.between(first, last))
+    db.commit()
+    db.execute(text("ANALYZE users, invoices, purchases"))
+    return list(range(first, last + 1))
+
+def _summary_drift(db):
+    """Diferencia entre sales_daily y las tablas: (0, 0) si los resúmenes cuadran."""
+    drift = {}
+    for source, model in (("invoices", models.Invoice), ("purchases", models.Purchase)):
+        summary = db.execute(select(func.coalesce(func.sum(models.SalesDaily.sales_count), 0),
+                                    func.coalesce(func.sum(models.SalesDaily.total_amount), 0))
+                             .where(models.SalesDaily.source == source)).one()
+        actual = db.execute(select(func.count(), func.coalesce(func.sum(model.total_amount), 0))).one()
+        drift[source] = [summary[0] - actual[0], str(summary[1] - actual[1])]
+    return drift
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de borrado masivo de usuarios.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--children", type=int, default=10_000_000)
+    parser.add_argument("--mode", choices=["delete", "anonymize"], default="delete")
+    args = parser.parse_args()
+    get_engine()
+
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        user_ids = _seed(db, args.users, args.children)
+        print(f"datos generados en {time.perf_counter() - started:.1f} s")
+
+        chunks, last = [], [time.perf_counter()]
+        def on_progress(db, field, count):
+            now = time.perf_counter()
+            chunks.append(now - last[0])
+            last[0] = now
+
+        started = last[0] = time.perf_counter()
+        totals = purge.purge_users(db, user_ids, args.mode, on_progress=on_progress)
+        elapsed = time.perf_counter() - started
+        ordered = sorted(chunks[1:]) or [0]
+        remaining = db.scalar(select(func.count()).select_from(models.Purchase)
+                              .where(and_(models.Purchase.user_id >= user_ids[0], models.Purchase.user_id <= user_ids[-1])))
+        report = {
+            "mode": args.mode,
+            "seconds": round(elapsed, 1),
+            "rows_per_second": round(sum(totals.values()) / elapsed),
+            "chunks": len(chunks),
+            "chunk_p50_ms": round(statistics.median(ordered) * 1000, 1),
+            "chunk_p99_ms": round(ordered[int(0.99 * (len(ordered) - 1))] * 1000, 1),
+            "chunk_max_ms": round(ordered[-1] * 1000, 1),
+            "purchases_left": remaining,
+            "summary_drift": _summary_drift(db),
+            **totals,
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
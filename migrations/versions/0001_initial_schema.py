@@ -0,0 +1,93 @@
+"""Esquema inicial (el que creaba create_all antes de las migraciones)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "products",
+        sa.Column("product_id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(200), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("sku", sa.String(50)),
+        sa.Column("price", sa.Numeric(10, 2), nullable=False),
+        sa.Column("category", sa.String(100)),
+        sa.Column("stock_quantity", sa.Integer()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_index("ix_products_product_id", "products", ["product_id"])
+    op.create_index("ix_products_sku", "products", ["sku"], unique=True)
+
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("first_name", sa.String(100)),
+        sa.Column("last_name", sa.String(100)),
+        sa.Column("phone_number", sa.String(20)),
+        sa.Column("address", sa.Text()),
+        sa.Column("registration_date", sa.TIMESTAMP(), server_default=sa.text("now()")),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "employees",
+        sa.Column("employee_id", sa.Integer(), primary_key=True),
+        sa.Column("first_name", sa.String(100), nullable=False),
+        sa.Column("last_name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("job_title", sa.String(150)),
+        sa.Column("department", sa.String(100)),
+        sa.Column("salary", sa.Numeric(12, 2)),
+        sa.Column("hire_date", sa.Date()),
+    )
+    op.create_index("ix_employees_employee_id", "employees", ["employee_id"])
+    op.create_index("ix_employees_email", "employees", ["email"], unique=True)
+
+    op.create_table(
+        "invoices",
+        sa.Column("invoice_id", sa.Integer(), primary_key=True),
+        sa.Column("invoice_number", sa.String(50), nullable=False),
+        sa.Column("invoice_date", sa.Date(), nullable=False),
+        sa.Column("due_date", sa.Date()),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.text("now()")),
+        sa.Column("total_amount", sa.Numeric(12, 2), nullable=False),
+        sa.Column("payment_status", sa.String(50)),
+        sa.Column("payment_method", sa.String(50)),
+        sa.Column("billing_address", sa.Text()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+    )
+    op.create_index("ix_invoices_invoice_id", "invoices", ["invoice_id"])
+    op.create_index("ix_invoices_invoice_number", "invoices", ["invoice_number"], unique=True)
+
+    op.create_table(
+        "purchases",
+        sa.Column("purchase_id", sa.Integer(), primary_key=True),
+        sa.Column("purchase_date", sa.TIMESTAMP(), server_default=sa.text("now()")),
+        sa.Column("item_description", sa.Text()),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.Numeric(12, 2), nullable=False),
+        sa.Column("payment_method", sa.String(50)),
+        sa.Column("payment_status", sa.String(50)),
+        sa.Column("delivery_status", sa.String(50)),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+    )
+    op.create_index("ix_purchases_purchase_id", "purchases", ["purchase_id"])
+
+def downgrade():
+    op.drop_table("purchases")
+    op.drop_table("invoices")
+    op.drop_table("employees")
+    op.drop_table("users")
+    op.drop_table("products")
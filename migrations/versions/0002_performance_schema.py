@@ -0,0 +1,110 @@
+"""Índices, versión de fila, resúmenes de ventas y claves de idempotencia
+
+Cada paso comprueba si ya existe: las bases creadas por create_all después de
+estos cambios ya tienen parte del esquema (basta con alembic stamp 0001).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_products_category_active_price", "products", ["category", "is_active", "price"]),
+    ("ix_products_price", "products", ["price"]),
+    ("ix_products_name", "products", ["name"]),
+    ("ix_invoices_user_id_invoice_date", "invoices", ["user_id", "invoice_date"]),
+    ("ix_purchases_user_id_purchase_date", "purchases", ["user_id", "purchase_date"]),
+]
+TRGM_INDEXES = [
+    ("ix_products_name_trgm", "products", "name"),
+    ("ix_products_description_trgm", "products", "description"),
+]
+
+# (source, tabla, día): date() existe tanto en PostgreSQL como en SQLite
+SUMMARY_SOURCES = [
+    ("invoices", "invoices", "invoice_date"),
+    ("purchases", "purchases", "date(purchase_date)"),
+]
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+def _has_index(table, name):
+    return any(index["name"] == name for index in _inspector().get_indexes(table))
+
+def upgrade():
+    inspector = _inspector()
+    is_postgresql = op.get_bind().dialect.name == "postgresql"
+
+    if "version" not in {c["name"] for c in inspector.get_columns("products")}:
+        op.add_column("products", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+    for name, table, columns in INDEXES:
+        if not _has_index(table, name):
+            op.create_index(name, table, columns)
+    if is_postgresql:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in TRGM_INDEXES:
+            if not _has_index(table, name):
+                op.create_index(name, table, [column], postgresql_using="gin",
+                                postgresql_ops={column: "gin_trgm_ops"})
+
+    if not inspector.has_table("sales_daily"):
+        op.create_table(
+            "sales_daily",
+            sa.Column("source", sa.String(20), primary_key=True),
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("payment_method", sa.String(50), primary_key=True),
+            sa.Column("sales_count", sa.Integer(), nullable=False),
+            sa.Column("total_amount", sa.Numeric(14, 2), nullable=False),
+        )
+    if not inspector.has_table("sales_by_user"):
+        op.create_table(
+            "sales_by_user",
+            sa.Column("source", sa.String(20), primary_key=True),
+            sa.Column("user_id", sa.Integer(), primary_key=True),
+            sa.Column("sales_count", sa.Integer(), nullable=False),
+            sa.Column("total_amount", sa.Numeric(14, 2), nullable=False),
+        )
+        op.create_index("ix_sales_by_user_source_total", "sales_by_user", ["source", "total_amount"])
+    if not inspector.has_table("idempotency_keys"):
+        op.create_table(
+            "idempotency_keys",
+            sa.Column("key_hash", sa.String(64), primary_key=True),
+            sa.Column("request_hash", sa.String(64), nullable=False),
+            sa.Column("status_code", sa.Integer()),
+            sa.Column("response_body", sa.Text()),
+            sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=False),
+        )
+        op.create_index("ix_idempotency_keys_created_at", "idempotency_keys", ["created_at"])
+
+    # los resúmenes se rellenan a partir de las tablas existentes, con SQL fijo para el
+    # esquema de esta revisión (app.analytics sigue al modelo actual, no a éste)
+    op.execute("DELETE FROM sales_daily")
+    op.execute("DELETE FROM sales_by_user")
+    for source, table, day in SUMMARY_SOURCES:
+        op.execute(f"""
+            INSERT INTO sales_daily (source, day, payment_method, sales_count, total_amount)
+            SELECT '{source}', {day}, COALESCE(payment_method, 'unknown'), count(*), COALESCE(sum(total_amount), 0)
+            FROM {table} GROUP BY {day}, COALESCE(payment_method, 'unknown')""")
+        op.execute(f"""
+            INSERT INTO sales_by_user (source, user_id, sales_count, total_amount)
+            SELECT '{source}', user_id, count(*), COALESCE(sum(total_amount), 0)
+            FROM {table} GROUP BY user_id""")
+
+def downgrade():
+    op.drop_table("idempotency_keys")
+    op.drop_table("sales_by_user")
+    op.drop_table("sales_daily")
+    for name, table, _ in TRGM_INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
+    op.drop_column("products", "version")
@@ -0,0 +1,28 @@
+"""Registro de cambios para GET /changes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "change_log",
+        sa.Column("seq", sa.BigInteger(), primary_key=True),
+        sa.Column("entity", sa.String(20), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("op", sa.String(10), nullable=False),
+        sa.Column("changed_at", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_change_log_entity_seq", "change_log", ["entity", "seq"])
+    op.create_index("ix_change_log_changed_at", "change_log", ["changed_at"])
+
+def downgrade():
+    op.drop_table("change_log")
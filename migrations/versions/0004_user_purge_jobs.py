@@ -0,0 +1,31 @@
+"""Trabajos de borrado masivo de usuarios
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "user_purge_jobs",
+        sa.Column("job_id", sa.Integer(), primary_key=True),
+        sa.Column("mode", sa.String(10), nullable=False),
+        sa.Column("status", sa.String(10), nullable=False),
+        sa.Column("user_count", sa.Integer(), nullable=False),
+        sa.Column("users", sa.Integer(), nullable=False),
+        sa.Column("invoices", sa.Integer(), nullable=False),
+        sa.Column("purchases", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("finished_at", sa.TIMESTAMP()),
+    )
+
+def downgrade():
+    op.drop_table("user_purge_jobs")
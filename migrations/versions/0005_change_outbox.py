@@ -0,0 +1,28 @@
+"""change_outbox: record() escribe aquí sin bloqueos y changes.relay asigna seq
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "change_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("entity", sa.String(20), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("op", sa.String(10), nullable=False),
+        sa.Column("changed_at", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("xact_id", sa.BigInteger()),
+    )
+    op.create_index("ix_change_outbox_xact_id_id", "change_outbox", ["xact_id", "id"])
+
+def downgrade():
+    op.drop_table("change_outbox")
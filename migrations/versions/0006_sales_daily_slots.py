@@ -0,0 +1,40 @@
+"""sales_daily.slot: varias filas parciales por día y método (analytics.ANALYTICS_SLOTS)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def _drop_primary_key(batch):
+    # en SQLite la PK no tiene nombre: la tabla se recrea y create_primary_key la sustituye
+    if op.get_bind().dialect.name == "postgresql":
+        batch.drop_constraint("sales_daily_pkey", type_="primary")
+
+def upgrade():
+    # las filas existentes quedan en el slot 0
+    with op.batch_alter_table("sales_daily") as batch:
+        batch.add_column(sa.Column("slot", sa.Integer(), nullable=False, server_default="0"))
+        _drop_primary_key(batch)
+        batch.create_primary_key("sales_daily_pkey", ["source", "day", "payment_method", "slot"])
+
+def downgrade():
+    op.execute("""
+        CREATE TABLE sales_daily_merged AS
+        SELECT source, day, payment_method, sum(sales_count) AS sales_count, sum(total_amount) AS total_amount
+        FROM sales_daily GROUP BY source, day, payment_method""")
+    op.execute("DELETE FROM sales_daily")
+    with op.batch_alter_table("sales_daily") as batch:
+        _drop_primary_key(batch)
+        batch.drop_column("slot")
+        batch.create_primary_key("sales_daily_pkey", ["source", "day", "payment_method"])
+    op.execute("""
+        INSERT INTO sales_daily (source, day, payment_method, sales_count, total_amount)
+        SELECT source, day, payment_method, sales_count, total_amount FROM sales_daily_merged""")
+    op.execute("DROP TABLE sales_daily_merged")
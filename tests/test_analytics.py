@@ -0,0 +1,114 @@
+"""Los resúmenes incrementales deben coincidir con un GROUP BY completo sobre invoices/purchases."""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import analytics, crud, models, schemas
+
+CENT = Decimal("0.01")
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request):
+    return request.getfixturevalue("sqlite_engine" if request.param == "sqlite" else "pg")
+
+@pytest.fixture
+def use_slot():
+    """Fuerza el slot del hilo: las escrituras caen en filas parciales distintas."""
+    def use(slot: int):
+        analytics._thread.slot = slot % analytics.ANALYTICS_SLOTS
+    yield use
+    del analytics._thread.slot
+
+def _period(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def _reference(db: Session, source: str):
+    """(filas por día, {método: (n, total)}, {usuario: (n, total)}) recorriendo la tabla entera."""
+    if source == "invoices":
+        rows = db.execute(select(models.Invoice.invoice_date.label("day"), models.Invoice.payment_method,
+                                 models.Invoice.total_amount, models.Invoice.user_id)).all()
+    else:
+        rows = [(row.purchase_date.date(), row.payment_method, row.total_amount, row.user_id)
+                for row in db.execute(select(models.Purchase.purchase_date, models.Purchase.payment_method,
+                                             models.Purchase.total_amount, models.Purchase.user_id))]
+    by_method, by_user = defaultdict(lambda: [0, Decimal(0)]), defaultdict(lambda: [0, Decimal(0)])
+    for day, method, amount, user_id in rows:
+        for totals in (by_method[method or "unknown"], by_user[user_id]):
+            totals[0] += 1
+            totals[1] += Decimal(amount)
+    return [(day, Decimal(amount)) for day, _, amount, _ in rows], by_method, by_user
+
+def _revenue_reference(days, granularity: str):
+    periods = defaultdict(lambda: [0, Decimal(0)])
+    for day, amount in days:
+        periods[_period(day, granularity)][0] += 1
+        periods[_period(day, granularity)][1] += amount
+    return [(period, count, total.quantize(CENT)) for period, (count, total) in sorted(periods.items())]
+
+def _rounded(rows, key: str):
+    return [(row[key], row["sales_count"], Decimal(row["total_amount"]).quantize(CENT)) for row in rows]
+
+def _write_sales(db: Session, use_slot):
+    users = [models.User(email=f"u{i}@example.com", password_hash="x") for i in range(3)]
+    db.add_all(users)
+    db.commit()
+    methods = list(schemas.PaymentMethodEnum)
+    invoices = []
+    for i in range(12):
+        use_slot(i)
+        invoices.append(crud.create_invoice(db, schemas.InvoiceCreate(
+            invoice_number=f"F-{i}", invoice_date=date(2026, 1, 25) + timedelta(days=3 * i),
+            total_amount=Decimal("10.25") * (i + 1), payment_status="paid", payment_method=methods[i % len(methods)],
+            user_id=users[i % 3].user_id)))
+    use_slot(20)
+    crud.update_invoice(db, invoices[0], schemas.InvoiceUpdate(invoice_date=date(2026, 3, 1), total_amount=Decimal("1.10")))
+    crud.update_invoice(db, invoices[1], schemas.InvoiceUpdate(payment_method="transfer", billing_address="otra"))
+    crud.delete_invoice(db, invoices[2])
+
+    # compras con fecha (como la importación): el INSERT y luego analytics.record de esas PK
+    purchases = [models.Purchase(purchase_date=datetime(2026, 2, 1, 23, 30) + timedelta(days=2 * i, hours=i),
+                                 quantity=1, total_amount=Decimal("3.33") * (i + 1),
+                                 payment_method=["cash", "credit_card", None][i % 3], payment_status="completed",
+                                 delivery_status="delivered", user_id=users[i % 3].user_id)
+                 for i in range(15)]
+    db.add_all(purchases)
+    db.flush()
+    use_slot(3)
+    analytics.record(db, "purchases", [p.purchase_id for p in purchases])
+    db.commit()
+    use_slot(5)
+    crud.update_purchase(db, purchases[0], schemas.PurchaseUpdate(total_amount=Decimal("99.99"), payment_method="transfer"))
+    crud.delete_purchase(db, purchases[1])
+
+@pytest.mark.parametrize("source", ["invoices", "purchases"])
+def test_summaries_match_full_group_by(engine, use_slot, source):
+    with Session(engine) as db:
+        _write_sales(db, use_slot)
+        days, by_method, by_user = _reference(db, source)
+
+        for granularity in ("day", "week", "month"):
+            assert _rounded(analytics.revenue(db, source, granularity), "period") == _revenue_reference(days, granularity)
+
+        mix = {m: (n, total) for m, n, total in _rounded(analytics.payment_mix(db, source), "payment_method")}
+        assert mix == {method: (n, total.quantize(CENT)) for method, (n, total) in by_method.items()}
+
+        top = {u: (n, total) for u, n, total in _rounded(analytics.top_users(db, source), "user_id")}
+        assert top == {user: (n, total.quantize(CENT)) for user, (n, total) in by_user.items()}
+
+def test_rebuild_matches_incremental(engine, use_slot):
+    with Session(engine) as db:
+        _write_sales(db, use_slot)
+        before = {source: analytics.revenue(db, source, "day") for source in ("invoices", "purchases")}
+        analytics.rebuild(db)
+        after = {source: analytics.revenue(db, source, "day") for source in ("invoices", "purchases")}
+
+    assert {s: _rounded(rows, "period") for s, rows in before.items()} == \
+           {s: _rounded(rows, "period") for s, rows in after.items()}
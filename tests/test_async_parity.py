@@ -0,0 +1,185 @@
+"""DB_ASYNC=1 responde lo mismo que el modo sync: las mismas peticiones en cada modo, sobre bases iguales."""
+import asyncio
+from collections import OrderedDict
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip("greenlet", reason="DB_ASYNC necesita sqlalchemy[asyncio]")
+pytest.importorskip("aiosqlite")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app import crud, database, idempotency, main, models, serialization
+from app.cache import LRUTTLCache, product_cache
+from app.main import app
+
+# Peticiones: (método, url, params, cuerpo JSON, cabeceras)
+
+# fechas que pone la base de datos al crear (now()): distintas en cada ejecución
+GENERATED = ("registration_date", "purchase_date")
+
+READS = [
+    ("GET", "/products/", {}, None, {}),
+    ("GET", "/products/", {"cursor": "", "limit": 2}, None, {}),
+    ("GET", "/products/", {"cursor": crud.encode_cursor(2), "limit": 2}, None, {}),
+    ("GET", "/products/", {"fields": "name,price", "sort": "-price", "cursor": ""}, None, {}),
+    ("GET", "/products/", {"category": "bebidas", "fields": "sku"}, None, {}),
+    ("GET", "/products/", {"fields": "secret"}, None, {}),
+    ("GET", "/products/", {"cursor": "roto"}, None, {}),
+    ("GET", "/products/", {"limit": 2}, None, {"X-Store-Id": "*"}),
+    ("GET", "/products/1", {}, None, {}),
+    ("GET", "/products/1", {"fields": "sku,version"}, None, {}),
+    ("GET", "/products/99", {}, None, {}),
+    ("GET", "/users/", {"fields": "email"}, None, {}),
+    ("GET", "/users/1", {"include": "invoices,purchases"}, None, {}),
+    ("GET", "/users/1", {"fields": "email,first_name"}, None, {}),
+    ("GET", "/users/1", {"fields": "email", "include": "invoices"}, None, {}),
+    ("GET", "/users/1/invoices/", {}, None, {}),
+    ("GET", "/users/1/purchases/", {}, None, {}),
+    ("GET", "/employees/", {"cursor": "", "limit": 1}, None, {}),
+    ("GET", "/employees/2", {"fields": "email"}, None, {}),
+    ("GET", "/invoices/", {"date_from": "2026-02-01", "date_to": "2026-03-31"}, None, {}),
+    ("GET", "/invoices/", {"fields": "invoice_number,total_amount", "cursor": "", "date_to": "2026-02-28"}, None, {}),
+    ("GET", "/invoices/1", {"fields": "total_amount"}, None, {}),
+    ("GET", "/purchases/", {"date_from": "2026-02-01", "date_to": "2026-02-01"}, None, {}),
+    ("GET", "/purchases/", {"fields": "total_amount", "date_to": "2026-02-01", "cursor": ""}, None, {}),
+    ("GET", "/purchases/3", {}, None, {}),
+]
+
+WRITES = [
+    ("POST", "/employees/", {}, {"first_name": "Eva", "last_name": "nueva", "email": "eva@example.com"}, {}),
+    ("POST", "/employees/", {}, {"first_name": "Eva", "last_name": "otra", "email": "eva@example.com"}, {}),
+    ("PUT", "/employees/1", {}, {"first_name": "Ana", "last_name": "cambiada", "email": "e0@example.com"}, {}),
+    ("PATCH", "/products/1", {}, {"price": "9.99"}, {"If-Match": '"p1-v1"'}),
+    ("PATCH", "/products/1", {}, {"price": "1.00"}, {"If-Match": '"p1-v1"'}),
+    ("POST", "/products/", {}, {"name": "agua", "sku": "SKU-0", "price": "1", "stock_quantity": 1}, {}),
+    ("POST", "/purchases/", {}, {"quantity": 1, "total_amount": "5.00", "payment_method": "cash",
+                                 "payment_status": "completed", "delivery_status": "pending", "user_id": 2}, {}),
+    ("POST", "/invoices/", {}, {"invoice_number": "F-1", "invoice_date": "2026-04-01", "total_amount": "1",
+                                "payment_status": "paid", "payment_method": "cash", "user_id": 1}, {}),
+    ("DELETE", "/invoices/3", {}, None, {}),
+    ("DELETE", "/purchases/99", {}, None, {}),
+    ("GET", "/products/1", {}, None, {}),
+    ("GET", "/invoices/", {}, None, {}),
+    ("GET", "/purchases/", {}, None, {}),
+    ("GET", "/employees/", {}, None, {}),
+]
+
+SHARDED = [
+    ("GET", "/products/", {}, None, {"X-Store-Id": "1"}),
+    ("GET", "/products/", {}, None, {"X-Store-Id": "2"}),
+    ("GET", "/products/", {"fields": "sku", "cursor": "", "limit": 4}, None, {"X-Store-Id": "*"}),
+    ("GET", "/products/1", {}, None, {"X-Store-Id": "1"}),
+    ("GET", "/invoices/", {"fields": "invoice_number"}, None, {"X-Store-Id": "1"}),
+    ("GET", "/invoices/", {}, None, {"X-Store-Id": "99"}),
+    ("POST", "/employees/", {}, {"first_name": "Eva", "last_name": "norte", "email": "eva@example.com"},
+     {"X-Store-Id": "1"}),
+    ("GET", "/employees/", {"fields": "email"}, None, {"X-Store-Id": "1"}),
+    ("GET", "/employees/", {"fields": "email"}, None, {"X-Store-Id": "2"}),
+]
+
+def _seed(engine, prefix: str = ""):
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(models.Product(name=f"{prefix}producto {i}", sku=f"{prefix}SKU-{i}", price=i + 1, stock_quantity=i,
+                                  category="bebidas" if i % 2 else "lacteos") for i in range(5))
+        db.add_all(models.User(email=f"{prefix}u{i}@example.com", password_hash="x", first_name=f"U{i}",
+                               registration_date=datetime(2026, 1, 1)) for i in range(2))
+        db.add_all(models.Employee(first_name=f"E{i}", last_name="prueba", email=f"{prefix}e{i}@example.com",
+                                   hire_date=date(2025, 1, 1)) for i in range(2))
+        db.flush()
+        db.add_all(models.Invoice(invoice_number=f"{prefix}F-{i}", invoice_date=date(2026, 1 + i, 15), total_amount=10 * i,
+                                  payment_status="paid", payment_method="cash", user_id=1) for i in range(3))
+        db.add_all(models.Purchase(purchase_date=datetime(2026, 1 + i, 1, 12), quantity=i + 1, total_amount=i,
+                                   payment_method="cash", payment_status="completed", delivery_status="delivered",
+                                   user_id=1) for i in range(3))
+        db.commit()
+
+def _normalized(value):
+    if isinstance(value, list):
+        return [_normalized(item) for item in value]
+    if isinstance(value, dict):
+        return {key: "<now>" if key in GENERATED else _normalized(item) for key, item in value.items()}
+    return value
+
+def _run(tmp_path, monkeypatch, requests, use_async: bool, sharded: bool = False):
+    """Respuestas de la app (status, cabeceras de paginación, cuerpo) sobre una base recién sembrada."""
+    mode = "async" if use_async else "sync"
+    path = tmp_path / f"{mode}.db"
+    engine = create_engine(f"sqlite:///{path}")
+    _seed(engine)
+    with monkeypatch.context() as m:
+        m.setattr(database, "_engine", engine)
+        m.setattr(database.SessionLocal, "kw", {**database.SessionLocal.kw, "bind": engine})
+        m.setattr(product_cache, "_data", OrderedDict())
+        m.setattr(idempotency, "recent", LRUTTLCache(maxsize=100, ttl=60))
+        m.setattr(database, "_shard_engines", {})
+        m.setattr(database, "_shard_sessions", {})
+        m.setattr(database, "_async_shard_engines", {})
+        m.setattr(database, "_async_shard_sessions", {})
+        if sharded:
+            norte = create_engine(f"sqlite:///{tmp_path / f'{mode}-norte.db'}")
+            _seed(norte, prefix="norte-")
+            norte.dispose()
+            m.setattr(database, "SHARD_URLS", {"norte": str(norte.url)})
+            m.setattr(database, "STORE_SHARDS", {"1": "norte", "2": database.DEFAULT_SHARD})
+            m.setattr(database, "SHARD_NAMES", [database.DEFAULT_SHARD, "norte"])
+            m.setattr("app.sharding.SHARD_NAMES", [database.DEFAULT_SHARD, "norte"])
+        if use_async:
+            m.setattr(database, "ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{path}")
+            m.setattr(database, "AsyncSessionLocal", async_sessionmaker(autoflush=False, expire_on_commit=False))
+            m.setattr(database, "_async_engine", None)
+            m.setattr(app.router, "routes", main.with_async_routes(app.router.routes))
+        client = TestClient(app)
+        responses = []
+        for method, url, params, body, headers in requests:
+            response = client.request(method, url, params=params, json=body, headers=headers)
+            responses.append((method, url, response.status_code, response.headers.get("etag"),
+                              response.headers.get("x-next-cursor"), _normalized(response.json())))
+        asyncio.run(database.dispose_engines())
+    engine.dispose()
+    return responses
+
+@pytest.mark.parametrize("fast", [False, True], ids=["pydantic", "orjson"])
+@pytest.mark.parametrize("requests", [READS, WRITES], ids=["reads", "writes"])
+def test_async_routes_answer_like_sync(tmp_path, monkeypatch, requests, fast):
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", fast)
+
+    sync = _run(tmp_path, monkeypatch, requests, use_async=False)
+    async_ = _run(tmp_path, monkeypatch, requests, use_async=True)
+
+    assert async_ == sync
+
+def test_async_routes_answer_like_sync_across_shards(tmp_path, monkeypatch):
+    sync = _run(tmp_path, monkeypatch, SHARDED, use_async=False, sharded=True)
+    async_ = _run(tmp_path, monkeypatch, SHARDED, use_async=True, sharded=True)
+
+    assert async_ == sync
+    # sanidad: cada tienda ve su shard
+    assert [item["email"] for item in sync[-2][-1]] == ["norte-e0@example.com", "norte-e1@example.com",
+                                                         "eva@example.com"]
+    assert [item["email"] for item in sync[-1][-1]] == ["e0@example.com", "e1@example.com"]
+
+def _modules(routes):
+    return {(route.path, method): route.endpoint.__module__ for route in routes if hasattr(route, "methods")
+            for method in route.methods}
+
+def test_async_routes_replace_the_sync_ones():
+    routes = _modules(main.with_async_routes(app.router.routes))
+
+    assert routes[("/products/", "GET")] == routes[("/invoices/", "POST")] == "app.async_api"
+    # los que no tienen versión async siguen igual
+    assert routes[("/invoices/export", "GET")] == routes[("/checkout", "POST")] == "app.main"
+
+def test_replicas_keep_the_sync_reads(monkeypatch):
+    from app.replicas import replicas
+
+    monkeypatch.setattr(replicas, "engines", [object()])
+    routes = _modules(main.with_async_routes(app.router.routes))
+
+    assert routes[("/products/", "GET")] == routes[("/users/{user_id}", "GET")] == "app.main"
+    assert routes[("/products/{product_id}", "PATCH")] == "app.async_api"
@@ -0,0 +1,113 @@
+"""Modo DB_ASYNC: read_product usa la caché de productos y el camino de 304 sólo con la versión."""
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("greenlet", reason="DB_ASYNC necesita sqlalchemy[asyncio]")
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from app import async_api, crud_async, etag, models, schemas
+from app.cache import product_cache, product_id_key, product_sku_key
+
+@pytest.fixture
+def product_id(pg, monkeypatch):
+    monkeypatch.setattr(product_cache, "_data", OrderedDict())
+    with Session(pg) as db:
+        product = models.Product(name="leche", sku="LECHE-1", price=1, category="lacteos", stock_quantity=5)
+        db.add(product)
+        db.commit()
+        return product.product_id
+
+@pytest.fixture
+def run_async(pg):
+    """Ejecuta fn(db, statements) con una AsyncSession (asyncpg) sobre la base de pg."""
+    url = make_url(pg.url.render_as_string(hide_password=False)).set(drivername="postgresql+asyncpg")
+
+    def run(fn):
+        async def main():
+            engine = create_async_engine(url)
+            statements = []
+            event.listen(engine.sync_engine, "before_cursor_execute",
+                         lambda conn, cursor, statement, *args: statements.append(statement))
+            try:
+                async with AsyncSession(engine, expire_on_commit=False) as db:
+                    return await fn(db, statements)
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+    return run
+
+def test_read_product_is_cached(run_async, product_id):
+    async def read_twice(db, statements):
+        first = await async_api.read_product(product_id, Response(), fields=None, if_none_match=None, db=db)
+        queries = len(statements)
+        second = await async_api.read_product(product_id, Response(), fields=None, if_none_match=None, db=db)
+        return first, second, queries, len(statements)
+
+    first, second, after_first, after_second = run_async(read_twice)
+
+    assert first == second == product_cache.get(product_id_key(product_id))
+    assert first["sku"] == "LECHE-1"
+    assert after_first == 1 and after_second == 1
+
+def test_if_none_match_reads_only_the_version(run_async, product_id):
+    current = etag.product_etag(product_id, 1)
+
+    async def conditional(db, statements):
+        response = await async_api.read_product(product_id, Response(), fields=None, if_none_match=current, db=db)
+        return response, list(statements)
+
+    response, statements = run_async(conditional)
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == current
+    assert len(statements) == 1
+    assert statements[0].split("FROM")[0].strip() == "SELECT products.version"
+    # sin caché todavía: el 304 no la rellena
+    assert product_cache.get(product_id_key(product_id)) is None
+
+def test_if_none_match_from_cache_skips_the_database(run_async, product_id, redis_cache):
+    async def cached_then_conditional(db, statements):
+        await async_api.read_product(product_id, Response(), fields=None, if_none_match=None, db=db)
+        before = len(statements)
+        response = await async_api.read_product(product_id, Response(), fields=None,
+                                                if_none_match=etag.product_etag(product_id, 1), db=db)
+        return response, len(statements) - before
+
+    response, queries = run_async(cached_then_conditional)
+
+    assert response.status_code == 304
+    assert queries == 0
+
+def test_if_none_match_ignores_the_memory_cache(run_async, product_id):
+    # la caché de memoria es de este worker: la versión se lee de la base de datos
+    async def cached_then_conditional(db, statements):
+        await async_api.read_product(product_id, Response(), fields=None, if_none_match=None, db=db)
+        before = len(statements)
+        response = await async_api.read_product(product_id, Response(), fields=None,
+                                                if_none_match=etag.product_etag(product_id, 1), db=db)
+        return response, statements[before:]
+
+    response, statements = run_async(cached_then_conditional)
+
+    assert response.status_code == 304
+    assert [statement.split("FROM")[0].strip() for statement in statements] == ["SELECT products.version"]
+
+def test_writes_invalidate_the_cache(run_async, product_id):
+    async def read_update_read(db, statements):
+        await crud_async.get_product_cached(db, product_id)
+        db_product = await crud_async.get_product(db, product_id)
+        await crud_async.update_product(db, db_product, schemas.ProductUpdate(sku="LECHE-2", price=2))
+        assert product_cache.get(product_id_key(product_id)) is None
+        assert product_cache.get(product_sku_key("LECHE-1")) is None
+        return await crud_async.get_product_cached(db, product_id)
+
+    updated = run_async(read_update_read)
+
+    assert (updated["sku"], updated["version"]) == ("LECHE-2", 2)
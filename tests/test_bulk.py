@@ -0,0 +1,76 @@
+"""Cargas masivas: claves repetidas y hashes de /users/bulk."""
+import json
+
+import bcrypt
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+HASH = bcrypt.hashpw(b"secreto-1", bcrypt.gensalt(4)).decode()
+
+def _product(sku: str, price: str = "1.00"):
+    return {"name": f"producto {sku}", "sku": sku, "price": price, "stock_quantity": 1}
+
+def _user(email: str, password_hash: str = HASH):
+    return {"email": email, "password_hash": password_hash}
+
+def _count(engine, model) -> int:
+    with Session(engine) as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+def test_duplicate_skus_reject_the_whole_load(client, sqlite_engine):
+    rows = [_product("A"), _product("B"), _product("A", "2.00"), _product("C"), _product("B"), _product("A")]
+
+    response = client.post("/products/bulk", json=rows)
+
+    assert response.status_code == 400
+    assert response.json()["duplicates"] == [{"sku": "A", "indexes": [0, 2, 5]}, {"sku": "B", "indexes": [1, 4]}]
+    assert _count(sqlite_engine, models.Product) == 0
+
+def test_duplicate_emails_reject_the_whole_load(client):
+    rows = [_user("ana@example.com"), _user("eva@example.com"), _user("ana@example.com")]
+
+    response = client.post("/users/bulk", content="\n".join(json.dumps(row) for row in rows),
+                           headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 400
+    assert response.json()["duplicates"] == [{"email": "ana@example.com", "indexes": [0, 2]}]
+
+@pytest.mark.parametrize("password_hash", [
+    "x",
+    "secreto-1",
+    HASH[:-1],
+    HASH.replace("$2b$", "$1$"),
+    HASH.replace("$04$", "$99$"),
+    HASH[:-1] + "!",
+])
+def test_user_import_requires_a_bcrypt_hash(client, password_hash):
+    response = client.post("/users/bulk", json=[_user("ana@example.com", password_hash)])
+
+    assert response.status_code == 200
+    assert response.json()["ids"] == []
+    assert [error["index"] for error in response.json()["errors"]] == [0]
+    assert "bcrypt hash" in response.json()["errors"][0]["detail"]
+
+def test_user_import_keeps_valid_hashes(pg_client, pg):
+    rows = [_user("ana@example.com"), _user("eva@example.com", "no-es-bcrypt"), _user("luz@example.com")]
+
+    result = pg_client.post("/users/bulk", json=rows).json()
+
+    assert len(result["ids"]) == 2
+    assert [error["index"] for error in result["errors"]] == [1]
+    with Session(pg) as db:
+        stored = db.scalar(select(models.User.password_hash).where(models.User.email == "ana@example.com"))
+    assert bcrypt.checkpw(b"secreto-1", stored.encode())
+
+def test_distinct_skus_are_upserted(pg_client, pg):
+    pg_client.post("/products/bulk", json=[_product("A"), _product("B")])
+
+    result = pg_client.post("/products/bulk", json=[_product("A", "5.00"), _product("C")]).json()
+
+    assert (len(result["ids"]), result["errors"]) == (2, [])
+    with Session(pg) as db:
+        prices = dict(db.execute(select(models.Product.sku, models.Product.price)).all())
+    assert {sku: str(price) for sku, price in prices.items()} == {"A": "5.00", "B": "1.00", "C": "1.00"}
@@ -0,0 +1,126 @@
+"""Caché de productos: backends (LRU+TTL en memoria, Redis) e invalidación desde la API."""
+import json
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import cache, etag, models
+from app.cache import LRUTTLCache, RedisCache, product_id_key, product_sku_key
+
+PRODUCT = {"name": "leche", "sku": "LECHE-1", "price": "1.00", "stock_quantity": 5, "category": "lacteos"}
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+def test_lru_evicts_the_least_recently_used():
+    lru = LRUTTLCache(maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == (1, None, 3)
+    assert (lru.stats.hits, lru.stats.misses, lru.stats.evictions) == (3, 1, 1)
+
+def test_lru_expires_after_the_ttl(clock):
+    lru = LRUTTLCache(maxsize=10, ttl=5)
+    lru.set("a", 1)
+    clock.now += 4.9
+    assert lru.get("a") == 1
+
+    clock.now += 0.1
+    assert lru.get("a") is None
+    assert (lru.stats.evictions, len(lru._data)) == (1, 0)
+
+def test_lru_set_renews_the_ttl(clock):
+    lru = LRUTTLCache(maxsize=10, ttl=5)
+    lru.set("a", 1)
+    clock.now += 4
+    lru.set("a", 2)
+    clock.now += 4
+
+    assert lru.get("a") == 2
+
+def test_redis_cache_stores_json_with_prefix_and_ttl(stub_redis):
+    client = stub_redis
+    redis = RedisCache(client, ttl=30.5, prefix="t:")
+    redis.set("a", {"version": 1})
+
+    assert json.loads(client.data["t:a"]) == {"version": 1}
+    assert client.expires["t:a"] == 30
+    assert (redis.get("a"), redis.get("b")) == ({"version": 1}, None)
+    assert (redis.stats.hits, redis.stats.misses) == (1, 1)
+
+    redis.delete("a", "b")
+    redis.delete()
+    assert redis.get("a") is None and client.data == {}
+
+def test_redis_cache_ttl_is_at_least_one_second(stub_redis):
+    RedisCache(stub_redis, ttl=0.2).set("a", 1)
+
+    assert stub_redis.expires["supermercado:a"] == 1
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, client):
+    """La product_cache con la que trabaja la app en la prueba."""
+    return cache.product_cache if request.param == "memory" else request.getfixturevalue("redis_cache")
+
+def _cached(client, backend):
+    product = client.post("/products/", json=PRODUCT).json()
+    client.get(f"/products/{product['product_id']}")
+    assert backend.get(product_id_key(product["product_id"]))["sku"] == "LECHE-1"
+    return product["product_id"]
+
+@pytest.mark.parametrize("method, body", [
+    ("PUT", {**PRODUCT, "sku": "LECHE-2", "price": "2.00"}),
+    ("PATCH", {"sku": "LECHE-2", "price": "2.00"}),
+])
+def test_updates_invalidate_the_cache(client, backend, method, body):
+    product_id = _cached(client, backend)
+    backend.set(product_sku_key("LECHE-1"), backend.get(product_id_key(product_id)))
+
+    response = client.request(method, f"/products/{product_id}", json=body)
+
+    assert response.status_code == 200
+    assert backend.get(product_id_key(product_id)) is None
+    assert backend.get(product_sku_key("LECHE-1")) is None
+    again = client.get(f"/products/{product_id}").json()
+    assert (again["sku"], again["price"], again["version"]) == ("LECHE-2", "2.00", 2)
+
+def test_delete_invalidates_the_cache(client, backend):
+    product_id = _cached(client, backend)
+
+    assert client.delete(f"/products/{product_id}").status_code == 200
+    assert backend.get(product_id_key(product_id)) is None
+    assert client.get(f"/products/{product_id}").status_code == 404
+
+def test_conditional_requests_see_writes_from_other_workers(client, sqlite_engine):
+    # la caché de memoria de este worker guarda la versión 1; otro worker escribe la 2
+    product_id = _cached(client, cache.product_cache)
+    with Session(sqlite_engine) as db:
+        db.execute(update(models.Product).where(models.Product.product_id == product_id)
+                   .values(price=3, version=2))
+        db.commit()
+    old, new = etag.product_etag(product_id, 1), etag.product_etag(product_id, 2)
+
+    response = client.get(f"/products/{product_id}", headers={"If-None-Match": old})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == new
+    assert (response.json()["price"], response.json()["version"]) == ("3.00", 2)
+    # la recarga sustituye la entrada antigua
+    assert cache.product_cache.get(product_id_key(product_id))["version"] == 2
+
+    assert client.get(f"/products/{product_id}", headers={"If-None-Match": new}).status_code == 304
+    stale = client.patch(f"/products/{product_id}", json={"price": "9.00"}, headers={"If-Match": old})
+    assert stale.status_code == 412
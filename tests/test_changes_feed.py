@@ -0,0 +1,122 @@
+"""ChangeFeed: un solo sondeo por shard, sea cual sea el número de suscriptores, y todos reciben el cambio."""
+import asyncio
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+from app import changes
+
+SUBSCRIBERS = 100
+SHARDS = ("default", "norte")
+
+class FakeLog:
+    """change_log de cada shard en memoria, en lugar de _latest_seq/_relay_and_read/_read sobre la BD."""
+
+    def __init__(self):
+        self.changes = {shard: [] for shard in SHARDS}
+        self.polls = Counter()
+        self.reads = Counter()
+        self.running = Counter()
+        self.max_running = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, shard: str, name: str):
+        seq = len(self.changes[shard]) + 1
+        payload = json.dumps({"seq": seq, "entity": "employees", "data": {"first_name": name}})
+        self.changes[shard].append(changes.Change(seq, "employees", payload))
+
+    def latest_seq(self, shard: str) -> int:
+        return len(self.changes[shard])
+
+    def relay_and_read(self, shard: str, since: int):
+        with self._lock:
+            self.polls[shard] += 1
+            self.running[shard] += 1
+            self.max_running[shard] = max(self.max_running[shard], self.running[shard])
+        try:
+            return self.changes[shard][since:], max(since, len(self.changes[shard])), 0
+        finally:
+            with self._lock:
+                self.running[shard] -= 1
+
+    def read(self, shard: str, since: int, entity: str = None, check_expired: bool = True):
+        self.reads[shard] += 1
+        return self.changes[shard][since:], max(since, len(self.changes[shard]))
+
+@pytest.fixture
+def log(monkeypatch):
+    log = FakeLog()
+    monkeypatch.setattr(changes, "_latest_seq", log.latest_seq)
+    monkeypatch.setattr(changes, "_relay_and_read", log.relay_and_read)
+    monkeypatch.setattr(changes, "_read", log.read)
+    monkeypatch.setattr(changes, "CHANGES_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(changes, "feeds", {})
+    return log
+
+def _names(items):
+    return [json.loads(item.payload)["data"]["first_name"] for item in items]
+
+async def _long_poll(feed, since):
+    items, cursor = await feed.next_batch(since, timeout=5)
+    return _names(items), cursor
+
+async def _sse(feed, since):
+    events = feed.stream(None, ([], since), heartbeat=5)
+    try:
+        assert await events.__anext__() == ": keepalive\n\n"
+        event = await events.__anext__()
+    finally:
+        await events.aclose()
+    return [json.loads(line[6:])["data"]["first_name"] for line in event.splitlines() if line.startswith("data: ")]
+
+def test_one_poll_per_shard_wakes_every_subscriber(log):
+    async def scenario():
+        feeds = {shard: changes.feed_for(shard) for shard in SHARDS}
+        since = {shard: await feed.current_seq() for shard, feed in feeds.items()}
+        # el primer sondeo fija el inicio del buffer; antes se leería de la BD
+        await asyncio.sleep(0.05)
+        waiting = {shard: [asyncio.create_task(_long_poll(feed, since[shard])) for _ in range(SUBSCRIBERS // 2)]
+                   + [asyncio.create_task(_sse(feed, since[shard])) for _ in range(SUBSCRIBERS // 2)]
+                   for shard, feed in feeds.items()}
+        await asyncio.sleep(0.1)
+        assert not any(task.done() for tasks in waiting.values() for task in tasks)
+        assert all(feed.subscribers == SUBSCRIBERS // 2 for feed in feeds.values())
+
+        for shard in SHARDS:
+            log.add(shard, f"nuevo-{shard}")
+        try:
+            return {shard: await asyncio.wait_for(asyncio.gather(*tasks), 5) for shard, tasks in waiting.items()}
+        finally:
+            await changes.stop_feeds()
+
+    received = asyncio.run(scenario())
+
+    for shard in SHARDS:
+        long_polls, streams = received[shard][:SUBSCRIBERS // 2], received[shard][SUBSCRIBERS // 2:]
+        assert long_polls == [([f"nuevo-{shard}"], 1)] * (SUBSCRIBERS // 2)
+        assert streams == [[f"nuevo-{shard}"]] * (SUBSCRIBERS // 2)
+    # los suscriptores sólo esperan el evento: las lecturas son las de la tarea de cada shard
+    assert log.reads == Counter()
+    assert log.max_running == Counter({shard: 1 for shard in SHARDS})
+    assert all(0 < log.polls[shard] < SUBSCRIBERS for shard in SHARDS)
+
+def test_a_change_only_wakes_its_shard(log):
+    async def scenario():
+        feeds = {shard: changes.feed_for(shard) for shard in SHARDS}
+        for feed in feeds.values():
+            await feed.current_seq()
+        await asyncio.sleep(0.05)
+        norte = asyncio.create_task(feeds["norte"].next_batch(0, timeout=0.3))
+        log.add("default", "central")
+        try:
+            default = await feeds["default"].next_batch(0, timeout=5)
+            return _names(default[0]), await norte
+        finally:
+            await changes.stop_feeds()
+
+    default, norte = asyncio.run(scenario())
+
+    assert default == ["central"]
+    assert norte == ([], 0)
@@ -0,0 +1,85 @@
+"""GET /changes por tienda: cada shard tiene su change_log y X-Store-Id elige cuál se lee."""
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import changes, database, models
+
+def _employee_change(engine, name: str):
+    """Crea un empleado y lleva su cambio a change_log (record + relay, como crud.py y el feed)."""
+    with Session(engine) as db:
+        employee = models.Employee(first_name=name, last_name="prueba", email=f"{name}@example.com")
+        db.add(employee)
+        db.flush()
+        changes.record(db, "employees", "create", [employee.employee_id])
+        db.commit()
+        changes.relay(db)
+
+@pytest.fixture
+def shards(client, sqlite_engine, tmp_path, monkeypatch):
+    """Shard "norte" en otra base SQLite; la tienda 1 está en norte y la 2 en el default."""
+    norte = create_engine(f"sqlite:///{tmp_path / 'norte.db'}")
+    models.Base.metadata.create_all(norte)
+    monkeypatch.setattr(database, "SHARD_URLS", {"norte": str(norte.url)})
+    monkeypatch.setattr(database, "STORE_SHARDS", {"1": "norte", "2": database.DEFAULT_SHARD})
+    monkeypatch.setattr(database, "_shard_engines", {})
+    monkeypatch.setattr(database, "_shard_sessions", {})
+    monkeypatch.setattr(changes, "feeds", {})
+    _employee_change(sqlite_engine, "central")
+    _employee_change(norte, "norte")
+    yield {"default": sqlite_engine, "norte": norte}
+    for created in database._shard_engines.values():
+        created.dispose()
+    norte.dispose()
+
+@pytest.fixture
+def no_poll(monkeypatch):
+    # el TestClient sin "with" abre un event loop por petición: la tarea de sondeo no sobreviviría
+    # a la petición, así que el feed lee directamente del shard (since anterior a su buffer)
+    monkeypatch.setattr(changes.ChangeFeed, "_ensure_started", lambda self: None)
+
+def _changed_names(response):
+    assert response.status_code == 200
+    return [change["data"]["first_name"] for change in response.json()["changes"]]
+
+@pytest.mark.parametrize("store, expected", [("1", ["norte"]), ("2", ["central"]), (None, ["central"])])
+def test_changes_follow_store_shard(client, shards, no_poll, store, expected):
+    headers = {"X-Store-Id": store} if store is not None else {}
+    response = client.get("/changes", params={"since": 0, "timeout": 0}, headers=headers)
+
+    assert _changed_names(response) == expected
+    assert response.json()["next"] == 1
+    assert set(changes.feeds) == {database.shard_for(store)}
+
+def test_unknown_store_is_rejected(client, shards, no_poll):
+    for path in ("/changes", "/employees/"):
+        response = client.get(path, params={"since": 0, "timeout": 0} if path == "/changes" else {},
+                              headers={"X-Store-Id": "99"})
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Unknown X-Store-Id: 99"}
+
+def test_without_store_map_any_store_uses_default(client, shards, no_poll, monkeypatch):
+    monkeypatch.setattr(database, "STORE_SHARDS", {})
+    response = client.get("/changes", params={"since": 0, "timeout": 0}, headers={"X-Store-Id": "99"})
+
+    assert _changed_names(response) == ["central"]
+
+def test_feed_polls_its_own_shard(shards, monkeypatch):
+    monkeypatch.setattr(changes, "CHANGES_POLL_SECONDS", 0.01)
+
+    async def first_change(shard: str):
+        feed = changes.feed_for(shard)
+        since = await feed.current_seq()
+        await asyncio.sleep(0.05)
+        _employee_change(shards[shard], f"nuevo-{shard}")
+        try:
+            items, cursor = await feed.next_batch(since, timeout=5)
+        finally:
+            await feed.stop()
+        return [json.loads(item.payload)["data"]["first_name"] for item in items], cursor
+
+    assert asyncio.run(first_change("norte")) == (["nuevo-norte"], 2)
+    assert asyncio.run(first_change("default")) == (["nuevo-default"], 2)
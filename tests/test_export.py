@@ -0,0 +1,172 @@
+"""Exportación por streaming: bloques de EXPORT_CHUNK_SIZE filas con yield_per, nunca .all()."""
+import csv
+import io
+import json
+import tracemalloc
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.engine import Result
+from sqlalchemy.orm import Session
+
+from app import crud, database, main, models
+
+ROWS = 2 * crud.EXPORT_CHUNK_SIZE + 500
+
+@pytest.fixture
+def invoices(sqlite_engine):
+    with Session(sqlite_engine) as db:
+        user = models.User(email="ana@example.com", password_hash="x", registration_date=datetime(2026, 1, 1))
+        db.add(user)
+        db.flush()
+        db.execute(insert(models.Invoice), [
+            {"invoice_number": f"F-{i:06d}", "invoice_date": date(2026, 1 + i % 12, 1), "total_amount": i,
+             "payment_status": "paid", "payment_method": "cash", "user_id": user.user_id,
+             "created_at": datetime(2026, 1, 1)} for i in range(ROWS)])
+        db.commit()
+
+@pytest.fixture
+def no_buffering(monkeypatch):
+    """Falla si alguien carga el resultado completo en memoria."""
+    def buffered(self, *args, **kwargs):
+        raise AssertionError("la exportación no debe cargar todas las filas")
+    for name in ("all", "fetchall"):
+        monkeypatch.setattr(Result, name, buffered)
+
+@pytest.fixture
+def export_options(sqlite_engine):
+    """execution_options de cada SELECT sobre invoices."""
+    seen = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM invoices" in statement:
+            seen.append(context.execution_options)
+    event.listen(sqlite_engine, "before_cursor_execute", capture)
+    return seen
+
+def test_iter_export_yields_chunks(sqlite_engine, invoices, no_buffering, export_options):
+    with Session(sqlite_engine) as db:
+        chunks = crud.iter_invoices_export(db)
+        names = next(chunks)
+        sizes = [len(chunk) for chunk in chunks]
+
+    assert names[0] == "invoice_id" and "invoice_number" in names
+    assert sizes == [crud.EXPORT_CHUNK_SIZE, crud.EXPORT_CHUNK_SIZE, 500]
+    assert [options.get("yield_per") for options in export_options] == [crud.EXPORT_CHUNK_SIZE]
+    assert export_options[0].get("stream_results")
+
+def test_iter_export_is_lazy(sqlite_engine, invoices, export_options):
+    with Session(sqlite_engine) as db:
+        chunks = crud.iter_invoices_export(db, date_from=date(2026, 6, 1))
+        next(chunks)
+        # la consulta no se ejecuta hasta pedir el primer bloque
+        assert export_options == []
+        first = next(chunks)
+
+    assert len(first) == crud.EXPORT_CHUNK_SIZE
+    assert len(export_options) == 1
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_export_endpoint_streams_every_row(client, invoices, no_buffering, export_options, fmt):
+    with client.stream("GET", "/invoices/export", params={"format": fmt}) as response:
+        assert response.status_code == 200
+        body = "".join(response.iter_text())
+
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(body)))
+    else:
+        rows = [json.loads(line) for line in body.splitlines()]
+    assert len(rows) == ROWS
+    assert [row["invoice_number"] for row in rows[:2]] == ["F-000000", "F-000001"]
+    assert [options.get("yield_per") for options in export_options] == [crud.EXPORT_CHUNK_SIZE]
+
+def _sales(engine, number: str, amount: int):
+    """Un usuario con una factura y una compra: number identifica la factura y amount la compra."""
+    with Session(engine) as db:
+        user = models.User(email=f"{number}@example.com", password_hash="x", registration_date=datetime(2026, 1, 1))
+        db.add(user)
+        db.flush()
+        db.add(models.Invoice(invoice_number=number, invoice_date=date(2026, 1, 1), total_amount=1,
+                              payment_status="paid", payment_method="cash", user_id=user.user_id,
+                              created_at=datetime(2026, 1, 1)))
+        db.add(models.Purchase(purchase_date=datetime(2026, 1, 1), quantity=1, total_amount=amount,
+                               payment_method="cash", payment_status="completed", delivery_status="delivered",
+                               user_id=user.user_id))
+        db.commit()
+
+@pytest.fixture
+def shards(client, sqlite_engine, tmp_path, monkeypatch):
+    """Shard "norte" en otra base SQLite; la tienda 1 está en norte y la 2 en el default."""
+    norte = create_engine(f"sqlite:///{tmp_path / 'norte.db'}")
+    models.Base.metadata.create_all(norte)
+    monkeypatch.setattr(database, "SHARD_URLS", {"norte": str(norte.url)})
+    monkeypatch.setattr(database, "STORE_SHARDS", {"1": "norte", "2": database.DEFAULT_SHARD})
+    monkeypatch.setattr(database, "_shard_engines", {})
+    monkeypatch.setattr(database, "_shard_sessions", {})
+    _sales(sqlite_engine, "F-CENTRAL", 10)
+    _sales(norte, "F-NORTE", 20)
+    yield
+    for created in database._shard_engines.values():
+        created.dispose()
+    norte.dispose()
+
+@pytest.mark.parametrize("store, invoice, purchase", [("1", "F-NORTE", 20), ("2", "F-CENTRAL", 10),
+                                                      (None, "F-CENTRAL", 10)])
+def test_export_reads_the_store_shard(client, shards, store, invoice, purchase):
+    headers = {"X-Store-Id": store} if store is not None else {}
+    invoices = client.get("/invoices/export", headers=headers)
+    purchases = client.get("/purchases/export", headers=headers)
+
+    assert (invoices.status_code, purchases.status_code) == (200, 200)
+    assert [json.loads(line)["invoice_number"] for line in invoices.text.splitlines()] == [invoice]
+    assert [float(json.loads(line)["total_amount"]) for line in purchases.text.splitlines()] == [purchase]
+
+@pytest.mark.parametrize("path", ["/invoices/export", "/purchases/export"])
+def test_export_rejects_unknown_store(client, shards, path):
+    response = client.get(path, headers={"X-Store-Id": "99"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown X-Store-Id: 99"}
+
+def _insert_invoices(engine, count: int):
+    with Session(engine) as db:
+        user = models.User(email=f"u{count}@example.com", password_hash="x", registration_date=datetime(2026, 1, 1))
+        db.add(user)
+        db.flush()
+        db.execute(insert(models.Invoice), [
+            {"invoice_number": f"F-{count}-{i:06d}", "invoice_date": date(2026, 1 + i % 12, 1), "total_amount": i,
+             "payment_status": "paid", "payment_method": "cash", "billing_address": "calle " * 20,
+             "user_id": user.user_id, "created_at": datetime(2026, 1, 1)} for i in range(count)])
+        db.commit()
+        return user.user_id
+
+def _export_peak(engine, user_id: int) -> int:
+    """Pico de memoria (tracemalloc) de exportar en NDJSON las facturas del usuario, sin guardar el cuerpo."""
+    tracemalloc.start()
+    try:
+        with Session(engine) as db:
+            chunks = crud.iter_invoices_export(db, user_id=user_id)
+            names = next(chunks)
+            for chunk in chunks:
+                "".join(json.dumps(dict(zip(names, row)), default=main._json_default) + "\n" for row in chunk)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_export_memory_does_not_grow_with_rows(sqlite_engine):
+    small = _insert_invoices(sqlite_engine, crud.EXPORT_CHUNK_SIZE * 2)
+    large = _insert_invoices(sqlite_engine, crud.EXPORT_CHUNK_SIZE * 20)
+    _export_peak(sqlite_engine, small)  # compila y cachea la consulta
+
+    small_peak = _export_peak(sqlite_engine, small)
+    large_peak = _export_peak(sqlite_engine, large)
+    tracemalloc.start()
+    with Session(sqlite_engine) as db:
+        db.execute(select(*models.Invoice.__table__.columns).where(models.Invoice.user_id == large)).all()
+    buffered_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # diez veces más filas: el pico sigue siendo el de un bloque
+    assert large_peak < 1.5 * small_peak
+    assert large_peak < buffered_peak / 4
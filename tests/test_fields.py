@@ -0,0 +1,63 @@
+"""?fields=: el SELECT sólo trae los campos pedidos (más los que necesita la paginación)."""
+import re
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.crud import projected_columns
+
+def _selected(statement: str):
+    """Columnas del SELECT principal de una sentencia compilada, sin la tabla."""
+    select_list = re.match(r"SELECT (.*?)\s+FROM", statement, re.S).group(1)
+    return [column.split(" AS ")[0].strip().rsplit(".", 1)[-1] for column in select_list.split(",")]
+
+def _product_selects(statements):
+    return [_selected(s) for s in statements if re.match(r"SELECT .*?\s+FROM products\b", s, re.S)]
+
+@pytest.fixture
+def statements(sqlite_engine):
+    """Sentencias que ejecuta sqlite_engine desde este punto."""
+    executed = []
+    event.listen(sqlite_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: executed.append(statement))
+    return executed
+
+@pytest.fixture
+def products(sqlite_engine):
+    with Session(sqlite_engine) as db:
+        db.add_all(models.Product(name=f"producto {i}", description="x" * 500, sku=f"SKU-{i}", price=i + 1,
+                                  category="bebidas", stock_quantity=i) for i in range(3))
+        db.commit()
+
+def test_projected_columns_compile_to_requested_fields():
+    columns = projected_columns(models.Product, schemas.Product, ["name", "price"], models.Product.product_id,
+                                models.Product.version, None)
+    stmt = select(*columns)
+
+    assert _selected(str(stmt)) == ["name", "price", "product_id", "version"]
+
+def test_projected_columns_do_not_repeat_requested_keys():
+    columns = projected_columns(models.Product, schemas.Product, ["product_id", "name"], models.Product.product_id)
+
+    assert _selected(str(select(*columns))) == ["product_id", "name"]
+
+def test_list_endpoint_selects_only_projected_columns(client, products, statements):
+    response = client.get("/products/", params={"fields": "name,price", "cursor": ""})
+
+    assert response.status_code == 200
+    assert [set(item) for item in response.json()] == [{"name", "price"}] * 3
+    assert _product_selects(statements) == [["name", "price", "product_id", "version"]]
+
+def test_detail_endpoint_selects_only_projected_columns(client, products, statements):
+    response = client.get("/products/1", params={"fields": "sku"})
+
+    assert response.status_code == 200
+    assert response.json() == {"sku": "SKU-0"}
+    assert _product_selects(statements) == [["sku"]]
+
+def test_unknown_field_is_rejected(client):
+    response = client.get("/products/", params={"fields": "name,secret"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown fields: secret"}
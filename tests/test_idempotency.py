@@ -0,0 +1,111 @@
+"""Idempotency-Key: una sola sentencia extra por clave nueva y una sola fila con peticiones concurrentes."""
+import asyncio
+from collections import OrderedDict
+
+import httpx
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app import database, idempotency, models
+from app.cache import LRUTTLCache
+from app.main import app
+
+CONCURRENT = 8
+
+PURCHASE = {"quantity": 1, "total_amount": "2.50", "payment_method": "cash", "payment_status": "completed",
+            "delivery_status": "delivered"}
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(idempotency, "recent", LRUTTLCache(maxsize=100, ttl=60))
+
+def _user(engine) -> int:
+    with Session(engine) as db:
+        user = models.User(email="ana@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        return user.user_id
+
+def _count(engine, model) -> int:
+    with Session(engine) as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+def test_new_key_costs_one_statement(client, sqlite_engine):
+    purchase = {**PURCHASE, "user_id": _user(sqlite_engine)}
+    counter = StatementCounter(sqlite_engine)
+    client.post("/purchases/", json=purchase)
+    without_key = len(counter.statements)
+
+    counter.statements.clear()
+    response = client.post("/purchases/", json=purchase, headers={"Idempotency-Key": "nueva"})
+
+    assert response.status_code == 200
+    assert len(counter.statements) == without_key + 1
+    assert sum(statement.startswith("INSERT INTO idempotency_keys") for statement in counter.statements) == 1
+
+def test_repeated_key_replays_without_writing(client, sqlite_engine, mode, monkeypatch):
+    purchase = {**PURCHASE, "user_id": _user(sqlite_engine)}
+    first = client.post("/purchases/", json=purchase, headers={"Idempotency-Key": "k"})
+    # otro worker: sin la caché en memoria, la repetición llega hasta la tabla
+    monkeypatch.setattr(idempotency, "recent", LRUTTLCache(maxsize=100, ttl=60))
+    again = client.post("/purchases/", json=purchase, headers={"Idempotency-Key": "k"})
+    different = client.post("/purchases/", json={**purchase, "quantity": 2}, headers={"Idempotency-Key": "k"})
+
+    assert again.status_code == 200 and again.headers["Idempotent-Replayed"] == "true"
+    assert again.content == first.content
+    assert different.status_code == 422
+    assert _count(sqlite_engine, models.Purchase) == 1
+
+def test_replay_after_business_conflict(client, mode, monkeypatch):
+    # la repetición choca con el email ya registrado antes de llegar al claim: se reproduce igualmente
+    employee = {"first_name": "Ana", "last_name": "prueba", "email": "ana@example.com"}
+    first = client.post("/employees/", json=employee, headers={"Idempotency-Key": "e"})
+    monkeypatch.setattr(idempotency, "recent", LRUTTLCache(maxsize=100, ttl=60))
+    again = client.post("/employees/", json=employee, headers={"Idempotency-Key": "e"})
+    other_key = client.post("/employees/", json=employee, headers={"Idempotency-Key": "otra"})
+
+    assert again.status_code == 200 and again.content == first.content
+    assert other_key.status_code == 400
+
+def _concurrent_posts(path: str, body: dict, key: str):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*(client.post(path, json=body, headers={"Idempotency-Key": key})
+                                              for _ in range(CONCURRENT)))
+        finally:
+            # las conexiones async son de este event loop
+            if database._async_engine is not None:
+                await database._async_engine.dispose()
+    return asyncio.run(send())
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, sqlite_engine, monkeypatch):
+    engine = sqlite_engine if request.param == "sqlite" else request.getfixturevalue("pg")
+    monkeypatch.setattr(database, "_engine", engine)
+    monkeypatch.setattr(database.SessionLocal, "kw", {**database.SessionLocal.kw, "bind": engine})
+    from app.cache import product_cache
+    monkeypatch.setattr(product_cache, "_data", OrderedDict())
+    return engine
+
+@pytest.mark.parametrize("path, model", [("/purchases/", models.Purchase), ("/employees/", models.Employee)])
+def test_concurrent_requests_create_one_row(engine, mode, path, model):
+    body = ({**PURCHASE, "user_id": _user(engine)} if model is models.Purchase
+            else {"first_name": "Ana", "last_name": "prueba", "email": "ana@example.com"})
+    responses = _concurrent_posts(path, body, "misma-clave")
+
+    assert [response.status_code for response in responses] == [200] * CONCURRENT
+    assert len({response.content for response in responses}) == 1
+    assert sum(response.headers.get("Idempotent-Replayed") == "true" for response in responses) == CONCURRENT - 1
+    assert _count(engine, model) == 1
+    assert _count(engine, models.IdempotencyKey) == 1
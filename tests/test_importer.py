@@ -0,0 +1,156 @@
+"""Importación por COPY (importer.py): lectura por bloques, rechazos, merge en products/purchases y caché."""
+import io
+import sys
+from collections import OrderedDict
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import importer, main, models
+from app.cache import product_cache, product_id_key, product_sku_key
+
+PRODUCTS_CSV = """﻿name,sku,price,stock_quantity,category
+leche,LECHE-1,1.10,5,lacteos
+pan,PAN-1,0.80,10,
+agua,,0.50,3,bebidas
+queso,QUESO-1,caro,1,lacteos
+leche entera,LECHE-1,1.25,7,lacteos
+"""
+
+def _csv(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode("utf-8"))
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield
+    importer.shutdown()
+
+def test_csv_chunks_number_rows_from_one():
+    chunks = list(importer._csv_chunks(_csv(PRODUCTS_CSV), 2))
+
+    assert [(first, len(rows)) for first, rows in chunks] == [(1, 2), (3, 2), (5, 1)]
+    # la BOM de Excel no acaba en el nombre de la primera columna
+    assert chunks[0][1][0] == {"name": "leche", "sku": "LECHE-1", "price": "1.10", "stock_quantity": "5",
+                               "category": "lacteos"}
+
+def test_invalid_csv_is_a_format_error():
+    with pytest.raises(importer.ImportFormatError, match="Invalid CSV near row 1"):
+        list(importer._csv_chunks(io.BytesIO(b"name,sku\n\xff\xfe,1\n"), 10))
+
+def test_parquet_chunks():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({"name": ["a", "b", "c"], "sku": ["A", "B", "C"]}), buffer)
+    buffer.seek(0)
+    chunks = list(importer._parquet_chunks(buffer, 2))
+
+    assert [(first, [row["sku"] for row in rows]) for first, rows in chunks] == [(1, ["A", "B"]), (3, ["C"])]
+
+def test_parquet_without_pyarrow_is_a_format_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+
+    with pytest.raises(importer.ImportFormatError, match="requires pyarrow"):
+        list(importer._parquet_chunks(io.BytesIO(b"PAR1"), 10))
+
+def test_validate_chunk_rejects_bad_rows():
+    rows = [
+        {"name": "leche", "sku": "LECHE-1", "price": "1.10", "stock_quantity": "5", "category": ""},
+        {"name": "agua", "sku": "", "price": "0.50", "stock_quantity": "3"},
+        {"name": "queso", "sku": "QUESO-1", "price": "caro", "stock_quantity": "1"},
+        {"name": "caro", "sku": "CARO-1", "price": "1e12", "stock_quantity": "1"},
+        {"name": "largo", "sku": "X" * 500, "price": "1", "stock_quantity": "1"},
+        {"name": "mucho", "sku": "MUCHO-1", "price": "1", "stock_quantity": str(2**31)},
+    ]
+
+    payload, valid, rejects = importer._validate_chunk("products", 10, rows)
+
+    assert valid == [10]
+    assert [row for row, _ in rejects] == [11, 12, 13, 14, 15]
+    assert rejects[0][1].startswith("sku:") and rejects[1][1].startswith("price:")
+    assert rejects[2][1] == "price: out of range for NUMERIC(10, 2)"
+    assert rejects[3][1].startswith("sku: longer than")
+    assert rejects[4][1] == "stock_quantity: out of range for integer"
+    # la categoría vacía va como NULL (celda vacía en el CSV de COPY)
+    assert payload.splitlines() == ["10,leche,,LECHE-1,1.10,,5,True"]
+
+def _product(engine, sku: str, price: str = "9.99") -> int:
+    with Session(engine) as db:
+        product = models.Product(name="antiguo", sku=sku, price=price, stock_quantity=1)
+        db.add(product)
+        db.commit()
+        return product.product_id
+
+def test_import_products_merges_by_sku(pg, monkeypatch):
+    monkeypatch.setattr(product_cache, "_data", OrderedDict())
+    existing = _product(pg, "PAN-1")
+    product_cache.set(product_id_key(existing), {"sku": "PAN-1", "version": 1})
+    product_cache.set(product_sku_key("PAN-1"), {"sku": "PAN-1", "version": 1})
+    rejected = []
+
+    with Session(pg) as db:
+        totals = importer.import_stream(db, "products", _csv(PRODUCTS_CSV), chunk_rows=10,
+                                        on_reject=lambda row, detail: rejected.append(row))
+
+    assert (totals["rows"], totals["loaded"], totals["rejected"]) == (5, 2, 2)
+    assert rejected == [3, 4]
+    with Session(pg) as db:
+        products = {p.sku: p for p in db.scalars(select(models.Product))}
+    # LECHE-1 dos veces en el bloque: gana la última fila
+    assert (products["LECHE-1"].name, str(products["LECHE-1"].price)) == ("leche entera", "1.25")
+    assert (products["PAN-1"].product_id, products["PAN-1"].name, products["PAN-1"].version) == (existing, "pan", 2)
+    # la caché no sirve la versión anterior
+    assert product_cache.get(product_id_key(existing)) is None
+    assert product_cache.get(product_sku_key("PAN-1")) is None
+    with Session(pg) as db:
+        changed = db.scalars(select(models.ChangeOutbox.entity_id).where(models.ChangeOutbox.entity == "products"))
+        assert sorted(changed) == sorted(p.product_id for p in products.values())
+
+def test_import_purchases_requires_existing_users(pg):
+    with Session(pg) as db:
+        user = models.User(email="ana@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        user_id = user.user_id
+    text = ("quantity,total_amount,payment_method,payment_status,delivery_status,user_id,purchase_date\n"
+            f"1,2.50,cash,completed,delivered,{user_id},2025-03-01T10:00:00\n"
+            f"2,5.00,cash,completed,delivered,{user_id + 1},\n"
+            f"3,7.50,bitcoin,completed,delivered,{user_id},\n"
+            f"4,10.00,cash,completed,delivered,{user_id},\n")
+    rejected = {}
+
+    with Session(pg) as db:
+        totals = importer.import_stream(db, "purchases", _csv(text), chunk_rows=2,
+                                        on_reject=lambda row, detail: rejected.setdefault(row, detail))
+
+    assert (totals["rows"], totals["loaded"], totals["rejected"]) == (4, 2, 2)
+    assert rejected[2] == f"user_id: user {user_id + 1} does not exist"
+    assert rejected[3].startswith("payment_method:")
+    with Session(pg) as db:
+        purchases = db.execute(select(models.Purchase.quantity, models.Purchase.purchase_date)
+                               .order_by(models.Purchase.quantity)).all()
+        recorded = db.scalar(select(func.count()).select_from(models.ChangeOutbox))
+    assert [quantity for quantity, _ in purchases] == [1, 4]
+    assert purchases[0].purchase_date.isoformat() == "2025-03-01T10:00:00"
+    assert purchases[1].purchase_date is not None
+    assert recorded == 2
+
+@pytest.mark.parametrize("write_bytes", [main.IMPORT_SPOOL_WRITE_BYTES, 16], ids=["one-write", "many-writes"])
+def test_import_endpoint(pg_client, monkeypatch, write_bytes):
+    monkeypatch.setattr(main, "IMPORT_SPOOL_WRITE_BYTES", write_bytes)
+    response = pg_client.post("/import/products", content=PRODUCTS_CSV.encode(),
+                              headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["rows"], result["loaded"], result["rejected"]) == (5, 2, 2)
+    assert [reject["row"] for reject in result["rejects"]] == [3, 4]
+    assert sorted(item["sku"] for item in pg_client.get("/products/").json()) == ["LECHE-1", "PAN-1"]
+
+def test_import_endpoint_rejects_unreadable_files(pg_client):
+    response = pg_client.post("/import/products", content=b"name,sku\n\xff\xfe,1\n")
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid CSV")
@@ -0,0 +1,46 @@
+"""metrics.instrument_engine: sentencias y tiempo de BD por petición, también las que fallan."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app import metrics
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}")
+    metrics.instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def stats():
+    stats = metrics.RequestStats()
+    token = metrics._request_stats.set(stats)
+    yield stats
+    metrics._request_stats.reset(token)
+
+def test_counts_statements(engine, stats):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+
+        assert conn.info["query_start"] == []
+    assert stats.queries == 2 and stats.db_seconds > 0
+
+def test_failed_statements_leave_no_start_behind(engine, stats):
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_existe"))
+        conn.execute(text("SELECT 1"))
+
+        assert conn.info["query_start"] == []
+    assert stats.queries == 4
+
+def test_slow_failed_statement_is_logged(engine, stats, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    with engine.connect() as conn, pytest.raises(OperationalError):
+        conn.execute(text("SELECT * FROM no_existe"))
+
+    assert [record.getMessage().split(": ", 1)[1] for record in caplog.records
+            if record.name == "app.sql.slow"] == ["SELECT * FROM no_existe | params=()"]
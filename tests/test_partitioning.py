@@ -0,0 +1,101 @@
+"""Particionado mensual (PostgreSQL): migrate y descarte de particiones en las consultas por fecha."""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import delete, event, text
+from sqlalchemy.orm import Session
+
+from app import crud, models, partitioning
+
+TODAY = date(2026, 4, 10)
+
+@pytest.fixture
+def partitioned(pg, monkeypatch):
+    """Base de pg con un usuario, facturas y compras de enero a marzo de 2026, y ambas tablas migradas."""
+    monkeypatch.setattr(partitioning, "date", type("FixedDate", (date,), {"today": staticmethod(lambda: TODAY)}))
+    with Session(pg) as db:
+        user = models.User(email="ana@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        db.add_all(models.Invoice(invoice_number=f"F-{month}", invoice_date=date(2026, month, 15), total_amount=month,
+                                  user_id=user.user_id) for month in (1, 2, 3))
+        db.add_all(models.Purchase(purchase_date=datetime(2026, month, 1, 12), quantity=1, total_amount=month,
+                                   user_id=user.user_id) for month in (1, 2, 3))
+        db.commit()
+    with pg.begin() as conn:
+        for table in partitioning.PARTITIONED_TABLES:
+            partitioning.migrate(conn, table, months_ahead=1)
+    yield pg
+    with pg.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS invoices, purchases, invoices_legacy, purchases_legacy, "
+                          "invoice_numbers CASCADE"))
+        conn.execute(text("DROP FUNCTION IF EXISTS invoice_numbers_sync()"))
+
+def _scanned(engine, query) -> set:
+    """Tablas que lee el plan de la consulta SQL que lanza query(db)."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as db:
+            query(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    (statement, parameters), = statements
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+
+    def relations(node):
+        found = {node["Relation Name"]} if "Relation Name" in node else set()
+        for child in node.get("Plans", []):
+            found |= relations(child)
+        return found
+    return relations(plan[0]["Plan"])
+
+def test_migrate_creates_monthly_partitions(partitioned):
+    with partitioned.connect() as conn:
+        assert partitioning.is_partitioned(conn, "invoices")
+        partitions = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'invoices' ORDER BY c.relname"
+        )).scalars().all()
+        counts = dict(conn.execute(text("SELECT tableoid::regclass::text, count(*) FROM invoices GROUP BY 1")).all())
+
+    assert partitions == ["invoices_default"] + [f"invoices_y2026m0{month}" for month in range(1, 6)]
+    assert counts == {"invoices_y2026m01": 1, "invoices_y2026m02": 1, "invoices_y2026m03": 1}
+
+@pytest.mark.parametrize("query, expected", [
+    (lambda db: crud.get_invoices(db, date_from=date(2026, 2, 1), date_to=date(2026, 2, 28)),
+     {"invoices_y2026m02"}),
+    (lambda db: crud.get_invoices_keyset(db, date_from=date(2026, 2, 1), date_to=date(2026, 3, 31)),
+     {"invoices_y2026m02", "invoices_y2026m03"}),
+    (lambda db: crud.get_purchases(db, date_from=date(2026, 3, 1), date_to=date(2026, 3, 1)),
+     {"purchases_y2026m03"}),
+])
+def test_date_filters_prune_partitions(partitioned, query, expected):
+    assert _scanned(partitioned, query) == expected
+
+def test_unfiltered_query_reads_every_partition(partitioned):
+    scanned = _scanned(partitioned, lambda db: crud.get_invoices(db))
+
+    assert {"invoices_y2026m01", "invoices_y2026m02", "invoices_y2026m03", "invoices_default"} <= scanned
+
+def test_legacy_copy_does_not_block_deleting_users(partitioned):
+    with partitioned.connect() as conn:
+        legacy_fks = conn.execute(text(
+            "SELECT count(*) FROM pg_constraint WHERE contype = 'f' "
+            "AND conrelid IN ('invoices_legacy'::regclass, 'purchases_legacy'::regclass)"
+        )).scalar()
+    assert legacy_fks == 0
+
+    with Session(partitioned) as db:
+        db.execute(delete(models.Invoice))
+        db.execute(delete(models.Purchase))
+        db.execute(delete(models.User))
+        db.commit()
+
+    with partitioned.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM invoices_legacy")).scalar() == 3
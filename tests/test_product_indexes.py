@@ -0,0 +1,97 @@
+"""Índices de GET /products/: definidos en los modelos, creados por la migración 0002 y usados por los planes."""
+import importlib.util
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+
+MIGRATION = Path(__file__).resolve().parent.parent / "migrations" / "versions" / "0002_performance_schema.py"
+
+def _migration():
+    spec = importlib.util.spec_from_file_location("migration_0002", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _model_indexes():
+    return {index.name: index for index in models.Product.__table__.indexes}
+
+def _plan_sql(db: Session, filters: schemas.ProductFilter) -> str:
+    sort_column, descending = crud.product_sort(filters)
+    query = db.query(models.Product).filter(*crud.product_filter_clauses(filters))
+    query = query.order_by(*crud.keyset_order(models.Product.product_id, sort_column, descending)).limit(100)
+    return str(query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+
+FILTERED = schemas.ProductFilter(category="bebidas", is_active=True, min_price=Decimal("10"),
+                                 max_price=Decimal("20"), sort="price")
+
+def test_model_declares_filter_indexes():
+    indexes = _model_indexes()
+
+    assert [c.name for c in indexes["ix_products_category_active_price"].columns] == ["category", "is_active", "price"]
+    assert [c.name for c in indexes["ix_products_price"].columns] == ["price"]
+    assert [c.name for c in indexes["ix_products_name"].columns] == ["name"]
+
+def test_model_declares_trigram_indexes():
+    indexes = _model_indexes()
+    for name, column in [("ix_products_name_trgm", "name"), ("ix_products_description_trgm", "description")]:
+        options = indexes[name].dialect_options["postgresql"]
+        assert options["using"] == "gin"
+        assert options["ops"] == {column: "gin_trgm_ops"}
+
+def test_migration_creates_the_model_indexes():
+    migration = _migration()
+    created = {name: columns for name, table, columns in migration.INDEXES if table == "products"}
+    created.update({name: [column] for name, table, column in migration.TRGM_INDEXES})
+
+    # las de index=True en las columnas (PK, sku) ya estaban en 0001
+    model = {name: [c.name for c in index.columns] for name, index in _model_indexes().items()
+             if name not in ("ix_products_product_id", "ix_products_sku")}
+    assert created == model
+
+def test_sqlite_schema_has_indexes(sqlite_engine):
+    names = {index["name"] for index in inspect(sqlite_engine).get_indexes("products")}
+
+    assert {"ix_products_category_active_price", "ix_products_price", "ix_products_name"} <= names
+
+def test_sqlite_plan_uses_composite_index(sqlite_engine):
+    with Session(sqlite_engine) as db:
+        plan = db.execute(text("EXPLAIN QUERY PLAN " + _plan_sql(db, FILTERED))).all()
+
+    assert any("ix_products_category_active_price" in row[-1] for row in plan), plan
+
+def _pg_catalog(db: Session, rows: int = 50_000):
+    """Catálogo con 8 categorías y precios de 0 a 500, con estadísticas: el plan depende de ellas.
+
+    El precio no sigue el orden físico de las filas (como en un catálogo real): si lo siguiera,
+    ix_products_price sería artificialmente barato.
+    """
+    db.execute(text(
+        "INSERT INTO products (name, description, sku, price, category, stock_quantity, is_active) "
+        "SELECT 'producto ' || i, 'descripcion ' || i, 'SKU-' || i, (i * 7919 % 50000) / 100.0, "
+        "(ARRAY['lacteos','panaderia','bebidas','limpieza','frutas','verduras','carnes','congelados'])[i % 8 + 1], "
+        "i % 100, i % 10 <> 0 FROM generate_series(1, :rows) AS i"
+    ), {"rows": rows})
+    db.commit()
+    db.execute(text("ANALYZE products"))
+
+def _pg_plan(db: Session, filters: schemas.ProductFilter) -> str:
+    return "\n".join(db.execute(text("EXPLAIN " + _plan_sql(db, filters))).scalars())
+
+def test_postgresql_plan_uses_composite_index(pg):
+    with Session(pg) as db:
+        _pg_catalog(db)
+        assert "ix_products_category_active_price" in _pg_plan(db, FILTERED)
+
+def test_postgresql_plan_uses_trigram_index(pg):
+    with Session(pg) as db:
+        if "ix_products_name_trgm" not in {i["name"] for i in inspect(db.connection()).get_indexes("products")}:
+            pytest.skip("pg_trgm no disponible")
+        _pg_catalog(db)
+        plan = _pg_plan(db, schemas.ProductFilter(q="leche"))
+
+    assert "ix_products_name_trgm" in plan and "ix_products_description_trgm" in plan
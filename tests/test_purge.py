@@ -0,0 +1,152 @@
+"""Borrado y anonimización de usuarios por bloques (purge.py) y sus endpoints."""
+import time
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import analytics, models, purge
+
+def _users(engine, count: int, sales: int = 3):
+    """count usuarios con sales facturas y compras cada uno, ya sumados a los resúmenes."""
+    created = datetime(2026, 1, 1)
+    with Session(engine) as db:
+        users = [models.User(email=f"user{i}@example.com", password_hash="x", first_name=f"Nombre{i}",
+                             phone_number="600000000", address="Calle 1", registration_date=created)
+                 for i in range(count)]
+        db.add_all(users)
+        db.flush()
+        for user in users:
+            db.add_all(models.Invoice(invoice_number=f"F-{user.user_id}-{i}", invoice_date=date(2026, 1, 1 + i),
+                                      created_at=created, total_amount=10, payment_status="paid",
+                                      payment_method="cash", billing_address="Calle 1", user_id=user.user_id)
+                       for i in range(sales))
+            db.add_all(models.Purchase(purchase_date=created, quantity=1, total_amount=5, payment_method="cash",
+                                       payment_status="completed", delivery_status="delivered",
+                                       user_id=user.user_id)
+                       for _ in range(sales))
+        db.flush()
+        analytics.record(db, "invoices")
+        analytics.record(db, "purchases")
+        db.commit()
+        return [user.user_id for user in users]
+
+def _count(engine, model, *where):
+    with Session(engine) as db:
+        return db.scalar(select(func.count()).select_from(model).where(*where))
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # varios bloques por tabla: el bucle crea y vacía la tabla temporal en cada transacción
+    monkeypatch.setattr(purge, "USER_PURGE_CHUNK_ROWS", 2)
+
+def test_delete_in_chunks(sqlite_engine, small_chunks):
+    ids = _users(sqlite_engine, 3)
+    progress = []
+    with Session(sqlite_engine) as db:
+        totals = purge.purge_users(db, ids[:2], "delete",
+                                   on_progress=lambda db, field, count: progress.append((field, count)))
+
+    assert totals == {"users": 2, "invoices": 6, "purchases": 6}
+    assert progress == [("purchases", 2)] * 3 + [("invoices", 2)] * 3 + [("users", 2)]
+    assert _count(sqlite_engine, models.User) == 1
+    assert _count(sqlite_engine, models.Invoice) == _count(sqlite_engine, models.Purchase) == 3
+    # los resúmenes sólo conservan las ventas del usuario que queda
+    assert _count(sqlite_engine, models.SalesByUser, models.SalesByUser.user_id.in_(ids[:2])) == 0
+    with Session(sqlite_engine) as db:
+        assert sum(row["sales_count"] for row in analytics.revenue(db, "invoices")) == 3
+        assert [row["user_id"] for row in analytics.top_users(db, "purchases")] == ids[2:]
+
+def test_anonymize_keeps_sales(sqlite_engine, small_chunks):
+    ids = _users(sqlite_engine, 3)
+    with Session(sqlite_engine) as db:
+        totals = purge.purge_users(db, ids, "anonymize")
+        # repetir no vuelve a tocar nada
+        again = purge.purge_users(db, ids, "anonymize")
+
+    assert totals == {"users": 3, "invoices": 9, "purchases": 0}
+    assert again == {"users": 0, "invoices": 0, "purchases": 0}
+    with Session(sqlite_engine) as db:
+        users = db.scalars(select(models.User).order_by(models.User.user_id)).all()
+        assert [user.email for user in users] == [f"deleted-{i}@anonymized.invalid" for i in ids]
+        assert {(user.password_hash, user.first_name, user.phone_number, user.address) for user in users} == {
+            (purge.ANONYMIZED_HASH, None, None, None)}
+    assert _count(sqlite_engine, models.Invoice, models.Invoice.billing_address.isnot(None)) == 0
+    assert _count(sqlite_engine, models.Purchase) == 9
+
+def test_delete_user_endpoint(client, sqlite_engine):
+    ids = _users(sqlite_engine, 2)
+    response = client.delete(f"/users/{ids[0]}")
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "user0@example.com"
+    assert client.delete(f"/users/{ids[0]}").status_code == 404
+    assert _count(sqlite_engine, models.User) == 1
+    assert _count(sqlite_engine, models.Invoice, models.Invoice.user_id == ids[0]) == 0
+
+@pytest.mark.parametrize("mode, expected", [("delete", {"users": 2, "invoices": 6, "purchases": 6}),
+                                            ("anonymize", {"users": 2, "invoices": 6, "purchases": 0})])
+def test_bulk_endpoint(client, sqlite_engine, small_chunks, mode, expected):
+    ids = _users(sqlite_engine, 3)
+    response = client.request("DELETE", "/users/bulk", json={"user_ids": ids[:2] + [9999], "mode": mode})
+
+    assert response.status_code == 200
+    assert response.json() == {"mode": mode, **expected}
+    remaining = 1 if mode == "delete" else 3
+    assert _count(sqlite_engine, models.User) == remaining
+
+def test_bulk_endpoint_limits_sync_size(client, monkeypatch):
+    monkeypatch.setattr(purge, "USER_PURGE_SYNC_MAX", 2)
+    response = client.request("DELETE", "/users/bulk", json={"user_ids": [1, 2, 3]})
+
+    assert response.status_code == 400
+
+def _wait_for_job(client, location: str):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(location).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"el trabajo no terminó: {job}")
+
+def test_background_job_reports_progress(client, sqlite_engine, small_chunks, monkeypatch):
+    ids = _users(sqlite_engine, 4)
+    seen = []
+    job_progress = purge._job_progress
+
+    def recording(job_id):
+        on_progress = job_progress(job_id)
+
+        def wrapper(db, field, count):
+            on_progress(db, field, count)
+            # el contador del trabajo avanza en la misma transacción que el bloque
+            seen.append(db.get(models.UserPurgeJob, job_id, populate_existing=True).users)
+        return wrapper
+    monkeypatch.setattr(purge, "_job_progress", recording)
+
+    response = client.request("DELETE", "/users/bulk", json={"user_ids": ids, "background": True})
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+    assert response.json()["user_count"] == 4
+
+    job = _wait_for_job(client, response.headers["Location"])
+    assert job["status"] == "done" and job["error"] is None
+    assert (job["users"], job["invoices"], job["purchases"]) == (4, 12, 12)
+    assert job["finished_at"] is not None
+    assert seen[-2:] == [2, 4]
+    assert _count(sqlite_engine, models.User) == 0
+
+def test_background_job_failure_is_recorded(client, sqlite_engine, monkeypatch):
+    ids = _users(sqlite_engine, 1)
+
+    def broken(db, user_ids, mode, on_progress=None):
+        raise RuntimeError("fallo de prueba")
+    monkeypatch.setattr(purge, "purge_users", broken)
+
+    response = client.request("DELETE", "/users/bulk", json={"user_ids": ids, "background": True})
+    job = _wait_for_job(client, response.headers["Location"])
+
+    assert (job["status"], job["error"]) == ("failed", "fallo de prueba")
+    assert client.get("/users/bulk/jobs/9999").status_code == 404
@@ -0,0 +1,92 @@
+"""Enrutado de lecturas: réplica, primario tras una escritura y primario si la réplica cae."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app import models, replicas
+
+def _employee(name: str, email: str) -> models.Employee:
+    return models.Employee(first_name=name, last_name="prueba", email=email)
+
+def _names(response):
+    assert response.status_code == 200
+    return sorted(item["first_name"] for item in response.json())
+
+@pytest.fixture
+def replica_url(tmp_path, sqlite_engine):
+    """Dos bases SQLite distintas: el primario (sqlite_engine) y la réplica, con datos diferentes."""
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica = create_engine(url)
+    models.Base.metadata.create_all(replica)
+    with Session(replica) as db:
+        db.add(_employee("replica", "replica@example.com"))
+        db.commit()
+    replica.dispose()
+    with Session(sqlite_engine) as db:
+        db.add(_employee("primario", "primario@example.com"))
+        db.commit()
+    return url
+
+def _use_replicas(monkeypatch, urls):
+    replica_set = replicas.ReplicaSet(urls)
+    monkeypatch.setattr(replicas, "replicas", replica_set)
+    return replica_set
+
+def test_reads_go_to_replica(client, replica_url, monkeypatch):
+    _use_replicas(monkeypatch, [replica_url])
+
+    assert _names(client.get("/employees/")) == ["replica"]
+    assert _names(client.get("/employees/", headers={"X-Read-Primary": "1"})) == ["primario"]
+
+def test_reads_after_write_go_to_primary(client, replica_url, monkeypatch):
+    _use_replicas(monkeypatch, [replica_url])
+
+    created = client.post("/employees/", json={"first_name": "nuevo", "last_name": "prueba",
+                                               "email": "nuevo@example.com"})
+    assert created.status_code == 200
+    assert replicas.PIN_PRIMARY_COOKIE in created.cookies
+    # el TestClient guarda la cookie: la siguiente lectura ve la escritura en el primario
+    assert _names(client.get("/employees/")) == ["nuevo", "primario"]
+
+    client.cookies.clear()
+    assert _names(client.get("/employees/")) == ["replica"]
+
+def test_failed_write_does_not_pin(client, replica_url, monkeypatch):
+    _use_replicas(monkeypatch, [replica_url])
+
+    duplicated = client.post("/employees/", json={"first_name": "otro", "last_name": "prueba",
+                                                  "email": "primario@example.com"})
+    assert duplicated.status_code == 400
+    assert replicas.PIN_PRIMARY_COOKIE not in duplicated.cookies
+    assert _names(client.get("/employees/")) == ["replica"]
+
+def test_down_replica_falls_back_to_primary(client, tmp_path, replica_url, monkeypatch):
+    # la ruta no existe: SQLite falla al abrir la conexión, como una réplica caída
+    down = f"sqlite:///{tmp_path / 'no-existe' / 'replica.db'}"
+    replica_set = _use_replicas(monkeypatch, [down])
+
+    assert _names(client.get("/employees/")) == ["primario"]
+    assert replica_set._candidates() == []
+
+    # con una réplica sana en el conjunto, la caída se salta sin volver a probarla
+    replica_set = _use_replicas(monkeypatch, [down, replica_url])
+    assert [_names(client.get("/employees/")) for _ in range(4)] == [["replica"]] * 4
+    assert replica_set._candidates() == [1]
+
+def test_replica_sessions_are_read_only(pg, monkeypatch):
+    replica_set = _use_replicas(monkeypatch, [pg.url.render_as_string(hide_password=False)])
+    try:
+        with replica_set.open_session() as db:
+            assert db.execute(text("SHOW transaction_read_only")).scalar() == "on"
+            with pytest.raises(DBAPIError, match="read-only transaction"):
+                db.add(_employee("replica", "replica@example.com"))
+                db.flush()
+        # la conexión vuelve al pool y la siguiente sesión sigue siendo de sólo lectura
+        with replica_set.open_session() as db:
+            assert db.execute(text("SHOW transaction_read_only")).scalar() == "on"
+        with Session(pg) as db:
+            assert db.execute(text("SHOW transaction_read_only")).scalar() == "off"
+    finally:
+        for engine in replica_set.engines:
+            engine.dispose()
@@ -0,0 +1,60 @@
+"""Las conexiones vuelven al pool al terminar el endpoint, antes de serializar la respuesta."""
+import asyncio
+
+import anyio
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from app import database, models
+from app.main import app
+
+@pytest.fixture
+def one_connection(client, tmp_path, monkeypatch):
+    """Pool de una sola conexión con espera corta: un hilo que la retenga bloquea a los demás."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool, pool_size=1, max_overflow=0,
+                           pool_timeout=2)
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(models.Employee(first_name=f"E{i}", last_name="prueba", email=f"e{i}@example.com")
+                   for i in range(20))
+        db.commit()
+    monkeypatch.setattr(database, "_engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    yield engine
+    engine.dispose()
+
+def test_more_requests_than_connections(one_connection):
+    # más peticiones que hilos y más hilos que conexiones: si las sesiones siguieran abiertas
+    # hasta la serialización, los hilos esperarían al pool y éste a un hilo libre (timeout)
+    async def load():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 4
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get("/employees/", params={"limit": 20}) for _ in range(40)))
+
+    responses = asyncio.run(load())
+
+    assert [response.status_code for response in responses] == [200] * 40
+    assert {len(response.json()) for response in responses} == {20}
+    assert one_connection.pool.checkedout() == 0
+
+def test_session_closed_before_serialization(client, monkeypatch):
+    closed = []
+    close = database.release_request_sessions
+
+    def tracking():
+        closed.append(len(database._request_sessions.get()))
+        close()
+    monkeypatch.setattr(database, "release_request_sessions", tracking)
+
+    created = client.post("/employees/", json={"first_name": "Ana", "last_name": "prueba", "email": "ana@example.com"})
+    listed = client.get("/employees/")
+
+    assert created.status_code == listed.status_code == 200
+    assert created.json()["email"] == "ana@example.com"
+    assert [item["email"] for item in listed.json()] == ["ana@example.com"]
+    # una sesión por petición (la de get_db o get_read_db), cerrada en el hilo del endpoint
+    assert closed == [1, 1]
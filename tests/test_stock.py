@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import crud, models
+
+DECREMENTS = 200
+
+def _product(engine, stock: int, sku: str = "SKU-1") -> int:
+    with Session(engine) as db:
+        product = models.Product(name="leche", sku=sku, price=1, stock_quantity=stock)
+        db.add(product)
+        db.commit()
+        return product.product_id
+
+def _stock(engine, product_id: int) -> int:
+    with Session(engine) as db:
+        return db.get(models.Product, product_id).stock_quantity
+
+@pytest.mark.parametrize("stock", [DECREMENTS // 2, DECREMENTS])
+def test_parallel_decrements_never_oversell(pg, stock):
+    product_id = _product(pg, stock)
+
+    def decrement(_):
+        with Session(pg) as db:
+            return crud.adjust_stock(db, product_id, -1) is not None
+
+    with ThreadPoolExecutor(32) as pool:
+        sold = sum(pool.map(decrement, range(DECREMENTS)))
+
+    assert sold == min(stock, DECREMENTS)
+    assert _stock(pg, product_id) == stock - sold >= 0
+
+def test_parallel_batches_are_all_or_nothing(pg):
+    first, second = _product(pg, 100, "SKU-1"), _product(pg, 50, "SKU-2")
+
+    def basket(_):
+        with Session(pg) as db:
+            try:
+                crud.adjust_stock_batch(db, {first: -1, second: -1})
+            except crud.InsufficientStock:
+                return False
+            return True
+
+    with ThreadPoolExecutor(32) as pool:
+        sold = sum(pool.map(basket, range(DECREMENTS)))
+
+    # second se agota con 50 cestas; ninguna cesta posterior descuenta first
+    assert sold == 50
+    assert (_stock(pg, first), _stock(pg, second)) == (50, 0)
@@ -0,0 +1,61 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+
+def _user_with_children(engine, invoices: int, purchases: int) -> int:
+    created = datetime(2026, 1, 1)
+    with Session(engine) as db:
+        user = models.User(email="ana@example.com", password_hash="x", registration_date=created)
+        db.add(user)
+        db.flush()
+        db.add_all(models.Invoice(invoice_number=f"F-{i}", invoice_date=date(2026, 1, 1 + i), created_at=created,
+                                  total_amount=10, payment_status="paid", payment_method="cash", user_id=user.user_id)
+                   for i in range(invoices))
+        db.add_all(models.Purchase(purchase_date=created, quantity=1, total_amount=5, payment_method="cash",
+                                   payment_status="completed", delivery_status="delivered", user_id=user.user_id)
+                   for _ in range(purchases))
+        db.commit()
+        return user.user_id
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@pytest.mark.parametrize("children", [1, 25])
+def test_include_loads_each_relation_in_one_statement(sqlite_engine, children):
+    user_id = _user_with_children(sqlite_engine, children, children)
+    counter = StatementCounter(sqlite_engine)
+    with Session(sqlite_engine) as db:
+        db_user = crud.get_user_with(db, user_id, include=["invoices", "purchases"])
+        detail = schemas.UserDetail.from_user(db_user, ["invoices", "purchases"])
+
+    # usuario + una consulta por relación, sin depender del número de hijos
+    assert len(counter.statements) == 3
+    assert (len(detail.invoices), len(detail.purchases)) == (children, children)
+
+def test_without_include_reads_only_the_user(sqlite_engine):
+    user_id = _user_with_children(sqlite_engine, 3, 3)
+    counter = StatementCounter(sqlite_engine)
+    with Session(sqlite_engine) as db:
+        detail = schemas.UserDetail.from_user(crud.get_user_with(db, user_id), [])
+
+    assert len(counter.statements) == 1
+    assert detail.invoices is None and detail.purchases is None
+
+def test_endpoint_include(client, sqlite_engine):
+    user_id = _user_with_children(sqlite_engine, 4, 2)
+    counter = StatementCounter(sqlite_engine)
+    response = client.get(f"/users/{user_id}", params={"include": "invoices,purchases"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (len(body["invoices"]), len(body["purchases"])) == (4, 2)
+    assert len(counter.statements) == 3
@@ -0,0 +1,41 @@
+"""PUT/PATCH /users/{id}: el hash de la contraseña se calcula sólo si el usuario existe."""
+import pytest
+
+from app import passwords
+
+@pytest.fixture
+def hashes(monkeypatch):
+    """Contraseñas que llegan a bcrypt (con un hash barato en su lugar)."""
+    hashed = []
+
+    def fake_hash(password: str) -> str:
+        hashed.append(password)
+        return f"hash-{password}"
+
+    async def fake_hash_async(password: str) -> str:
+        return fake_hash(password)
+
+    monkeypatch.setattr(passwords.hasher, "hash", fake_hash)
+    monkeypatch.setattr(passwords.hasher, "hash_async", fake_hash_async)
+    return hashed
+
+USER = {"email": "ana@example.com", "first_name": "Ana", "password": "secreto-1"}
+
+@pytest.mark.parametrize("method", ["PUT", "PATCH"])
+def test_missing_user_is_not_hashed(client, mode, hashes, method):
+    response = client.request(method, "/users/99", json=USER)
+
+    assert response.status_code == 404
+    assert hashes == []
+
+@pytest.mark.parametrize("method", ["PUT", "PATCH"])
+def test_existing_user_gets_the_new_hash(client, sqlite_engine, mode, hashes, method):
+    user_id = client.post("/users/", json=USER).json()["user_id"]
+
+    response = client.request(method, f"/users/{user_id}", json={**USER, "password": "otra-clave"})
+
+    assert response.status_code == 200
+    assert hashes == ["secreto-1", "otra-clave"]
+    with sqlite_engine.connect() as conn:
+        stored = conn.exec_driver_sql("SELECT password_hash FROM users").scalar()
+    assert stored == "hash-otra-clave"